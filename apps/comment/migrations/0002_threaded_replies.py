@@ -0,0 +1,60 @@
+# Generated by Django 5.1 on 2026-10-18 18:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.http import int_to_base36
+
+
+def backfill_paths(apps, schema_editor):
+    # Existing comments become top-level comments, one segment each (see models.path_segment)
+    Comment = apps.get_model('comment', 'Comment')
+    batch = []
+    for comment in Comment.objects.only('id', 'created_at').iterator(chunk_size=2000):
+        micros = int(comment.created_at.timestamp() * 1_000_000)
+        comment.path = int_to_base36(micros).rjust(11, '0') + comment.id.hex[:4]
+        batch.append(comment)
+        if len(batch) >= 2000:
+            Comment.objects.bulk_update(batch, ['path'])
+            batch = []
+    Comment.objects.bulk_update(batch, ['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comment', '0001_initial'),
+        ('post', '0005_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='comment.comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'depth', '-created_at'], name='comment_post_depth_idx'),
+        ),
+    ]
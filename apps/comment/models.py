@@ -1,18 +1,65 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.http import int_to_base36
 from apps.post.models import Post
 import uuid
 
+# Replies are stored as a materialized path: each comment's path is its
+# parent's path plus one fixed-width segment built from its creation time and
+# id. Ordering by path lists a thread depth first with siblings oldest first,
+# and a subtree is the range [path, path + PATH_END), so any thread loads in
+# one range scan over the (post, path) index.
+PATH_SEGMENT_LENGTH = 15  # 11 base-36 digits of microseconds since the epoch, 4 hex digits of the id
+PATH_END = '~'  # Sorts after every character a segment can hold
+MAX_DEPTH = 255 // PATH_SEGMENT_LENGTH - 1  # Deepest reply a path column of 255 can hold
+
+
+def path_segment(created_at, id_hex):
+    micros = int(created_at.timestamp() * 1_000_000)
+    return int_to_base36(micros).rjust(11, '0') + id_hex[:4]
+
+
 class Comment(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, unique=True)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='comments')
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, related_name='replies', null=True, blank=True)
+    path = models.CharField(max_length=255, editable=False)  # Materialized path, see PATH_SEGMENT_LENGTH
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)  # 0 for top-level comments
+    reply_count = models.PositiveIntegerField(default=0, editable=False)  # Direct replies, maintained by signals
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Thread and subtree range scans
+            models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+            # Paginated top-level comments of a post
+            models.Index(fields=['post', 'depth', '-created_at'], name='comment_post_depth_idx'),
+            # Recent comment activity for the trending ranking
+            models.Index(fields=['created_at'], name='comment_created_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author} on {self.post}"
+
+    def save(self, *args, **kwargs):
+        if not self.path:
+            segment = path_segment(timezone.now(), self.id.hex)
+            if self.parent is None:
+                self.path, self.depth = segment, 0
+            else:
+                self.path, self.depth = self.parent.path + segment, self.parent.depth + 1
+        super().save(*args, **kwargs)
+
+    def subtree(self, max_depth=None):
+        """
+        This comment and its replies, depth first, in a single query.
+        """
+        comments = Comment.objects.filter(post_id=self.post_id, path__gte=self.path, path__lt=self.path + PATH_END)
+        if max_depth is not None:
+            comments = comments.filter(depth__lte=self.depth + max_depth)
+        return comments.order_by('path')
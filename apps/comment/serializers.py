@@ -1,15 +1,29 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Comment
+from .models import Comment, MAX_DEPTH
 
 class CommentSerializer(serializers.ModelSerializer):
     author = serializers.StringRelatedField()  # Commenter's name or email
     post_author_id = serializers.SerializerMethodField()  # User ID of the post author
-    
+
     class Meta:
         model = Comment
-        fields = ['id', 'post', 'post_author_id', 'author', 'content', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at', 'author', 'post_author_id']
-    
+        fields = ['id', 'post', 'post_author_id', 'author', 'parent', 'depth', 'reply_count', 'content', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'author', 'post_author_id', 'depth', 'reply_count']
+
     # Get the user ID of the post author
     def get_post_author_id(self, obj):
-        return obj.post.author.id  # Access the post's author ID
+        # List views resolve the post author once and pass it in the context
+        if 'post_author_id' in self.context:
+            return self.context['post_author_id']
+        return obj.post.author_id  # Read the FK column, no User fetch
+
+    def validate_parent(self, parent):
+        if self.instance is not None:
+            # The path of every reply below depends on it
+            if parent != self.instance.parent:
+                raise serializers.ValidationError("A comment can't be moved to another parent.")
+            return parent
+        if parent is not None and parent.depth + 1 > min(settings.COMMENT_MAX_DEPTH, MAX_DEPTH):
+            raise serializers.ValidationError("Replies can't be nested any deeper.")
+        return parent
@@ -0,0 +1,32 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from apps.post.models import Post
+from apps.post import cache as post_cache
+from apps.user.models import AuthorStats
+from .models import Comment
+
+
+# Keep Post.comment_count, AuthorStats.comment_count and the parent's reply_count
+# in step with the comment rows. The UPDATEs run in the database so concurrent
+# writers never lose an increment.
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Post.objects.filter(id=instance.post_id).update(comment_count=F('comment_count') + 1)
+        AuthorStats.objects.apply_delta(instance.author_id, comment_count=1)
+        if instance.parent_id:
+            Comment.objects.filter(id=instance.parent_id).update(reply_count=F('reply_count') + 1)
+        post_cache.invalidate_post(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, **kwargs):
+    Post.objects.filter(id=instance.post_id).update(comment_count=Greatest(F('comment_count') - 1, 0))
+    # Never recreate rows here: the author may be part of the same cascade delete
+    AuthorStats.objects.apply_delta(instance.author_id, create_missing=False, comment_count=-1)
+    if instance.parent_id:
+        # A no-op when the parent is being deleted along with it
+        Comment.objects.filter(id=instance.parent_id).update(reply_count=Greatest(F('reply_count') - 1, 0))
+    post_cache.invalidate_post(instance.post_id)
@@ -1,3 +1,162 @@
-from django.test import TestCase
+import json
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, TestCase
+from apps.post.models import Post
+from apps.user.models import User
+from blog_server import throttling
+from .models import Comment
+from .views import acomment_list
 
-# Create your tests here.
+
+class CommentTestCase(TestCase):
+    def setUp(self):
+        self.enterContext(throttling.disabled())
+        cache.clear()
+        self.author = User.objects.create_user('author@example.com', 'password')
+        self.reader = User.objects.create_user('reader@example.com', 'password')
+        self.post = Post.objects.create(author=self.author, title='Title', content='Content')
+
+    def comment(self, parent=None, post=None, author=None, content='Comment'):
+        return Comment.objects.create(post=post or self.post, author=author or self.reader, parent=parent, content=content)
+
+    def comment_count(self, post=None):
+        return Post.objects.get(id=(post or self.post).id).comment_count
+
+
+class CommentCountTests(CommentTestCase):
+    def test_create_and_delete_move_the_post_count(self):
+        first = self.comment()
+        self.comment()
+        self.assertEqual(self.comment_count(), 2)
+        first.delete()
+        self.assertEqual(self.comment_count(), 1)
+
+    def test_deleting_a_comment_deletes_and_uncounts_its_replies(self):
+        root = self.comment()
+        reply = self.comment(parent=root)
+        self.comment(parent=reply)
+        self.comment()
+        self.assertEqual(self.comment_count(), 4)
+        root.delete()
+        self.assertEqual(self.comment_count(), 1)
+
+    def test_deleting_the_commenter_uncounts_their_comments(self):
+        self.comment()
+        self.comment(author=self.author)
+        self.reader.delete()
+        self.assertEqual(self.comment_count(), 1)
+
+    def test_count_never_goes_negative(self):
+        comment = self.comment()
+        Post.objects.filter(id=self.post.id).update(comment_count=0)
+        comment.delete()
+        self.assertEqual(self.comment_count(), 0)
+
+    def test_batch_endpoint_reads_the_counts(self):
+        other = Post.objects.create(author=self.author, title='Other', content='Content')
+        self.comment()
+        self.comment(post=other)
+        self.comment(post=other)
+        response = self.client.get(f'/post/posts/comment-counts/?ids={self.post.id},{other.id}')
+        self.assertEqual(response.json()['counts'], {str(self.post.id): 1, str(other.id): 2})
+
+
+class CommentViewTests(CommentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.reader)
+
+    def thread(self, comment, **params):
+        response = self.client.get(f'/comment/comments/{comment.id}/thread/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_thread_is_nested_in_path_order(self):
+        root = self.comment()
+        first = self.comment(parent=root, content='First')
+        second = self.comment(parent=root, content='Second')
+        nested = self.comment(parent=first, content='Nested')
+        self.comment(content='Another thread')
+        thread = self.thread(root)
+        self.assertEqual([reply['id'] for reply in thread['replies']], [str(first.id), str(second.id)])
+        self.assertEqual([reply['id'] for reply in thread['replies'][0]['replies']], [str(nested.id)])
+        self.assertEqual(thread['replies'][1]['replies'], [])
+
+    def test_depth_limits_the_levels_loaded(self):
+        root = self.comment()
+        reply = self.comment(parent=root)
+        self.comment(parent=reply)
+        thread = self.thread(root, depth=1)
+        self.assertEqual(thread['replies'][0]['replies'], [])
+        self.assertEqual(thread['replies'][0]['reply_count'], 1)
+        self.assertEqual(self.thread(root, depth=0)['replies'], [])
+        response = self.client.get(f'/comment/comments/{root.id}/thread/', {'depth': 'all'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_thread_changes_with_replies_below_the_depth_limit(self):
+        root = self.comment()
+        reply = self.comment(parent=root)
+        url = f'/comment/comments/{root.id}/thread/?depth=1'
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.comment(parent=reply)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['replies'][0]['reply_count'], 1)
+
+    def test_reply_to_a_comment_on_another_post_is_refused(self):
+        other = Post.objects.create(author=self.author, title='Other', content='Content')
+        parent = self.comment()
+        response = self.client.post(f'/comment/posts/{other.id}/comments/', {'post': other.id, 'content': 'Reply', 'parent': parent.id})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('parent', response.json())
+        self.assertEqual(self.comment_count(other), 0)
+
+    def test_list_answers_304_until_a_reply_lands(self):
+        root = self.comment()
+        url = f'/comment/posts/{self.post.id}/comments/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.comment(parent=root)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['reply_count'], 1)
+
+    def test_detail_changes_with_its_replies(self):
+        root = self.comment()
+        url = f'/comment/comments/{root.id}/'
+        etag = self.client.get(url)['ETag']
+        self.comment(parent=root)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+
+    async def alist(self, user=None, data=None, **headers):
+        request = AsyncRequestFactory().get(f'/comment/posts/{self.post.id}/comments/', data, headers=headers)
+
+        async def auser():  # What the session middleware would resolve
+            return user or AnonymousUser()
+        request.auser = auser
+        return await acomment_list(request, self.post.id)
+
+    async def test_async_list_answers_304_until_a_reply_lands(self):
+        root = await Comment.objects.acreate(post=self.post, author=self.reader, content='Comment')
+        etag = (await self.alist(self.reader))['ETag']
+        self.assertEqual((await self.alist(self.reader, if_none_match=etag)).status_code, 304)
+        await Comment.objects.acreate(post=self.post, author=self.reader, parent=root, content='Reply')
+        self.assertEqual((await self.alist(self.reader, if_none_match=etag)).status_code, 200)
+
+    async def test_async_list_refuses_anonymous_clients(self):
+        self.assertEqual((await self.alist()).status_code, 403)
+
+    async def test_async_list_matches_the_sync_view(self):
+        for _ in range(3):
+            await Comment.objects.acreate(post=self.post, author=self.reader, content='Comment')
+        await self.async_client.aforce_login(self.reader)
+        sync = await self.async_client.get(f'/comment/posts/{self.post.id}/comments/')
+        response = await self.alist(self.reader)
+        self.assertEqual(response['ETag'], sync['ETag'])
+        self.assertEqual(json.loads(response.content), sync.json())
+        self.assertEqual((await self.alist(self.reader, {'page': 9})).status_code, 404)
@@ -1,10 +1,14 @@
 from django.urls import path
-from .views import CommentListCreateView, CommentRetrieveUpdateDestroyView
+from blog_server.async_views import async_reads
+from .views import CommentListCreateView, CommentRetrieveUpdateDestroyView, CommentThreadView, acomment_list
 
 urlpatterns = [
     # List and create comments for a specific post
-    path('posts/<uuid:post_id>/comments/', CommentListCreateView.as_view(), name='post-comments'),
+    path('posts/<uuid:post_id>/comments/', async_reads(acomment_list, CommentListCreateView.as_view()), name='post-comments'),
     
     # Retrieve, update, or delete a specific comment
     path('comments/<uuid:pk>/', CommentRetrieveUpdateDestroyView.as_view(), name='comment-detail'),
+
+    # A comment and its replies as a tree, ?depth= limits how many levels below it
+    path('comments/<uuid:pk>/thread/', CommentThreadView.as_view(), name='comment-thread'),
 ]
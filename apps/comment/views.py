@@ -1,29 +1,125 @@
-from rest_framework import generics
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.exceptions import PermissionDenied
-from .models import Comment, Post
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.response import Response
+from .models import Comment, Post, MAX_DEPTH
 from .serializers import CommentSerializer
+from blog_server.conditional import make_etag, check_not_modified, set_validators
+from blog_server.async_views import aguard, apaginate, error_response, json_response
 
-# List and create comments for a specific post
+# List top-level comments and create comments or replies for a specific post
 class CommentListCreateView(generics.ListCreateAPIView):
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         post_id = self.kwargs['post_id']  # Get post ID from the URL
-        return Comment.objects.filter(post__id=post_id).order_by('-created_at')
+        # Replies are loaded per thread from CommentThreadView
+        return Comment.objects.filter(post_id=post_id, depth=0).select_related('author').order_by('-created_at')
+
+    def get_serializer_context(self):
+        # Every comment in the list shares a post, so look its author up once per request
+        context = super().get_serializer_context()
+        if not hasattr(self, '_post_author_id'):
+            self._post_author_id = Post.objects.filter(id=self.kwargs['post_id']).values_list('author_id', flat=True).first()
+        context['post_author_id'] = self._post_author_id
+        return context
+
+    def list(self, request, *args, **kwargs):
+        # The ETag comes from one aggregate, so a 304 skips pagination and serialization.
+        # A reply moves its parent's reply_count but no timestamp, so the counts are in it too.
+        # No Last-Modified: a deleted comment lowers the count without moving any timestamp
+        summary = self.get_queryset().aggregate(total=Count('id'), latest=Max('updated_at'), replies=Sum('reply_count'))
+        latest = summary['latest']
+        etag = make_etag('comments', self.kwargs['post_id'], summary['total'], latest and latest.isoformat(),
+                         summary['replies'], request.query_params.urlencode())
+        not_modified = check_not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        return set_validators(super().list(request, *args, **kwargs), etag)
 
     def perform_create(self, serializer):
         post_id = self.kwargs['post_id']  # Get post ID from the URL
         post = Post.objects.get(id=post_id)  # Fetch the post object
+        parent = serializer.validated_data.get('parent')
+        if parent is not None and parent.post_id != post.id:
+            raise ValidationError({'parent': ["The parent comment belongs to another post."]})
         serializer.save(author=self.request.user, post=post)  # Save with post and author
 
+# Async GET for CommentListCreateView, with the same validators and page body
+async def acomment_list(request, post_id):
+    denied = await aguard(request, login_required=True)
+    if denied:
+        return denied
+    comments = Comment.objects.filter(post_id=post_id, depth=0).select_related('author').order_by('-created_at')
+    summary = await comments.aaggregate(total=Count('id'), latest=Max('updated_at'), replies=Sum('reply_count'))
+    latest = summary['latest']
+    etag = make_etag('comments', post_id, summary['total'], latest and latest.isoformat(), summary['replies'],
+                     request.GET.urlencode())
+    not_modified = check_not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
+    try:
+        page, data = await apaginate(comments, request, summary['total'])
+    except NotFound as exc:
+        return error_response(exc)
+    post_author_id = await Post.objects.filter(id=post_id).values_list('author_id', flat=True).afirst()
+    serializer = CommentSerializer(page, many=True, context={'request': request, 'post_author_id': post_author_id})
+    data['results'] = serializer.data
+    return set_validators(json_response(data), etag)
+
+# A comment with its replies, nested, loaded in a single range scan
+class CommentThreadView(generics.GenericAPIView):
+    queryset = Comment.objects.select_related('post')
+    serializer_class = CommentSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        root = self.get_object()
+        max_depth = min(settings.COMMENT_MAX_DEPTH, MAX_DEPTH)
+        try:
+            depth = min(int(request.query_params.get('depth', max_depth)), max_depth)
+        except ValueError:
+            return Response({'error': 'depth must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        comments = list(root.subtree(max_depth=max(depth, 0)).select_related('author'))
+
+        latest = max(comment.updated_at for comment in comments)
+        # reply_count covers replies below the depth limit, which are not loaded.
+        # No Last-Modified, as neither they nor deletes move a loaded timestamp
+        replies = sum(comment.reply_count for comment in comments)
+        etag = make_etag('thread', root.id, len(comments), latest.isoformat(), replies, depth)
+        not_modified = check_not_modified(request, etag)
+        if not_modified:
+            return not_modified
+
+        # Rows arrive depth first, so every parent is built before its replies
+        serializer = self.get_serializer(context={**self.get_serializer_context(), 'post_author_id': root.post.author_id})
+        nodes = {}
+        for comment in comments:
+            node = nodes[comment.id] = {**serializer.to_representation(comment), 'replies': []}
+            if comment.id != root.id:
+                nodes[comment.parent_id]['replies'].append(node)
+        return set_validators(Response(nodes[root.id]), etag)
+
 # Retrieve, update, or delete a specific comment
 class CommentRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Comment.objects.all()
+    queryset = Comment.objects.select_related('author', 'post')
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated]
 
+    def retrieve(self, request, *args, **kwargs):
+        comment = self.get_object()
+        # No Last-Modified: replies change reply_count without moving updated_at
+        etag = make_etag('comment', comment.id, comment.updated_at.isoformat(), comment.reply_count)
+        not_modified = check_not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        serializer = self.get_serializer(comment)
+        return set_validators(Response(serializer.data), etag)
+
     def perform_update(self, serializer):
         # Ensure only the comment's author can update the comment
         comment = self.get_object()
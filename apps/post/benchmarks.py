@@ -0,0 +1,11 @@
+# Helpers shared by the benchmark_* management commands.
+
+
+def percentile(values, share):
+    """
+    Nearest-rank percentile of values, e.g. share=0.99 for p99; 0.0 when there are none.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * share), len(ordered) - 1)]
@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.utils.encoders import JSONEncoder
+from blog_server import db_router
+from blog_server.conditional import make_etag
+
+# Versioned response cache for the post read endpoints.
+#
+# Entries are keyed by a version number that writers bump, so invalidation is a
+# single incr and never needs to find or delete old keys; stale versions simply
+# age out. Versions start from a microsecond timestamp, so a version key that is
+# evicted and recreated can never collide with entries written under the old one.
+#
+# Each entry carries a soft expiry. After it passes, one caller refreshes the
+# value while everyone else keeps serving the stale copy, so a hot key expiring
+# never sends a burst of identical queries to the database.
+
+LIST_VERSION_KEY = 'post:list:version'
+LOCK_TIMEOUT = 10  # Seconds a refresh lock is held at most
+STALE_GRACE = 60  # Seconds a stale entry may still be served while it refreshes
+
+
+def _timeout():
+    return getattr(settings, 'POST_CACHE_TIMEOUT', 300)
+
+
+def _cold_wait():
+    # Seconds a caller waits for another caller filling a cold key; a sync caller holds its thread meanwhile
+    return getattr(settings, 'POST_CACHE_COLD_WAIT', 0.5)
+
+
+def _fresh_version():
+    return time.time_ns() // 1000
+
+
+def _detail_prefix(post_id):
+    # Accepts UUIDs and their dashed or hex string forms
+    return f'post:detail:{uuid.UUID(str(post_id)).hex}'
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _fresh_version(), None)
+
+
+# Invalidation waits for the commit, otherwise a concurrent reader could cache
+# the old row again under the new version before the write becomes visible.
+def invalidate_list():
+    transaction.on_commit(lambda: bump_version(LIST_VERSION_KEY))
+
+
+def invalidate_post(post_id):
+    def bump():
+        bump_version(f'{_detail_prefix(post_id)}:version')
+        bump_version(LIST_VERSION_KEY)
+    transaction.on_commit(bump)
+
+
+async def aget_version(key):
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, _fresh_version(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def list_key(request):
+    # Links in a page are absolute, so the host is part of the key
+    digest = hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    return f'post:list:{get_version(LIST_VERSION_KEY)}:{digest}'
+
+
+def detail_key(post_id):
+    prefix = _detail_prefix(post_id)
+    return f'{prefix}:{get_version(f"{prefix}:version")}'
+
+
+async def alist_key(request):
+    digest = hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    return f'post:list:{await aget_version(LIST_VERSION_KEY)}:{digest}'
+
+
+async def adetail_key(post_id):
+    prefix = _detail_prefix(post_id)
+    return f'{prefix}:{await aget_version(f"{prefix}:version")}'
+
+
+def make_entry(data):
+    """
+    Wrap response data with its ETag, computed once when the entry is filled
+    so conditional requests are answered without re-serializing anything.
+    There is no Last-Modified: counters and author cards change the data
+    without moving any timestamp in it.
+    """
+    return {
+        'data': data,
+        'etag': make_etag(json.dumps(data, cls=JSONEncoder, sort_keys=True)),
+    }
+
+
+def store(key, value, timeout=None):
+    timeout = timeout or _timeout()
+    cache.set(key, (value, time.time() + timeout), timeout + STALE_GRACE)
+
+
+def get_or_compute(key, compute, timeout=None):
+    """
+    Return the cached value for key, calling compute() to fill or refresh it.
+    """
+    lock_key = f'{key}:lock'
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() < fresh_until or not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            return value  # Fresh, or another caller is already refreshing it
+        locked = True
+    else:
+        locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+        if not locked:
+            deadline = time.time() + _cold_wait()
+            while time.time() < deadline:
+                time.sleep(0.05)
+                entry = cache.get(key)
+                if entry is not None:
+                    return entry[0]
+            # The filling caller is too slow; compute without the lock
+
+    try:
+        # A replica read cached here could outlive the replica's lag, so fills read the primary
+        with db_router.use_primary():
+            value = compute()
+        store(key, value, timeout)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
+
+
+async def astore(key, value, timeout=None):
+    timeout = timeout or _timeout()
+    await cache.aset(key, (value, time.time() + timeout), timeout + STALE_GRACE)
+
+
+async def aget_or_compute(key, acompute, timeout=None):
+    """
+    Async get_or_compute for the async views; acompute is a coroutine function.
+    Waiting for another caller's fill yields to the event loop instead of a thread.
+    """
+    lock_key = f'{key}:lock'
+    entry = await cache.aget(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() < fresh_until or not await cache.aadd(lock_key, 1, LOCK_TIMEOUT):
+            return value
+        locked = True
+    else:
+        locked = await cache.aadd(lock_key, 1, LOCK_TIMEOUT)
+        if not locked:
+            deadline = time.time() + _cold_wait()
+            while time.time() < deadline:
+                await asyncio.sleep(0.05)
+                entry = await cache.aget(key)
+                if entry is not None:
+                    return entry[0]
+
+    try:
+        with db_router.use_primary():
+            value = await acompute()
+        await astore(key, value, timeout)
+    finally:
+        if locked:
+            await cache.adelete(lock_key)
+    return value
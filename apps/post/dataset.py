@@ -0,0 +1,240 @@
+import datetime
+import hashlib
+import random
+import uuid
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connections, router, transaction
+from django.db.models import AutoField
+from django.utils import timezone
+from apps.comment.models import MAX_DEPTH, Comment, path_segment
+from apps.user.models import LoginCode
+from .models import Post
+
+# Seeded synthetic users, posts, comments and login codes for scale testing.
+#
+# Rows are written with executemany in fixed-size batches, one transaction per
+# batch, skipping model instances entirely. Nothing is kept per row: an id is a
+# hash of (seed, kind, index) and a post's publish time follows from its index,
+# so comments can reference any post without looking it up, and memory stays
+# flat at any size. Popularity is heavy-tailed: a few authors write most posts,
+# a few posts draw most comments, a few users leave most of them, and a few
+# comments start long reply threads.
+#
+# bulk inserts bypass signals, so counters and the search index must be
+# refreshed afterwards (transfer.refresh_derived_data), as after an import.
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_PASSWORD = 'dataset-password'  # Every generated user can log in with it
+EMAIL_DOMAIN = 'dataset.example.com'
+
+# Exponents of the rank distributions; higher concentrates more rows on the top ranks
+AUTHOR_SKEW = 4.0
+POST_SKEW = 3.0
+COMMENTER_SKEW = 2.0
+THREAD_SKEW = 16.0  # Most comments get no replies, a few threads run long
+MAX_THREAD_REPLIES = 100
+
+WORDS = (
+    'django', 'python', 'cache', 'query', 'server', 'index', 'thread', 'latency', 'replica', 'token',
+    'deploy', 'review', 'release', 'schema', 'backup', 'worker', 'request', 'stream', 'queue', 'batch',
+    'design', 'garden', 'travel', 'coffee', 'music', 'winter', 'recipe', 'mountain', 'river', 'city',
+)
+FIRST_NAMES = ('Asha', 'Bikash', 'Chen', 'Dana', 'Elif', 'Farah', 'Gita', 'Hari', 'Ines', 'Jonas', 'Kiran', 'Lena')
+LAST_NAMES = ('Adhikari', 'Brown', 'Costa', 'Dahal', 'Evans', 'Fischer', 'Gurung', 'Hansen', 'Ito', 'Joshi')
+POOL_SIZE = 512  # Pre-built paragraphs and sentences that content is assembled from
+
+
+def make_id(seed, kind, index):
+    """
+    Hex digits of a version 4 UUID derived from (seed, kind, index).
+    """
+    digest = bytearray(hashlib.blake2b(f'{seed}:{kind}:{index}'.encode(), digest_size=16).digest())
+    digest[6] = digest[6] & 0x0F | 0x40
+    digest[8] = digest[8] & 0x3F | 0x80
+    return digest.hex()
+
+
+def pick(rng, count, skew):
+    """
+    A rank in [0, count), heavy-tailed towards 0 when skew > 1.
+    """
+    return int(count * rng.random() ** skew)
+
+
+class Scatter:
+    """
+    Maps ranks to indexes with a fixed permutation, so the most popular rows are
+    spread over the table instead of all being the oldest ones.
+    """
+
+    def __init__(self, count):
+        self.count = count
+        self.stride = next(prime for prime in (2_147_483_647, 1_000_003, 65_537) if count % prime)
+
+    def __call__(self, rank):
+        return rank * self.stride % self.count
+
+
+class Generator:
+    """
+    Insert a deterministic dataset: the same seed and sizes always produce the
+    same rows, apart from timestamps, which are relative to the start of the run.
+    """
+
+    def __init__(self, users, posts, comments, login_codes=0, seed=0, days=365,
+                 batch_size=DEFAULT_BATCH_SIZE, progress=None):
+        if posts and not users:
+            raise ValueError("Posts need at least one user.")
+        if comments and not posts:
+            raise ValueError("Comments need at least one post.")
+        if login_codes and not users:
+            raise ValueError("Login codes need at least one user.")
+        self.sizes = {'users': users, 'posts': posts, 'comments': comments, 'login_codes': login_codes}
+        self.seed = seed
+        self.batch_size = batch_size
+        self.progress = progress
+        self.end = timezone.now()
+        self.start = self.end - datetime.timedelta(days=days)
+        self.span = (self.end - self.start).total_seconds()
+
+        rng = random.Random(f'{seed}:pool')
+        self.sentences = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + '.'
+                          for _ in range(POOL_SIZE)]
+        self.paragraphs = [' '.join(rng.choices(self.sentences, k=rng.randint(3, 8))) for _ in range(POOL_SIZE)]
+        self.author_of = Scatter(max(users, 1))
+        self.post_of = Scatter(max(posts, 1))
+
+    def run(self):
+        """
+        Insert every row. Returns the number of rows inserted per model.
+        """
+        User = get_user_model()
+        if User.objects.filter(email=self.email(0)).exists():
+            raise ValueError(f"Seed {self.seed} was already generated into this database; pick another --seed.")
+        return {
+            User: self.insert(User, ('id', 'email', 'username', 'first_name', 'last_name', 'password',
+                                     'is_verified', 'date_joined', 'updated_at'), self.users()),
+            Post: self.insert(Post, ('id', 'author_id', 'title', 'content', 'published_at', 'created_at',
+                                     'updated_at'), self.posts()),
+            Comment: self.insert(Comment, ('id', 'post_id', 'author_id', 'parent_id', 'path', 'depth', 'content',
+                                           'created_at', 'updated_at'), self.comments()),
+            LoginCode: self.insert(LoginCode, ('user_id', 'code', 'created_at', 'is_used', 'expires_at'),
+                                   self.login_codes()),
+        }
+
+    def insert(self, model, names, rows):
+        db = router.db_for_write(model)
+        connection = connections[db]
+        fields = [model._meta.get_field(name) for name in names]
+        # Columns the generator does not fill get their default, prepared once
+        defaults = [field for field in model._meta.concrete_fields
+                    if field.attname not in names and not isinstance(field, AutoField)]
+        fixed = tuple(field.get_db_prep_save(field.get_default(), connection) for field in defaults)
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(field.column) for field in fields + defaults)
+        sql = (f"INSERT INTO {quote(model._meta.db_table)} ({columns}) "
+               f"VALUES ({', '.join(['%s'] * (len(fields) + len(defaults)))})")
+
+        # UUIDs and datetimes make up most values, so skip the per-field machinery for
+        # them: ids are already hex, as SQLite stores them, and timestamps are in UTC
+        uuid_value = uuid.UUID if connection.features.has_native_uuid_field else None
+        if connection.vendor == 'sqlite':
+            datetime_value = lambda value: str(value.replace(tzinfo=None))
+        else:
+            datetime_value = connection.ops.adapt_datetimefield_value
+        converters = []
+        for field in fields:
+            target = field.target_field if field.is_relation else field
+            internal = target.get_internal_type()
+            converters.append(uuid_value if internal == 'UUIDField'
+                              else datetime_value if internal == 'DateTimeField' else None)
+
+        total = 0
+        batch = []
+        for row in rows:
+            batch.append(tuple(convert(value) if convert and value is not None else value
+                               for convert, value in zip(converters, row)) + fixed)
+            if len(batch) >= self.batch_size:
+                total += self.write(connection, db, sql, batch)
+                batch = []
+                if self.progress:
+                    self.progress(model, total)
+        if batch:
+            total += self.write(connection, db, sql, batch)
+        if self.progress:
+            self.progress(model, total)
+        return total
+
+    @staticmethod
+    def write(connection, db, sql, batch):
+        with transaction.atomic(using=db), connection.cursor() as cursor:
+            cursor.executemany(sql, batch)
+        return len(batch)
+
+    def email(self, index):
+        return f'user{index}.{self.seed}@{EMAIL_DOMAIN}'
+
+    def published_at(self, index):
+        # Posts are spread evenly over the period, oldest first
+        return self.start + datetime.timedelta(seconds=self.span * (index + 0.5) / self.sizes['posts'])
+
+    def users(self):
+        rng = random.Random(f'{self.seed}:users')
+        password = make_password(DEFAULT_PASSWORD)  # One real hash, shared by every row
+        count = self.sizes['users']
+        for index in range(count):
+            joined = self.start + datetime.timedelta(seconds=self.span * index / count)
+            yield (make_id(self.seed, 'user', index), self.email(index), f'user{index}',
+                   rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), password,
+                   rng.random() < 0.9, joined, joined)
+
+    def posts(self):
+        rng = random.Random(f'{self.seed}:posts')
+        users = self.sizes['users']
+        for index in range(self.sizes['posts']):
+            author = self.author_of(pick(rng, users, AUTHOR_SKEW))
+            published = self.published_at(index)
+            title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 9))).capitalize()
+            content = '\n\n'.join(rng.choices(self.paragraphs, k=rng.randint(1, 6)))
+            yield (make_id(self.seed, 'post', index), make_id(self.seed, 'user', author), title, content,
+                   published, published, published)
+
+    def comments(self):
+        # Generated a thread at a time: a top-level comment, then its replies
+        rng = random.Random(f'{self.seed}:comments')
+        users, posts, total = self.sizes['users'], self.sizes['posts'], self.sizes['comments']
+        max_depth = min(settings.COMMENT_MAX_DEPTH, MAX_DEPTH)
+        index = 0
+        while index < total:
+            post = self.post_of(pick(rng, posts, POST_SKEW))
+            post_id = make_id(self.seed, 'post', post)
+            size = min(1 + int(MAX_THREAD_REPLIES * rng.random() ** THREAD_SKEW), total - index)
+            thread = []  # (id, path, depth, created_at) of the comments so far
+            for _ in range(size):
+                comment_id = make_id(self.seed, 'comment', index)
+                index += 1
+                parent = rng.choice(thread) if thread else None
+                if parent is not None and parent[2] >= max_depth:
+                    parent = thread[0]
+                # Most comments arrive within hours of what they answer; none after the end of the run
+                since = parent[3] if parent else self.published_at(post)
+                delay = min(rng.expovariate(1 / 21600), (self.end - since).total_seconds())
+                created = since + datetime.timedelta(seconds=delay)
+                segment = path_segment(created, comment_id)
+                path, depth = (parent[1] + segment, parent[2] + 1) if parent else (segment, 0)
+                thread.append((comment_id, path, depth, created))
+                author = self.author_of(pick(rng, users, COMMENTER_SKEW))
+                content = ' '.join(rng.choices(self.sentences, k=rng.randint(1, 4)))
+                yield (comment_id, post_id, make_id(self.seed, 'user', author), parent and parent[0],
+                       path, depth, content, created, created)
+
+    def login_codes(self):
+        rng = random.Random(f'{self.seed}:login_codes')
+        users = self.sizes['users']
+        for _ in range(self.sizes['login_codes']):
+            user = self.author_of(pick(rng, users, COMMENTER_SKEW))
+            created = self.start + datetime.timedelta(seconds=rng.random() * self.span)
+            yield (make_id(self.seed, 'user', user), f'{rng.randrange(10 ** 6):06d}', created,
+                   rng.random() < 0.7, created + datetime.timedelta(minutes=10))
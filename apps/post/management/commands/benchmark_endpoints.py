@@ -0,0 +1,277 @@
+import json
+import os
+import platform
+import re
+import resource
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.urls import URLResolver, get_resolver
+from django.urls.resolvers import RoutePattern
+from rest_framework_simplejwt.tokens import RefreshToken
+from apps.comment.models import Comment
+from apps.post import dataset
+from apps.post.benchmarks import percentile
+from apps.post.models import Post
+from apps.post.transfer import refresh_derived_data
+from blog_server.metrics import QueryCounter
+from blog_server import throttling
+
+# In-process load benchmark of every GET route in blog_server.urls.
+#
+# The run happens against a scratch test database filled by apps.post.dataset
+# and a private in-memory cache, so results only depend on the code. Each
+# route gets a few unmeasured warm-up requests, then --requests requests spread
+# over --concurrency threads, each with its own test client logged in as the
+# same user (session plus access_token cookie). Peak memory is measured in a
+# separate pass with tracemalloc, which would otherwise distort the latencies.
+# The JSON written by --output has sorted keys and fixed rounding, so two runs
+# diff line by line; --baseline prints the change against an earlier file.
+
+EXCLUDED_PREFIXES = ('admin/', 'media/', 'static/')
+PARAMETER = re.compile(r'<(?:(?P<converter>\w+):)?(?P<name>\w+)>')
+
+
+def iter_routes(patterns, prefix=''):
+    """
+    Yield (route, name) for every URL pattern, with includes flattened.
+    """
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_routes(pattern.url_patterns, prefix + str(pattern.pattern))
+        elif isinstance(pattern.pattern, RoutePattern):  # Regex patterns (static files in DEBUG) are skipped
+            yield prefix + str(pattern.pattern), pattern.name
+
+
+def seed(users, posts, comments, seed):
+    """
+    Generate the dataset and return the values routes are called with.
+    """
+    dataset.Generator(users=users, posts=posts, comments=comments, seed=seed).run()
+    refresh_derived_data()
+
+    # The busiest post and its author, so detail routes return real pages
+    post = Post.objects.order_by('-comment_count', '-published_at').first()
+    user_ids = [str(pk) for pk in get_user_model().objects.order_by('email').values_list('id', flat=True)[:20]]
+    post_ids = [str(pk) for pk in Post.objects.values_list('id', flat=True)[:20]]
+    return {
+        'user': get_user_model().objects.get(email=f'user0.{seed}@{dataset.EMAIL_DOMAIN}'),
+        'user_id': post.author_id,
+        'id': post.id,
+        'post_id': post.id,
+        'pk': Comment.objects.filter(post=post).values_list('id', flat=True).first(),
+        'query': {
+            'post_search': {'q': dataset.WORDS[0]},
+            'post_comment_counts': {'ids': ','.join(post_ids)},
+            'counts_post_by_users': {'ids': ','.join(user_ids)},
+        },
+    }
+
+
+def build_url(route, fixtures):
+    """
+    Fill the route's parameters from fixtures; None when one is unknown.
+    """
+    missing = [match.group('name') for match in PARAMETER.finditer(route) if fixtures.get(match.group('name')) is None]
+    if missing:
+        return None
+    return '/' + PARAMETER.sub(lambda match: str(fixtures[match.group('name')]), route)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Load-test every GET route in-process and report latency percentiles, throughput, queries and memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Measured requests per route.")
+        parser.add_argument('--concurrency', type=int, default=4, help="Threads sending requests at once.")
+        parser.add_argument('--warmup', type=int, default=5, help="Unmeasured requests per route before timing.")
+        parser.add_argument('--routes', nargs='+', metavar='NAME', help="Only run these URL names.")
+        parser.add_argument('--users', type=int, default=50, help="Users in the seeded dataset.")
+        parser.add_argument('--posts', type=int, default=500, help="Posts in the seeded dataset.")
+        parser.add_argument('--comments', type=int, default=2000, help="Comments in the seeded dataset.")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the generated dataset.")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--baseline', help="JSON results of an earlier run to compare against.")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be at least 1.")
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)
+
+        directory = tempfile.mkdtemp(prefix='endpoint-bench-')
+        # A file rather than an in-memory database, which threads could not share
+        connections['default'].settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases=set(connections))
+        try:
+            with ExitStack() as stack:
+                stack.enter_context(override_settings(
+                    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                        'LOCATION': 'endpoint-benchmark'}},
+                    METRICS={**getattr(settings, 'METRICS', {}), 'DIR': os.path.join(directory, 'metrics')},
+                ))
+                # Request budgets are per day, far below what one run sends
+                stack.enter_context(throttling.disabled())
+                results = self.run(options)
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(directory, ignore_errors=True)
+
+        for name, result in sorted(results['routes'].items()):
+            self.report(name, result, baseline and baseline.get('routes', {}).get(name))
+        for name, reason in sorted(results['skipped'].items()):
+            self.stdout.write(f"{name:>24}: skipped ({reason})")
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2, sort_keys=True)
+                handle.write('\n')
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def run(self, options):
+        fixtures = seed(options['users'], options['posts'], options['comments'], options['seed'])
+        access_token = str(RefreshToken.for_user(fixtures['user']).access_token)
+
+        def make_client():
+            client = Client()
+            client.force_login(fixtures['user'])
+            client.cookies['access_token'] = access_token
+            return client
+
+        results = {
+            'meta': {
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'warmup': options['warmup'],
+                'dataset': {key: options[key] for key in ('users', 'posts', 'comments', 'seed')},
+            },
+            'routes': {},
+            'skipped': {},
+        }
+        client = make_client()
+        clients = [make_client() for _ in range(options['concurrency'])]
+        for route, name in iter_routes(get_resolver().url_patterns):
+            name = name or route or 'root'
+            if route.startswith(EXCLUDED_PREFIXES) or (options['routes'] and name not in options['routes']):
+                continue
+            url = build_url(route, fixtures)
+            if url is None:
+                results['skipped'][name] = 'no sample value for a URL parameter'
+                continue
+            query = fixtures['query'].get(name, {})
+            response = self.fetch(client, url, query)
+            if response.status_code == 405:
+                results['skipped'][name] = 'GET not allowed'
+                continue
+            for _ in range(options['warmup'] - 1):
+                self.fetch(client, url, query)
+            result = self.measure(clients, url, query, options['requests'])
+            result['route'] = '/' + route
+            result['status'] = response.status_code
+            result['peak_memory_kib'] = self.peak_memory(client, url, query)
+            results['routes'][name] = result
+        results['meta']['max_rss_kib'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return results
+
+    @staticmethod
+    def fetch(client, url, query):
+        response = client.get(url, query)
+        if response.streaming:
+            b''.join(response.streaming_content)  # Rendering happens while the body is consumed
+        return response
+
+    def measure(self, clients, url, query, total):
+        lock = threading.Lock()
+        latencies, queries, statuses = [], [], {}
+        shares = [total // len(clients) + (number < total % len(clients)) for number in range(len(clients))]
+
+        def worker(client, count):
+            counter = QueryCounter()
+            own_latencies, own_queries, own_statuses = [], [], {}
+            # Connections are per thread, so the wrappers only see this thread's requests
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(counter))
+                for _ in range(count):
+                    before = counter.queries
+                    started = time.perf_counter()
+                    response = self.fetch(client, url, query)
+                    own_latencies.append(time.perf_counter() - started)
+                    own_queries.append(counter.queries - before)
+                    own_statuses[response.status_code] = own_statuses.get(response.status_code, 0) + 1
+            connections.close_all()
+            with lock:
+                latencies.extend(own_latencies)
+                queries.extend(own_queries)
+                for code, count in own_statuses.items():
+                    statuses[code] = statuses.get(code, 0) + count
+
+        threads = [threading.Thread(target=worker, args=(client, count)) for client, count in zip(clients, shares) if count]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'requests': len(latencies),
+            'throughput_rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'queries_per_request': round(sum(queries) / len(queries), 2) if queries else 0,
+            'max_queries': max(queries, default=0),
+            'status_counts': {str(code): count for code, count in sorted(statuses.items())},
+        }
+
+    def peak_memory(self, client, url, query):
+        # Peak Python allocations during one request, over what was allocated before it
+        tracemalloc.start()
+        try:
+            baseline, _ = tracemalloc.get_traced_memory()
+            self.fetch(client, url, query)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return round((peak - baseline) / 1024, 1)
+
+    def report(self, name, result, previous=None):
+        line = (
+            f"{name:>24}: p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  "
+            f"{result['throughput_rps']:7.1f} req/s  {result['queries_per_request']:5.1f} queries  "
+            f"{result['peak_memory_kib']:8.1f} KiB peak  status {result['status']}"
+        )
+        if previous:
+            changes = []
+            for key in ('p50_ms', 'p99_ms', 'throughput_rps', 'queries_per_request'):
+                if previous.get(key):
+                    changes.append(f"{key} {(result[key] - previous[key]) / previous[key] * 100:+.0f}%")
+            line += f"  [{', '.join(changes)}]"
+        self.stdout.write(line)
@@ -0,0 +1,160 @@
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+from django.db.utils import ConnectionHandler
+from apps.post.benchmarks import percentile
+
+# Writer/reader concurrency benchmark for the SQLite engine profile. Every
+# profile runs the same workload against its own scratch database file:
+# writers add comments (read a post, insert, bump its counter) and record
+# logins (read a user, update it, insert a code) in transactions, as the API
+# does, while readers page through recent comments.
+
+PROFILES = {
+    # Stock backend, a new connection per request (CONN_MAX_AGE = 0)
+    'stock': {'ENGINE': 'django.db.backends.sqlite3', 'PERSISTENT': False},
+    # blog_server.sqlite: WAL, tuned pragmas, BEGIN IMMEDIATE, connection kept per thread
+    'tuned': {'ENGINE': 'blog_server.sqlite', 'PERSISTENT': True},
+}
+
+SCHEMA = [
+    "CREATE TABLE bench_post (id INTEGER PRIMARY KEY, comment_count INTEGER NOT NULL DEFAULT 0)",
+    "CREATE TABLE bench_comment (id INTEGER PRIMARY KEY, post_id INTEGER NOT NULL, body TEXT NOT NULL, created_at REAL NOT NULL)",
+    "CREATE INDEX bench_comment_post ON bench_comment (post_id)",
+    "CREATE TABLE bench_user (id INTEGER PRIMARY KEY, last_login REAL)",
+    "CREATE TABLE bench_code (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, code TEXT NOT NULL, created_at REAL NOT NULL)",
+]
+ROWS = 1000  # Posts and users seeded before the run
+
+
+def add_comment(cursor, rng):
+    post_id = rng.randrange(ROWS)
+    cursor.execute("SELECT comment_count FROM bench_post WHERE id = %s", [post_id])
+    cursor.fetchone()
+    cursor.execute("INSERT INTO bench_comment (post_id, body, created_at) VALUES (%s, %s, %s)",
+                   [post_id, 'x' * rng.randrange(20, 400), time.time()])
+    cursor.execute("UPDATE bench_post SET comment_count = comment_count + 1 WHERE id = %s", [post_id])
+
+
+def record_login(cursor, rng):
+    user_id = rng.randrange(ROWS)
+    cursor.execute("SELECT last_login FROM bench_user WHERE id = %s", [user_id])
+    cursor.fetchone()
+    cursor.execute("UPDATE bench_user SET last_login = %s WHERE id = %s", [time.time(), user_id])
+    cursor.execute("INSERT INTO bench_code (user_id, code, created_at) VALUES (%s, %s, %s)",
+                   [user_id, f'{rng.randrange(10 ** 6):06d}', time.time()])
+
+
+def read_comments(cursor, rng):
+    cursor.execute("SELECT id, post_id, body FROM bench_comment WHERE post_id = %s ORDER BY id DESC LIMIT 20",
+                   [rng.randrange(ROWS)])
+    cursor.fetchall()
+    cursor.execute("SELECT id, body FROM bench_comment ORDER BY id DESC LIMIT 20")
+    cursor.fetchall()
+
+
+class Command(BaseCommand):
+    help = "Compare write throughput of the stock and tuned SQLite profiles under concurrent load."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help="Threads running write transactions.")
+        parser.add_argument('--readers', type=int, default=4, help="Threads running read queries.")
+        parser.add_argument('--seconds', type=float, default=5.0, help="Duration of each profile's run.")
+        parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES))
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp(prefix='sqlite-bench-')
+        results = {}
+        try:
+            for name in options['profiles']:
+                path = os.path.join(directory, f'{name}.sqlite3')
+                results[name] = self.run_profile(PROFILES[name], path, options)
+                self.report(name, results[name])
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        if 'stock' in results and 'tuned' in results and results['stock']['writes_per_second']:
+            factor = results['tuned']['writes_per_second'] / results['stock']['writes_per_second']
+            self.stdout.write(self.style.SUCCESS(f"Tuned profile: {factor:.1f}x the stock write throughput"))
+
+    def run_profile(self, profile, path, options):
+        handler = ConnectionHandler({'default': {'ENGINE': profile['ENGINE'], 'NAME': path}})
+        setup = handler['default']
+        with setup.cursor() as cursor:
+            for statement in SCHEMA:
+                cursor.execute(statement)
+            for table in ('bench_post', 'bench_user'):
+                cursor.execute(f"WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < {ROWS - 1}) "
+                               f"INSERT INTO {table} (id) SELECT i FROM n")
+        setup.close()
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        totals = {'writes': 0, 'write_errors': 0, 'reads': 0, 'read_errors': 0, 'latencies': []}
+
+        def worker(number, write):
+            # Connections are thread-local in a ConnectionHandler, as in the request threads
+            connection = handler['default']
+            rng = random.Random(number)
+            done = errors = 0
+            latencies = []
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    if write:
+                        connection.ensure_connection()
+                        connection._start_transaction_under_autocommit()  # What atomic() issues
+                        with connection.cursor() as cursor:
+                            (add_comment if rng.random() < 0.7 else record_login)(cursor, rng)
+                            cursor.execute("COMMIT")
+                    else:
+                        with connection.cursor() as cursor:
+                            read_comments(cursor, rng)
+                except DatabaseError:
+                    errors += 1
+                    if connection.connection is not None and connection.connection.in_transaction:
+                        connection.connection.rollback()
+                else:
+                    done += 1
+                    latencies.append(time.perf_counter() - started)
+                if not profile['PERSISTENT']:
+                    connection.close()
+            connection.close()
+            with lock:
+                totals['writes' if write else 'reads'] += done
+                totals['write_errors' if write else 'read_errors'] += errors
+                if write:
+                    totals['latencies'].extend(latencies)
+
+        threads = [threading.Thread(target=worker, args=(number, True)) for number in range(options['writers'])]
+        threads += [threading.Thread(target=worker, args=(1000 + number, False)) for number in range(options['readers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies = totals['latencies']
+        return {
+            'writes_per_second': totals['writes'] / elapsed,
+            'reads_per_second': totals['reads'] / elapsed,
+            'write_errors': totals['write_errors'],
+            'read_errors': totals['read_errors'],
+            'write_p50_ms': percentile(latencies, 0.50) * 1000,
+            'write_p99_ms': percentile(latencies, 0.99) * 1000,
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:>6}: {result['writes_per_second']:8.0f} writes/s  {result['reads_per_second']:8.0f} reads/s  "
+            f"write p50 {result['write_p50_ms']:6.1f} ms  p99 {result['write_p99_ms']:7.1f} ms  "
+            f"locked errors: {result['write_errors']} writes, {result['read_errors']} reads"
+        )
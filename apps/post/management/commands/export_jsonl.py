@@ -0,0 +1,37 @@
+import sys
+import time
+from django.core.management.base import BaseCommand
+from apps.post import transfer
+
+
+class Command(BaseCommand):
+    help = "Export users, posts and comments to a JSONL file (use - for stdout)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, or - to write to stdout.")
+        parser.add_argument('--models', nargs='+', choices=list(transfer.MODELS), default=list(transfer.MODELS),
+                            help="Models to export; always written in dependency order.")
+        parser.add_argument('--batch-size', type=int, default=transfer.DEFAULT_BATCH_SIZE, help="Rows fetched per query.")
+
+    def handle(self, *args, **options):
+        # Progress goes to stderr when the data itself is written to stdout
+        log = self.stderr if options['path'] == '-' else self.stdout
+        stream = sys.stdout if options['path'] == '-' else open(options['path'], 'w', encoding='utf-8')
+        started = time.monotonic()
+        grand_total = 0
+        try:
+            for name, model in transfer.MODELS.items():
+                if name not in options['models']:
+                    continue
+                model_started = time.monotonic()
+
+                def progress(count):
+                    rate = count / max(time.monotonic() - model_started, 1e-6)
+                    log.write(f"Exported {count} {name} ({rate:.0f} rows/s)", ending='\r')
+
+                grand_total += transfer.export_rows(model, stream, options['batch_size'], progress)
+                log.write('')
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        log.write(self.style.SUCCESS(f"Exported {grand_total} rows in {time.monotonic() - started:.1f}s"))
@@ -0,0 +1,50 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from apps.post import dataset, transfer
+
+
+class Command(BaseCommand):
+    help = "Insert a seeded synthetic dataset of users, posts, comments and login codes for scale testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=1000000)
+        parser.add_argument('--login-codes', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=0, help="Same seed and sizes, same rows.")
+        parser.add_argument('--days', type=int, default=365, help="Period the timestamps are spread over.")
+        parser.add_argument('--batch-size', type=int, default=dataset.DEFAULT_BATCH_SIZE,
+                            help="Rows inserted per transaction.")
+        parser.add_argument('--skip-derived', action='store_true',
+                            help="Don't recompute comment counts, author stats and the search index afterwards.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        model_started = {}
+
+        def progress(model, total):
+            model_started.setdefault(model, time.monotonic())
+            rate = total / max(time.monotonic() - model_started[model], 1e-6)
+            self.stdout.write(f"Inserted {total} {model._meta.verbose_name_plural} ({rate:.0f} rows/s)", ending='\r')
+
+        try:
+            generator = dataset.Generator(
+                users=options['users'], posts=options['posts'], comments=options['comments'],
+                login_codes=options['login_codes'], seed=options['seed'], days=options['days'],
+                batch_size=options['batch_size'], progress=progress,
+            )
+            counts = generator.run()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write('')
+
+        for model, total in counts.items():
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {total}")
+        if not options['skip_derived']:
+            derived_started = time.monotonic()
+            transfer.refresh_derived_data()
+            self.stdout.write(f"Refreshed counters and search index in {time.monotonic() - derived_started:.1f}s")
+        self.stdout.write(self.style.SUCCESS(
+            f"Inserted {sum(counts.values())} rows in {time.monotonic() - started:.1f}s; "
+            f"every user's password is {dataset.DEFAULT_PASSWORD!r}"
+        ))
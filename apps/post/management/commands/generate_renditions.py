@@ -0,0 +1,45 @@
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from apps.post.models import Post
+from apps.post import cache as post_cache
+from blog_server import renditions
+
+
+class Command(BaseCommand):
+    help = "Create missing photo renditions for existing posts and users."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Re-create renditions that already exist.")
+        parser.add_argument('--only', choices=['posts', 'users'], help="Process one model only.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        targets = [('posts', Post), ('users', get_user_model())]
+        created = changed = 0
+        for label, model in targets:
+            if options['only'] and options['only'] != label:
+                continue
+            # Several rows can share one file, e.g. the default photo
+            names = model.objects.exclude(photo='').order_by().values_list('photo', flat=True).distinct()
+            field = model._meta.get_field('photo')
+            for count, name in enumerate(names.iterator(), 1):
+                fieldfile = field.attr_class(None, field, name)
+                generated = renditions.generate(fieldfile, force=options['force'])
+                if generated:
+                    created += 1
+                elif not renditions.has_renditions(fieldfile):
+                    continue
+                # Rows imported with existing renditions are only recorded here
+                if renditions.record_rendered(model, 'photo', name) or generated:
+                    changed += 1
+                    if model is Post:
+                        for post_id in Post.objects.filter(photo=name).values_list('id', flat=True).iterator():
+                            post_cache.invalidate_post(post_id)
+                self.stdout.write(f"Checked {count} {label} photos", ending='\r')
+            self.stdout.write('')
+
+        if changed:
+            post_cache.invalidate_list()  # Author cards in cached lists were rendered without the new URLs
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Created renditions for {created} photos in {elapsed:.1f}s"))
@@ -0,0 +1,47 @@
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from apps.post import transfer
+
+
+class Command(BaseCommand):
+    help = "Import users, posts and comments from a JSONL file written by export_jsonl (use - for stdin)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or - to read from stdin.")
+        parser.add_argument('--batch-size', type=int, default=transfer.DEFAULT_BATCH_SIZE,
+                            help="Rows inserted per transaction.")
+        parser.add_argument('--skip-derived', action='store_true',
+                            help="Don't recompute comment counts, author stats and the search index afterwards.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(model, stats):
+            rate = stats['created'] / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(f"Imported {stats['created']} {model._meta.verbose_name_plural} ({rate:.0f} rows/s)", ending='\r')
+
+        importer = transfer.Importer(batch_size=options['batch_size'], progress=progress)
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], encoding='utf-8')
+        try:
+            stats = importer.load(stream)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write('')
+
+        for name, model in transfer.MODELS.items():
+            counts = stats[model]
+            self.stdout.write(f"{name}: {counts['created']} created, {counts['existing']} already present, "
+                              f"{counts['orphaned']} skipped for a missing parent")
+        if importer.user_map:
+            self.stdout.write(f"Matched {len(importer.user_map)} users to existing accounts by email")
+
+        if not options['skip_derived']:
+            derived_started = time.monotonic()
+            transfer.refresh_derived_data(options['batch_size'])
+            self.stdout.write(f"Refreshed counters and search index in {time.monotonic() - derived_started:.1f}s")
+        created = sum(counts['created'] for counts in stats.values())
+        self.stdout.write(self.style.SUCCESS(f"Imported {created} rows in {time.monotonic() - started:.1f}s"))
@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.post import trending
+
+
+class Command(BaseCommand):
+    help = "Recompute the trending posts ranking served by /post/posts/trending/."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep recomputing instead of exiting after one pass.")
+        parser.add_argument('--interval', type=float, default=300.0, help="Seconds between passes with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            ranked = trending.recompute()
+            self.stdout.write(f"Ranked {ranked} trending posts in {time.monotonic() - started:.2f}s")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
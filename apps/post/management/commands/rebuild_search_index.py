@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from apps.post.models import Post
+from apps.post import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for all posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows inserted per statement batch.")
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("The post_search FTS5 table is missing. Run migrate on an SQLite database first.")
+
+        started = time.monotonic()
+        rows = Post.objects.order_by().values_list('id', 'title', 'content').iterator(chunk_size=options['batch_size'])
+
+        def progress(count):
+            self.stdout.write(f"Indexed {count} posts", ending='\r')
+
+        total = search.rebuild(rows, batch_size=options['batch_size'], progress=progress)
+        elapsed = time.monotonic() - started
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} posts in {elapsed:.1f}s"))
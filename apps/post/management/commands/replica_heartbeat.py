@@ -0,0 +1,40 @@
+import sqlite3
+import time
+from contextlib import closing
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from blog_server import db_router
+
+
+class Command(BaseCommand):
+    help = "Write the replication heartbeat that read replicas are lag-checked against."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep beating instead of exiting after one beat.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between beats with --loop.")
+        parser.add_argument('--copy-sqlite', action='store_true',
+                            help="Also copy the primary SQLite file over every replica, emulating replication locally.")
+
+    def handle(self, *args, **options):
+        config = db_router.routing_config()
+        primary = connections[db_router.PRIMARY].settings_dict
+        if options['copy_sqlite']:
+            aliases = [db_router.PRIMARY] + list(config['REPLICAS'])
+            if any(connections[alias].vendor != 'sqlite' for alias in aliases):
+                raise CommandError("--copy-sqlite needs SQLite for the primary and every replica.")
+
+        while True:
+            db_router.beat()
+            if options['copy_sqlite']:
+                started = time.monotonic()
+                for alias in config['REPLICAS']:
+                    self.copy_sqlite(primary['NAME'], connections[alias].settings_dict['NAME'])
+                self.stdout.write(f"Copied primary to {len(config['REPLICAS'])} replicas in {time.monotonic() - started:.2f}s")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def copy_sqlite(self, source, target):
+        # The backup API takes a consistent snapshot even while the primary is being written
+        with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(target)) as dst:
+            src.backup(dst)
@@ -0,0 +1,42 @@
+# Generated by Django 5.1 on 2026-10-18 18:10
+
+from django.db import migrations
+from django.db.utils import DatabaseError
+
+
+def create_search_table(apps, schema_editor):
+    # FTS5 is SQLite specific; other backends fall back to LIKE search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS post_search "
+            "USING fts5(post_id UNINDEXED, title, content, tokenize='porter unicode61')"
+        )
+    except DatabaseError:
+        # SQLite built without FTS5
+        return
+
+    Post = apps.get_model('post', 'Post')
+    with schema_editor.connection.cursor() as cursor:
+        for post_id, title, content in Post.objects.values_list('id', 'title', 'content').iterator(chunk_size=1000):
+            cursor.execute(
+                "INSERT OR REPLACE INTO post_search(rowid, post_id, title, content) VALUES (%s, %s, %s, %s)",
+                [int.from_bytes(post_id.bytes[:8], 'big', signed=True), post_id.hex, title, content],
+            )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS post_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0004_post_author_published_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
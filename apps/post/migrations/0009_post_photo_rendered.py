@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0008_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='photo_rendered',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+    ]
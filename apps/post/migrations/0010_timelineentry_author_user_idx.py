@@ -0,0 +1,19 @@
+# Generated by Django 5.1 on 2026-10-18 19:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0009_post_photo_rendered'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['author', 'user'], name='timeline_author_user_idx'),
+        ),
+    ]
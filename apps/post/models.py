@@ -8,14 +8,23 @@ class Post(models.Model):
 
     title = models.TextField()  # Title of the blog post
     photo = models.ImageField(upload_to='user_post/', default='user_post/default.png', blank=True)
+    photo_rendered = models.CharField(max_length=100, blank=True, editable=False)  # Photo whose renditions exist, see blog_server.renditions
     author = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='author_post', db_index=False)
     content = models.TextField()  # Main content of the post
     created_at = models.DateTimeField(auto_now_add=True)  # Date and time when the post was created
     updated_at = models.DateTimeField(auto_now=True)  # Date and time when the post was last updated
     published_at = models.DateTimeField(default=timezone.now)  # Date and time when the post was published
+    comment_count = models.PositiveIntegerField(default=0, editable=False)  # Maintained by apps.comment.signals
+    view_count = models.PositiveBigIntegerField(default=0, editable=False)  # Added in batches by apps.post.view_counts
 
     class Meta:
-        ordering = ['-published_at']  # Orders posts by the most recent published date first
+        ordering = ['-published_at', '-id']  # Orders posts by the most recent published date first
+        indexes = [
+            # Backs the keyset pagination in post_list: (published_at, id) range scans
+            models.Index(fields=['-published_at', '-id'], name='post_published_id_idx'),
+            # Per-author listings and AuthorStats.last_published_at lookups
+            models.Index(fields=['author', '-published_at'], name='post_author_published_idx'),
+        ]
 
     def __str__(self):
         return self.title  # Returns the title as the string representation of the post
@@ -23,3 +32,64 @@ class Post(models.Model):
     def get_absolute_url(self):
         from django.urls import reverse
         return reverse('post_detail', args=[self.slug])  # Returns the URL for a specific post
+
+
+class TimelineEntry(models.Model):
+    """
+    A post in a follower's home timeline, written on publish by apps.post.timeline.
+    """
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='+', db_index=False)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    author = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='+', db_index=False)  # Copied from the post, for unfollows
+    published_at = models.DateTimeField()  # Copied from the post, so a page is one range scan of the timeline index
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='timeline_unique_post'),
+        ]
+        indexes = [
+            # Keyset pages of one user's timeline, in PostCursorPagination order
+            models.Index(fields=['user', '-published_at', '-post'], name='timeline_user_published_idx'),
+            # Unfollows drop one author's entries from one timeline
+            models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+            # Deleting an author cascades to their entries in every timeline
+            models.Index(fields=['author', 'user'], name='timeline_author_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} in the timeline of {self.user_id}"
+
+
+class PostHourlyViews(models.Model):
+    """
+    Views of a post per hour, added by apps.post.view_counts with each flush
+    and read by the trending ranking.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='hourly_views', db_index=False)
+    hour = models.DateTimeField()  # Start of the hour, UTC
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'hour'], name='post_hourly_views_unique'),
+        ]
+        indexes = [
+            # The ranking window and the pruning of old hours
+            models.Index(fields=['hour'], name='post_hourly_views_hour_idx'),
+        ]
+
+
+class TrendingPost(models.Model):
+    """
+    Materialized trending ranking, replaced as a whole by the rank_trending command.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='trending')
+    rank = models.PositiveIntegerField(unique=True)  # 1 is the hottest; top-N reads scan this index
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['rank']
+
+    def __str__(self):
+        return f"#{self.rank} {self.post_id}"
@@ -0,0 +1,143 @@
+import base64
+import json
+from uuid import UUID
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+class PostCursorPagination(BasePagination):
+    """
+    Keyset pagination over (published_at, id), matching Post.Meta.ordering.
+
+    The cursor is an opaque token holding the position of the last row seen, so
+    every page is a single indexed range scan and no COUNT(*) is ever issued.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE or 10
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        paginate_queryset for async views, fetching the page with the async ORM.
+        """
+        queryset = self.page_queryset(queryset, request)
+        return self.set_page([row async for row in queryset])
+
+    def page_queryset(self, queryset, request, fields=('published_at', 'id')):
+        """
+        Restrict queryset to the requested page. fields names the publish time
+        and post id columns, for querysets of rows that point at posts.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.size = self.get_page_size(request)
+        self.position = position = self.decode_cursor(request)
+        time_field, id_field = fields
+
+        if position is None:
+            published_at, pk, self.reverse = None, None, False
+        else:
+            published_at, pk, self.reverse = position
+
+        if self.reverse:
+            queryset = queryset.order_by(time_field, id_field)
+            if position is not None:
+                queryset = queryset.filter(
+                    Q(**{f'{time_field}__gt': published_at}) | Q(**{time_field: published_at, f'{id_field}__gt': pk})
+                )
+        else:
+            queryset = queryset.order_by(f'-{time_field}', f'-{id_field}')
+            if position is not None:
+                queryset = queryset.filter(
+                    Q(**{f'{time_field}__lt': published_at}) | Q(**{time_field: published_at, f'{id_field}__lt': pk})
+                )
+
+        # Fetch one extra row to find out whether another page exists
+        return queryset[:self.size + 1]
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.size
+        rows = rows[:self.size]
+
+        if self.reverse:
+            rows.reverse()
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            published_at = parse_datetime(payload['p'])
+            pk = UUID(payload['i'])
+            reverse = bool(payload.get('r', False))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if published_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return published_at, pk, reverse
+
+    def encode_cursor(self, post, reverse=False):
+        payload = {'p': post.published_at.isoformat(), 'i': post.id.hex}
+        if reverse:
+            payload['r'] = 1
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        return replace_query_param(self.base_url, self.cursor_query_param, token.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Walked past the end; the previous page starts from the top again
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,132 @@
+import uuid
+from django.db import connection, connections, transaction
+from django.utils.html import escape
+
+# SQLite FTS5 index over Post.title/content. Each post is stored under a rowid
+# derived from its UUID, so upserts and deletes are O(log n) rowid lookups rather
+# than scans of the UNINDEXED post_id column.
+SEARCH_TABLE = 'post_search'
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+# FTS5 returns the stored text unescaped, so matches are marked with control
+# characters that can't be markup, and only swapped for <mark> after escaping
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+TITLE_WEIGHT = 10.0  # bm25() weight of a title hit relative to a content hit
+
+UPSERT_SQL = f"INSERT OR REPLACE INTO {SEARCH_TABLE}(rowid, post_id, title, content) VALUES (%s, %s, %s, %s)"
+DELETE_SQL = f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s"
+SEARCH_SQL = (
+    f"SELECT post_id, "
+    f"highlight({SEARCH_TABLE}, 1, %s, %s), "
+    f"snippet({SEARCH_TABLE}, 2, %s, %s, '…', 24), "
+    f"bm25({SEARCH_TABLE}, 0.0, %s, 1.0) AS rank "
+    f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+    f"ORDER BY rank LIMIT %s OFFSET %s"
+)
+
+_available = None
+
+
+def is_available():
+    """
+    True when the default database is SQLite and the FTS5 table exists.
+    """
+    global _available
+    if _available is None:
+        if connection.vendor != 'sqlite':
+            _available = False
+        else:
+            _available = SEARCH_TABLE in connection.introspection.table_names()
+    return _available
+
+
+def search_rowid(post_id):
+    # Signed 64-bit rowid taken from the first half of the UUID
+    if not isinstance(post_id, uuid.UUID):
+        post_id = uuid.UUID(str(post_id))
+    return int.from_bytes(post_id.bytes[:8], 'big', signed=True)
+
+
+def build_match_query(text):
+    """
+    Turn free text into an FTS5 query: every word is quoted so user input can
+    never be parsed as FTS syntax, and the last word is prefix-matched.
+    """
+    terms = ['"%s"' % word.replace('"', '""') for word in text.split()]
+    if not terms:
+        return ''
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def indexed_text(text):
+    # A stored match marker would turn into markup in the highlights
+    return text.replace(MATCH_START, '').replace(MATCH_END, '')
+
+
+def render_highlight(text):
+    """
+    HTML for a highlight() or snippet() result: the text escaped, matches in <mark>.
+    """
+    return escape(text).replace(MATCH_START, HIGHLIGHT_START).replace(MATCH_END, HIGHLIGHT_END)
+
+
+def index_post(post):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(UPSERT_SQL, [search_rowid(post.id), post.id.hex, indexed_text(post.title), indexed_text(post.content)])
+
+
+def remove_post(post_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(DELETE_SQL, [search_rowid(post_id)])
+
+
+def search(text, limit=20, offset=0, using='default'):
+    """
+    Ranked search. Returns a list of (post_id, title_highlight, content_snippet, rank),
+    best match first, with the highlight and snippet as escaped HTML. `using` picks the database, e.g. the replica the posts are read from.
+    """
+    match = build_match_query(text)
+    if not match or not is_available():
+        return []
+    params = [
+        MATCH_START, MATCH_END,
+        MATCH_START, MATCH_END,
+        TITLE_WEIGHT, match, limit, offset,
+    ]
+    with connections[using].cursor() as cursor:
+        cursor.execute(SEARCH_SQL, params)
+        return [(uuid.UUID(post_id), render_highlight(title), render_highlight(snippet), rank)
+                for post_id, title, snippet, rank in cursor.fetchall()]
+
+
+def rebuild(rows, batch_size=1000, progress=None):
+    """
+    Replace the whole index with rows of (id, title, content). Returns the number indexed.
+    """
+    total = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        batch = []
+        for post_id, title, content in rows:
+            batch.append((search_rowid(post_id), post_id.hex, indexed_text(title), indexed_text(content)))
+            if len(batch) >= batch_size:
+                cursor.executemany(UPSERT_SQL, batch)
+                total += len(batch)
+                batch = []
+                if progress:
+                    progress(total)
+        if batch:
+            cursor.executemany(UPSERT_SQL, batch)
+            total += len(batch)
+            if progress:
+                progress(total)
+        # Merge the b-tree segments written by the bulk load
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+    return total
+
@@ -1,15 +1,20 @@
 # serializers.py
 from rest_framework import serializers
 from .models import Post
-from apps.user.serializers import UserCreateSerializer  # Adjust the import path as needed
+from apps.user.serializers import AuthorCardSerializer
+from blog_server.renditions import RenditionsField
 
 class PostSerializer(serializers.ModelSerializer):
+    photo_renditions = RenditionsField(source='photo')
+
     class Meta:
         model = Post
         fields = '__all__'
 
 class UserPostSerializer(serializers.ModelSerializer):
-    author = UserCreateSerializer()  # Nest UserSerializer for the 'author' field
+    # Compact author card; querysets must select_related('author') to avoid N+1 lookups
+    author = AuthorCardSerializer(read_only=True)
+    photo_renditions = RenditionsField(source='photo')
 
     class Meta:
         model = Post
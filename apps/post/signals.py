@@ -0,0 +1,112 @@
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from apps.user.models import AuthorStats, Follow
+from blog_server import renditions
+from .models import Post
+from . import cache as post_cache
+from . import search
+from . import timeline
+
+
+# Keep AuthorStats.post_count and last_published_at in step with the post rows.
+@receiver(pre_save, sender=Post)
+def remember_previous_author(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._previous_author_id = Post.objects.filter(id=instance.id).values_list('author_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def update_author_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        AuthorStats.objects.apply_delta(instance.author_id, post_count=1)
+    else:
+        previous_author_id = getattr(instance, '_previous_author_id', None)
+        if previous_author_id and previous_author_id != instance.author_id:
+            # The post moved to another author
+            AuthorStats.objects.apply_delta(previous_author_id, create_missing=False, post_count=-1)
+            AuthorStats.objects.refresh_last_published(previous_author_id)
+            AuthorStats.objects.apply_delta(instance.author_id, post_count=1)
+    AuthorStats.objects.refresh_last_published(instance.author_id)
+
+
+@receiver(post_delete, sender=Post)
+def update_author_stats_on_delete(sender, instance, **kwargs):
+    # Never recreate rows here: the author may be part of the same cascade delete
+    AuthorStats.objects.apply_delta(instance.author_id, create_missing=False, post_count=-1)
+    AuthorStats.objects.refresh_last_published(instance.author_id)
+
+
+# Keep the full-text search index in sync with the post rows.
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_post(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_post(instance.id)
+
+
+# Deliver posts to the home timelines of the author's followers.
+@receiver(post_save, sender=Post)
+def update_timelines(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        timeline.fan_out(instance)
+    else:
+        timeline.refresh_post(instance, getattr(instance, '_previous_author_id', None))
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.follower_id, instance.followee_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.remove(instance.follower_id, instance.followee_id)
+
+
+# Invalidate cached post responses. Author cards are embedded in the post list,
+# so a change to a user's public profile invalidates the list as well.
+AUTHOR_CARD_FIELDS = {'first_name', 'last_name', 'username', 'email', 'photo'}
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_cache(sender, instance, **kwargs):
+    post_cache.invalidate_post(instance.id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_post_list_cache(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not AUTHOR_CARD_FIELDS.intersection(update_fields)):
+        return
+    post_cache.invalidate_list()
+
+
+# Create photo renditions in the background once the upload is committed. The
+# cached responses that embed them are invalidated when they are ready.
+@receiver(post_save, sender=Post)
+def schedule_post_renditions(sender, instance, raw=False, **kwargs):
+    if raw or not instance.photo or renditions.is_rendered(instance.photo):
+        return
+    on_done = partial(post_cache.invalidate_post, instance.id)
+    transaction.on_commit(partial(renditions.worker.schedule, instance.photo, on_done))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def schedule_author_renditions(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not instance.photo or renditions.is_rendered(instance.photo) or (
+            update_fields is not None and 'photo' not in update_fields):
+        return
+    transaction.on_commit(partial(renditions.worker.schedule, instance.photo, post_cache.invalidate_list))
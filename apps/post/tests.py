@@ -1,3 +1,590 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework_simplejwt.tokens import RefreshToken
+from apps.comment.models import Comment
+from apps.user.models import AuthorStats, Follow, User
+from blog_server import renditions, throttling
+from blog_server.async_views import async_reads
+from blog_server.permission import token_user_cache
+from . import cache as post_cache
+from . import transfer, trending
+from .models import Post, PostHourlyViews, TimelineEntry, TrendingPost
+from .views import apost_detail, apost_list
+from .view_counts import ViewCounter, counter as view_counter
 
-# Create your tests here.
+
+class PostTestCase(TestCase):
+    def setUp(self):
+        self.enterContext(throttling.disabled())
+        cache.clear()
+        self.addCleanup(view_counter.take)  # Views recorded by the test die with its database
+        self.author = User.objects.create_user('author@example.com', 'password')
+
+    def make_post(self, published_at=None, **fields):
+        fields.setdefault('title', 'Title')
+        fields.setdefault('content', 'Content')
+        return Post.objects.create(author=self.author, published_at=published_at or timezone.now(), **fields)
+
+
+class CursorPaginationTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        start = timezone.now() - datetime.timedelta(days=1)
+        self.posts = [self.make_post(start + datetime.timedelta(minutes=index)) for index in range(23)]
+        # Ties on published_at are broken by id
+        self.posts += [self.make_post(start + datetime.timedelta(minutes=5)) for _ in range(3)]
+        self.expected = [str(post.id) for post in sorted(self.posts, key=lambda post: (post.published_at, post.id),
+                                                          reverse=True)]
+
+    def test_next_links_walk_every_post_once_in_order(self):
+        seen = []
+        url = '/post/posts/?page_size=10'
+        while url:
+            body = self.client.get(url).json()
+            seen += [post['id'] for post in body['results']]
+            url = body['next']
+        self.assertEqual(seen, self.expected)
+
+    def test_previous_link_returns_the_same_page(self):
+        first = self.client.get('/post/posts/?page_size=10').json()
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([post['id'] for post in second['results']], self.expected[10:20])
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+
+    def test_last_page_has_no_next_link(self):
+        body = self.client.get('/post/posts/?page_size=26').json()
+        self.assertEqual(len(body['results']), 26)
+        self.assertIsNone(body['next'])
+
+    def test_page_is_one_query_without_count(self):
+        with self.assertNumQueries(1):
+            self.client.get('/post/posts/?page_size=5')
+
+    def test_page_size_is_clamped(self):
+        body = self.client.get('/post/posts/?page_size=0').json()
+        self.assertEqual(len(body['results']), 1)
+
+    def test_invalid_cursor_is_not_found(self):
+        self.assertEqual(self.client.get('/post/posts/?cursor=not-a-cursor').status_code, 404)
+
+
+class SearchTests(PostTestCase):
+    def search(self, query):
+        response = self.client.get('/post/posts/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_best_match_first(self):
+        titled = self.make_post(title='Django caching', content='Notes')
+        mentioned = self.make_post(title='Notes', content='Some words about django')
+        self.make_post(title='Unrelated', content='Nothing here')
+        self.assertEqual([post['id'] for post in self.search('django')], [str(titled.id), str(mentioned.id)])
+
+    def test_highlights_escape_stored_html(self):
+        self.make_post(title='Hello <script>alert(1)</script> world',
+                       content='Say <img src=x onerror="alert(2)"> and \x02alert\x03 again')
+        highlight = self.search('alert')[0]['highlight']
+        self.assertEqual(highlight['title'], 'Hello &lt;script&gt;<mark>alert</mark>(1)&lt;/script&gt; world')
+        self.assertNotIn('<img', highlight['content'])
+        self.assertIn('onerror=&quot;<mark>alert</mark>(2)&quot;&gt;', highlight['content'])
+        self.assertNotIn('\x02', highlight['content'])
+
+    def test_search_follows_edits_and_deletes(self):
+        post = self.make_post(title='Original', content='Content')
+        post.title = 'Renamed'
+        post.save()
+        self.assertEqual(self.search('original'), [])
+        self.assertEqual(len(self.search('renamed')), 1)
+        post.delete()
+        self.assertEqual(self.search('renamed'), [])
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get('/post/posts/search/').status_code, 400)
+
+
+class ConditionalRequestTests(PostTestCase):
+    def test_detail_answers_304_until_the_post_changes(self):
+        post = self.make_post()
+        url = f'/post/posts/{post.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            post.title = 'Changed'
+            post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_counter_changes_are_not_hidden_by_if_modified_since(self):
+        post = self.make_post()
+        url = f'/post/posts/{post.id}/'
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=post, author=self.author, content='Comment')
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comment_count'], 1)
+
+    def test_list_changes_with_author_cards(self):
+        self.make_post()
+        etag = self.client.get('/post/posts/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = 'Renamed'
+            self.author.save()
+        response = self.client.get('/post/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+
+
+class RenditionTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        storage = Post._meta.get_field('photo').storage
+        self.enterContext(mock.patch.object(storage, 'exists', side_effect=AssertionError("Storage read")))
+
+    def test_reads_do_no_storage_io(self):
+        post = self.make_post()
+        self.assertIsNone(self.client.get(f'/post/posts/{post.id}/').json()['photo_renditions'])
+        with self.captureOnCommitCallbacks(execute=True):
+            renditions.record_rendered(Post, 'photo', post.photo.name)
+            post_cache.invalidate_post(post.id)  # As the worker does once they are recorded
+        body = self.client.get(f'/post/posts/{post.id}/').json()
+        self.assertEqual(set(body['photo_renditions']), set(renditions.renditions_config()['SIZES']))
+
+    def test_new_photo_is_not_rendered_until_recorded(self):
+        post = self.make_post()
+        renditions.record_rendered(Post, 'photo', post.photo.name)
+        post.refresh_from_db()
+        self.assertTrue(renditions.is_rendered(post.photo))
+        post.photo = 'user_post/other.png'
+        self.assertFalse(renditions.is_rendered(post.photo))
+
+
+@override_settings(TRENDING={'HALF_LIFE_HOURS': 12, 'WINDOW_HOURS': 72, 'COMMENT_WEIGHT': 5.0, 'VIEW_WEIGHT': 1.0,
+                             'LIMIT': 500})
+class TrendingTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        # Half past, so activity of the hour starting n hours before is n hours old
+        self.now = timezone.now().replace(minute=30, second=0, microsecond=0)
+        self.hour = self.now.replace(minute=0)
+
+    def views(self, post, views, hours_ago=0):
+        PostHourlyViews.objects.create(post=post, hour=self.hour - datetime.timedelta(hours=hours_ago), views=views)
+
+    def comment(self, post, hours_ago=0):
+        comment = Comment.objects.create(post=post, author=self.author, content='Comment')
+        Comment.objects.filter(id=comment.id).update(created_at=self.hour - datetime.timedelta(hours=hours_ago))
+
+    def test_comments_and_views_are_weighted(self):
+        commented, viewed = self.make_post(), self.make_post()
+        self.comment(commented)
+        self.views(viewed, 3)
+        self.assertEqual(trending.scores(self.now), {commented.id: 5.0, viewed.id: 3.0})
+
+    def test_activity_halves_every_half_life(self):
+        post = self.make_post()
+        self.views(post, 4, hours_ago=12)
+        self.views(post, 8, hours_ago=24)
+        self.assertAlmostEqual(trending.scores(self.now)[post.id], 4 * 0.5 + 8 * 0.25)
+
+    def test_activity_before_the_window_is_ignored(self):
+        post, old = self.make_post(), self.make_post()
+        self.views(post, 1, hours_ago=72)
+        self.views(old, 100, hours_ago=73)
+        self.comment(old, hours_ago=73)
+        self.assertEqual(set(trending.scores(self.now)), {post.id})
+
+    def test_recompute_replaces_the_ranking(self):
+        first, second, third = self.make_post(), self.make_post(), self.make_post()
+        TrendingPost.objects.create(post=third, rank=1, score=99.0, computed_at=self.now - datetime.timedelta(hours=1))
+        self.views(first, 10)
+        self.views(second, 2)
+        self.assertEqual(trending.recompute(self.now), 2)
+        ranking = list(TrendingPost.objects.values_list('post_id', 'rank', 'computed_at'))
+        self.assertEqual(ranking, [(first.id, 1, self.now), (second.id, 2, self.now)])
+
+    def test_recompute_keeps_the_best_limit_posts(self):
+        posts = [self.make_post() for _ in range(4)]
+        for views, post in enumerate(posts, 1):
+            self.views(post, views)
+        with self.settings(TRENDING={'LIMIT': 2}):
+            self.assertEqual(trending.recompute(self.now), 2)
+        self.assertEqual(list(TrendingPost.objects.values_list('post_id', flat=True)), [posts[3].id, posts[2].id])
+
+    def test_recompute_prunes_view_buckets_outside_the_window(self):
+        post = self.make_post()
+        self.views(post, 1, hours_ago=72)
+        self.views(post, 1, hours_ago=74)
+        trending.recompute(self.now)
+        self.assertEqual(list(PostHourlyViews.objects.values_list('hour', flat=True)),
+                         [self.hour - datetime.timedelta(hours=72)])
+
+    def test_trending_changes_with_the_ranked_posts(self):
+        post = self.make_post()
+        TrendingPost.objects.create(post=post, rank=1, score=1.0, computed_at=timezone.now())
+        url = '/post/posts/trending/'
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Comment.objects.create(post=post, author=self.author, content='Comment')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['comment_count'], 1)
+        etag = response['ETag']
+        self.author.first_name = 'Renamed'
+        self.author.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class TimelineTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        token_user_cache.clear()
+        self.addCleanup(token_user_cache.clear)
+        self.reader = User.objects.create_user('reader@example.com', 'password')
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.reader).access_token)
+        self.start = timezone.now() - datetime.timedelta(days=1)
+
+    def publish(self, author, minutes):
+        return Post.objects.create(author=author, title='Title', content='Content',
+                                   published_at=self.start + datetime.timedelta(minutes=minutes))
+
+    def follow(self, user):
+        return self.client.post(f'/user/follow/{user.id}/')
+
+    def timeline(self, page_size=10):
+        seen = []
+        url = f'/post/timeline/?page_size={page_size}'
+        while url:
+            body = self.client.get(url).json()
+            seen += [post['id'] for post in body['results']]
+            url = body['next']
+        return seen
+
+    def test_following_twice_is_not_an_error(self):
+        self.assertEqual(self.follow(self.author).status_code, 201)
+        self.assertEqual(self.follow(self.author).status_code, 200)
+        self.assertEqual(Follow.objects.filter(follower=self.reader, followee=self.author).count(), 1)
+
+    def test_new_posts_are_pushed_to_followers(self):
+        self.follow(self.author)
+        post = self.publish(self.author, 1)
+        self.publish(User.objects.create_user('stranger@example.com', 'password'), 2)
+        self.assertEqual(self.timeline(), [str(post.id)])
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        posts = [self.publish(self.author, minutes) for minutes in range(3)]
+        self.follow(self.author)
+        self.assertEqual(self.timeline(), [str(post.id) for post in reversed(posts)])
+        self.assertEqual(self.client.delete(f'/user/follow/{self.author.id}/').status_code, 204)
+        self.assertEqual(self.timeline(), [])
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+
+    def test_pulled_posts_are_merged_into_every_page(self):
+        popular = User.objects.create_user('popular@example.com', 'password')
+        Follow.objects.create(follower=self.author, followee=popular)
+        with self.settings(TIMELINE={'FANOUT_LIMIT': 2}):
+            self.follow(self.author)  # One follower, pushed
+            self.follow(popular)  # Two followers, pulled
+            posts = [self.publish(self.author if minutes % 3 else popular, minutes) for minutes in range(10)]
+            self.assertFalse(TimelineEntry.objects.filter(user=self.reader, author=popular).exists())
+            expected = [str(post.id) for post in reversed(posts)]
+            self.assertEqual(self.timeline(page_size=3), expected)
+            self.assertEqual(self.timeline(page_size=4), expected)
+
+
+class PostCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.compute = mock.Mock(return_value='new')
+
+    def put(self, value, fresh_for):
+        cache.set('key', (value, time.time() + fresh_for), 60)
+
+    def test_fresh_entry_is_served(self):
+        self.put('old', 60)
+        self.assertEqual(post_cache.get_or_compute('key', self.compute), 'old')
+        self.compute.assert_not_called()
+
+    def test_stale_entry_is_served_while_another_caller_refreshes(self):
+        self.put('old', -1)
+        cache.add('key:lock', 1)
+        self.assertEqual(post_cache.get_or_compute('key', self.compute), 'old')
+        self.compute.assert_not_called()
+
+    def test_one_caller_refreshes_a_stale_entry(self):
+        self.put('old', -1)
+        self.assertEqual(post_cache.get_or_compute('key', self.compute), 'new')
+        self.assertEqual(post_cache.get_or_compute('key', self.compute), 'new')
+        self.compute.assert_called_once()
+        self.assertIsNone(cache.get('key:lock'))
+
+    def test_cold_key_waits_for_the_filling_caller(self):
+        cache.add('key:lock', 1)
+        filler = threading.Timer(0.1, post_cache.store, ['key', 'filled'])
+        filler.start()
+        self.addCleanup(filler.cancel)
+        with self.settings(POST_CACHE_COLD_WAIT=5):
+            self.assertEqual(post_cache.get_or_compute('key', self.compute), 'filled')
+        self.compute.assert_not_called()
+
+    def test_cold_key_is_computed_when_the_filler_is_too_slow(self):
+        cache.add('key:lock', 1)
+        started = time.monotonic()
+        with self.settings(POST_CACHE_COLD_WAIT=0.1):
+            self.assertEqual(post_cache.get_or_compute('key', self.compute), 'new')
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(cache.get('key:lock'), 1)  # Still the filler's
+
+    def test_lock_is_released_when_compute_raises(self):
+        self.compute.side_effect = ValueError
+        with self.assertRaises(ValueError):
+            post_cache.get_or_compute('key', self.compute)
+        self.assertIsNone(cache.get('key:lock'))
+        self.assertIsNone(cache.get('key'))
+
+    def test_versions_are_bumped_after_commit(self):
+        post_id = uuid.uuid4()
+        detail, page = post_cache.detail_key(post_id), post_cache.list_key(RequestFactory().get('/post/posts/'))
+        with self.captureOnCommitCallbacks() as callbacks:
+            post_cache.invalidate_post(post_id)
+            self.assertEqual(post_cache.detail_key(post_id), detail)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(post_cache.detail_key(post_id), detail)
+        self.assertNotEqual(post_cache.list_key(RequestFactory().get('/post/posts/')), page)
+
+    async def test_async_stale_entry_is_refreshed_once(self):
+        self.put('old', -1)
+        await cache.aadd('key:lock', 1)
+
+        async def acompute():
+            return 'new'
+        self.assertEqual(await post_cache.aget_or_compute('key', acompute), 'old')
+        await cache.adelete('key:lock')
+        self.assertEqual(await post_cache.aget_or_compute('key', acompute), 'new')
+        self.assertIsNone(await cache.aget('key:lock'))
+
+
+class ViewCountTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.counter = ViewCounter()
+        self.counter.flusher = False  # Flushed by the tests only
+        self.post = self.make_post()
+        self.other = self.make_post()
+
+    def hourly_views(self, post):
+        return sum(PostHourlyViews.objects.filter(post=post).values_list('views', flat=True))
+
+    def test_flush_adds_views_to_the_posts_and_the_hour(self):
+        self.counter.record(self.post.id, 3)
+        self.counter.record(self.other.id)
+        self.counter.record(self.other.id)
+        self.assertEqual(self.counter.flush(), 2)
+        self.counter.record(self.post.id)
+        self.assertEqual(self.counter.flush(), 1)
+        self.assertEqual(self.counter.flush(), 0)
+        self.post.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.post.view_count, self.other.view_count), (4, 2))
+        # Both flushes landed in the same hourly bucket
+        self.assertEqual(PostHourlyViews.objects.filter(post=self.post).count(), 1)
+        self.assertEqual((self.hourly_views(self.post), self.hourly_views(self.other)), (4, 2))
+
+    def test_unwritten_batches_are_put_back(self):
+        self.counter.record(self.post.id, 3)
+        self.counter.record(self.other.id, 2)
+        with self.settings(POST_VIEW_COUNTS={'BATCH_SIZE': 1}), \
+                mock.patch.object(ViewCounter, 'write', side_effect=[None, OSError('database is locked')]) as write:
+            with self.assertRaises(OSError):
+                self.counter.flush()
+        self.assertEqual(write.call_args_list[0].args, ([(self.post.id, 3)],))
+        self.assertEqual(self.counter.take(), {self.other.id: 2})
+
+    def test_views_of_deleted_posts_are_dropped(self):
+        self.counter.record(self.post.id, 3)
+        self.counter.record(self.other.id)
+        post_id = self.post.id
+        self.post.delete()
+        self.assertEqual(self.counter.flush(), 2)
+        self.assertFalse(PostHourlyViews.objects.filter(post_id=post_id).exists())
+        self.assertEqual(self.hourly_views(self.other), 1)
+
+    def test_many_pending_posts_wake_the_flusher(self):
+        with self.settings(POST_VIEW_COUNTS={'MAX_PENDING': 2}):
+            self.counter.record(self.post.id)
+            self.assertFalse(self.counter.wakeup.is_set())
+            self.counter.record(self.other.id)
+        self.assertTrue(self.counter.wakeup.is_set())
+
+    def test_detail_records_a_view_without_writing(self):
+        url = f'/post/posts/{self.post.id}/'
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(view_counter.take(), {self.post.id: 2})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 0)
+
+
+class TransferTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'dump.jsonl')
+        self.reader = User.objects.create_user('reader@example.com', 'password')
+        first = self.make_post(timezone.now() - datetime.timedelta(days=2), title='First')
+        self.make_post(title='Second')
+        root = Comment.objects.create(post=first, author=self.reader, content='Root')
+        reply = Comment.objects.create(post=first, author=self.author, parent=root, content='Reply')
+        Comment.objects.create(post=first, author=self.reader, parent=reply, content='Nested')
+        Post.objects.filter(id=first.id).update(view_count=7)
+
+    def snapshot(self):
+        return {
+            'users': sorted(User.objects.values_list('id', 'email', 'date_joined', 'updated_at')),
+            'posts': sorted(Post.objects.values_list('id', 'author_id', 'title', 'created_at', 'updated_at',
+                                                     'published_at', 'comment_count', 'view_count')),
+            'comments': sorted(Comment.objects.values_list('id', 'post_id', 'author_id', 'parent_id', 'path', 'depth',
+                                                           'reply_count', 'created_at', 'updated_at')),
+            'stats': sorted(AuthorStats.objects.values_list('user_id', 'post_count', 'comment_count')),
+        }
+
+    def wipe(self):
+        User.objects.all().delete()  # Cascades to posts and comments
+
+    def run_import(self):
+        out = io.StringIO()
+        call_command('import_jsonl', self.path, batch_size=2, stdout=out)
+        return out.getvalue()
+
+    def test_round_trip_keeps_every_row(self):
+        before = self.snapshot()
+        call_command('export_jsonl', self.path, stdout=io.StringIO())
+        self.wipe()
+        output = self.run_import()
+        self.assertIn('comments: 3 created, 0 already present, 0 skipped', output)
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(len(self.client.get('/post/posts/search/', {'q': 'first'}).json()['results']), 1)
+
+    def test_import_runs_again_without_duplicates(self):
+        call_command('export_jsonl', self.path, stdout=io.StringIO())
+        self.wipe()
+        self.run_import()
+        before = self.snapshot()
+        output = self.run_import()
+        self.assertIn('posts: 0 created, 2 already present', output)
+        self.assertEqual(self.snapshot(), before)
+
+    def test_users_are_merged_by_email(self):
+        call_command('export_jsonl', self.path, stdout=io.StringIO())
+        self.wipe()
+        existing = User.objects.create_user('author@example.com', 'password')
+        output = self.run_import()
+        self.assertIn('Matched 1 users to existing accounts by email', output)
+        self.assertEqual(User.objects.filter(email='author@example.com').count(), 1)
+        self.assertEqual(Post.objects.filter(author=existing).count(), 2)
+        self.assertEqual(Comment.objects.filter(author=existing).count(), 1)
+
+    def test_rows_without_their_parent_are_skipped(self):
+        call_command('export_jsonl', self.path, '--models', 'comments', stdout=io.StringIO())
+        lost = uuid.uuid4()
+        with open(self.path) as handle:
+            lines = handle.read().splitlines()
+        # A comment on a post that isn't there, and the thread below it with its root removed
+        records = [json.loads(line) for line in lines]
+        stray = {'model': 'comment.comment', 'pk': str(uuid.uuid4()),
+                 'fields': {**records[0]['fields'], 'post': str(lost), 'parent': None}}
+        Comment.objects.all().delete()
+        stats = transfer.Importer(batch_size=2).load([json.dumps(stray)] + lines[1:])
+        self.assertEqual(stats[Comment], {'created': 0, 'existing': 0, 'orphaned': 3})
+        self.assertFalse(Comment.objects.exists())
+
+
+class AsyncViewTests(PostTestCase):
+    """
+    The async read views, which only serve requests when ASYNC_READ_VIEWS is on.
+    """
+
+    def arequest(self, path, user=None, **headers):
+        request = AsyncRequestFactory().get(path, headers=headers)
+
+        async def auser():  # What the authentication middleware would resolve
+            return user or AnonymousUser()
+        request.auser = auser
+        return request
+
+    async def test_list_matches_the_sync_view(self):
+        for minutes in range(3):
+            await Post.objects.acreate(author=self.author, title='Title', content='Content',
+                                       published_at=timezone.now() - datetime.timedelta(minutes=minutes))
+        sync = await self.async_client.get('/post/posts/?page_size=2')
+        await cache.aclear()
+        response = await apost_list(self.arequest('/post/posts/?page_size=2'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], sync['ETag'])
+        self.assertEqual(json.loads(response.content), sync.json())
+        response = await apost_list(self.arequest('/post/posts/?page_size=2', if_none_match=sync['ETag']))
+        self.assertEqual(response.status_code, 304)
+
+    async def test_invalid_cursor_is_not_found(self):
+        response = await apost_list(self.arequest('/post/posts/?cursor=not-a-cursor'))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_detail_matches_the_sync_view(self):
+        post = await Post.objects.acreate(author=self.author, title='Title', content='Content')
+        sync = await self.async_client.get(f'/post/posts/{post.id}/')
+        await cache.aclear()
+        response = await apost_detail(self.arequest(f'/post/posts/{post.id}/'), str(post.id))
+        self.assertEqual(response['ETag'], sync['ETag'])
+        self.assertEqual(json.loads(response.content), sync.json())
+        response = await apost_detail(self.arequest(f'/post/posts/{post.id}/', if_none_match=sync['ETag']), str(post.id))
+        self.assertEqual(response.status_code, 304)
+
+    async def test_unknown_post_is_not_found(self):
+        for post_id in ['not-a-uuid', '00000000-0000-0000-0000-000000000000']:
+            response = await apost_detail(self.arequest(f'/post/posts/{post_id}/'), post_id)
+            self.assertEqual(response.status_code, 404)
+
+    async def test_throttled_request_is_refused(self):
+        rates = {'anon': '1/day', 'user': '1/day'}
+        with mock.patch.object(throttling.TokenBucketThrottle, 'THROTTLE_RATES', rates), \
+                mock.patch.object(throttling.registry, 'take', return_value=(False, 30.0)):
+            response = await apost_list(self.arequest('/post/posts/'))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+
+    async def test_async_reads_routes_by_method(self):
+        async def async_view(request):
+            return HttpResponse('async')
+
+        def sync_view(request):
+            return HttpResponse('sync')
+
+        with self.settings(ASYNC_READ_VIEWS=True):
+            view = async_reads(async_view, sync_view)
+        self.assertEqual((await view(AsyncRequestFactory().get('/'))).content, b'async')
+        self.assertEqual((await view(AsyncRequestFactory().post('/'))).content, b'sync')
+        with self.settings(ASYNC_READ_VIEWS=False):
+            self.assertIs(async_reads(async_view, sync_view), sync_view)
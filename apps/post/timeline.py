@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.db import connections, router
+from django.db.models.constants import OnConflict
+from apps.user.models import AuthorStats, Follow
+from .models import Post, TimelineEntry
+
+# Home timelines: the posts of the authors a user follows, newest first.
+#
+# Posts are pushed into TimelineEntry rows of every follower when they are
+# published (fan-out on write), so reading a timeline is one range scan of the
+# (user, -published_at, -post) index. Authors with FANOUT_LIMIT followers or
+# more are not pushed, since one post would write that many rows; readers pull
+# their recent posts from the (author, -published_at) index instead and merge
+# them into the page (fan-out on read).
+#
+# An author crossing the limit keeps the entries already pushed; the merge
+# drops the duplicates. Posts published while an author was above the limit
+# never reach the timelines if they later fall below it.
+
+DEFAULTS = {
+    'FANOUT_LIMIT': 5000,  # Followers from which an author's posts are pulled on read instead of pushed
+    'BACKFILL': 50,  # Recent posts copied into a timeline when its owner follows a pushed author
+}
+
+
+def timeline_config():
+    return {**DEFAULTS, **getattr(settings, 'TIMELINE', {})}
+
+
+def follower_count(user_id):
+    count = AuthorStats.objects.filter(user_id=user_id).values_list('follower_count', flat=True).first()
+    if count is None:
+        count = Follow.objects.filter(followee_id=user_id).count()
+    return count
+
+
+def is_pushed(author_id):
+    return follower_count(author_id) < timeline_config()['FANOUT_LIMIT']
+
+
+def fan_out(post):
+    """
+    Add a new post to its author's followers' timelines, unless the author has
+    too many followers. Returns the number of timelines written.
+    """
+    if not is_pushed(post.author_id):
+        return 0
+    connection = connections[router.db_for_write(TimelineEntry)]
+    opts, follow_opts = TimelineEntry._meta, Follow._meta
+    quote = connection.ops.quote_name
+    columns = [opts.get_field(name) for name in ('user', 'post', 'author', 'published_at')]
+    # One INSERT ... SELECT over the (followee, follower) index, however many followers
+    sql = (
+        f"{connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)} {quote(opts.db_table)} "
+        f"({', '.join(quote(field.column) for field in columns)}) "
+        f"SELECT {quote(follow_opts.get_field('follower').column)}, %s, %s, %s "
+        f"FROM {quote(follow_opts.db_table)} WHERE {quote(follow_opts.get_field('followee').column)} = %s "
+        f"{connection.ops.on_conflict_suffix_sql(columns, OnConflict.IGNORE, None, None)}"
+    )
+    params = [
+        opts.get_field('post').get_db_prep_value(post.pk, connection),
+        opts.get_field('author').get_db_prep_value(post.author_id, connection),
+        opts.get_field('published_at').get_db_prep_value(post.published_at, connection),
+        follow_opts.get_field('followee').get_db_prep_value(post.author_id, connection),
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def refresh_post(post, previous_author_id=None):
+    """
+    Keep entries in step with an edited post.
+    """
+    if previous_author_id and previous_author_id != post.author_id:
+        # Another author has other followers
+        TimelineEntry.objects.filter(post=post).delete()
+        fan_out(post)
+    else:
+        TimelineEntry.objects.filter(post=post).update(published_at=post.published_at)
+
+
+def backfill(follower_id, followee_id):
+    """
+    Copy a newly followed author's recent posts into the follower's timeline.
+    """
+    if not is_pushed(followee_id):
+        return 0  # Their posts are pulled on read
+    recent = Post.objects.filter(author_id=followee_id).order_by('-published_at').values_list('id', 'published_at')
+    entries = [TimelineEntry(user_id=follower_id, post_id=post_id, author_id=followee_id, published_at=published_at)
+               for post_id, published_at in recent[:timeline_config()['BACKFILL']]]
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    return len(entries)
+
+
+def remove(follower_id, followee_id):
+    TimelineEntry.objects.filter(user_id=follower_id, author_id=followee_id).delete()
+
+
+def pulled_authors(user_id):
+    # Followed authors whose posts are not pushed
+    return list(Follow.objects.filter(
+        follower_id=user_id, followee__stats__follower_count__gte=timeline_config()['FANOUT_LIMIT'],
+    ).values_list('followee_id', flat=True))
+
+
+def home_page(user, request, paginator):
+    """
+    One page of user's home timeline as Post objects, paginated by paginator
+    (a PostCursorPagination).
+    """
+    entries = TimelineEntry.objects.filter(user=user).values_list('published_at', 'post_id')
+    keys = list(paginator.page_queryset(entries, request, fields=('published_at', 'post_id')))
+    authors = pulled_authors(user.pk)
+    if authors:
+        pulled = Post.objects.filter(author_id__in=authors).values_list('published_at', 'id')
+        keys = sorted(set(keys) | set(paginator.page_queryset(pulled, request)), reverse=not paginator.reverse)
+    keys = keys[:paginator.size + 1]  # The extra row tells set_page whether another page exists
+
+    posts = Post.objects.select_related('author').in_bulk([post_id for _, post_id in keys])
+    return paginator.set_page([posts[post_id] for _, post_id in keys if post_id in posts])
@@ -0,0 +1,214 @@
+import datetime
+import decimal
+import json
+import uuid
+from contextlib import contextmanager
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from apps.comment.models import Comment, path_segment
+from apps.user.models import AuthorStats
+from .models import Post
+from . import cache as post_cache
+from . import search
+
+# Bulk JSONL export/import of users, posts and comments.
+#
+# Each line uses the layout of Django's own jsonl serializer,
+# {"model": "post.post", "pk": ..., "fields": {...}}, so dumps also load with
+# loaddata. Export streams rows with iterator(); import inserts fixed-size
+# batches with bulk_create, one transaction per batch, so memory stays constant
+# however large the file. Parents must precede their children in the file,
+# which export guarantees by writing users, then posts, then comments, parent
+# comments before their replies.
+
+DEFAULT_BATCH_SIZE = 2000
+MODELS = {  # Command name -> model, in dependency order
+    'users': get_user_model(),
+    'posts': Post,
+    'comments': Comment,
+}
+EXPORT_ORDERING = {Comment: ('depth',)}  # Parent comments before their replies
+
+
+def _json_default(value):
+    # Full microsecond precision; DjangoJSONEncoder would truncate to milliseconds
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, decimal.Decimal)):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def export_fields(model):
+    return [field for field in model._meta.concrete_fields if not field.primary_key]
+
+
+def export_rows(model, stream, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Write every row of model to stream as JSONL. Returns the number written.
+    """
+    fields = export_fields(model)
+    label = model._meta.label_lower
+    names = [field.name for field in fields]  # FKs are written under the field name, like loaddata expects
+    rows = model._default_manager.order_by(*EXPORT_ORDERING.get(model, ())).values_list('pk', *[field.attname for field in fields])
+    encoder = json.JSONEncoder(default=_json_default, ensure_ascii=False, separators=(',', ':'))
+    total = 0
+    for row in rows.iterator(chunk_size=batch_size):
+        record = {'model': label, 'pk': row[0], 'fields': dict(zip(names, row[1:]))}
+        stream.write(encoder.encode(record))
+        stream.write('\n')
+        total += 1
+        if progress and total % batch_size == 0:
+            progress(total)
+    if progress:
+        progress(total)
+    return total
+
+
+@contextmanager
+def preserve_timestamps(model):
+    """
+    Keep auto_now/auto_now_add values from the file instead of stamping the import time.
+    """
+    fields = [field for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Importer:
+    """
+    Insert JSONL records in batches. Rows whose pk already exists are skipped,
+    so an interrupted import can simply be run again. Users that already exist
+    under the same email are not duplicated; their posts and comments are
+    re-pointed at the existing account. Rows whose parent is missing are skipped.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.labels = {model._meta.label_lower: model for model in MODELS.values()}
+        self.user_map = {}  # Imported user id -> id of the existing account with that email
+        self.skipped_posts = set()  # Post ids that were not imported, so their comments are orphans
+        self.stats = {model: {'created': 0, 'existing': 0, 'orphaned': 0} for model in MODELS.values()}
+        self.model = None
+        self.batch = []
+
+    def load(self, lines):
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                model = self.labels[record['model']]
+            except (ValueError, KeyError) as exc:
+                raise ValueError(f"Line {number}: not a user, post or comment record ({exc})")
+            if model is not self.model:
+                self.flush()  # Parents are committed before the first child row is inserted
+                self.model = model
+            self.batch.append(self.build(model, record))
+            if len(self.batch) >= self.batch_size:
+                self.flush()
+        self.flush()
+        return self.stats
+
+    def build(self, model, record):
+        values = {}
+        for name, value in record['fields'].items():
+            field = model._meta.get_field(name)
+            if field.many_to_many:
+                continue
+            values[field.attname] = None if value is None else field.to_python(value)
+        values[model._meta.pk.attname] = model._meta.pk.to_python(record['pk'])
+        obj = model(**values)
+        for field in model._meta.concrete_fields:
+            # Timestamps missing from the file are stamped as usual
+            if (getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)) and getattr(obj, field.attname) is None:
+                setattr(obj, field.attname, timezone.now())
+        return obj
+
+    def flush(self):
+        if not self.batch:
+            return
+        model, objs = self.model, self.batch
+        self.batch = []
+        stats = self.stats[model]
+
+        existing = set(model._default_manager.filter(pk__in=[obj.pk for obj in objs]).values_list('pk', flat=True))
+        stats['existing'] += len(existing)
+        objs = [obj for obj in objs if obj.pk not in existing]
+        objs = getattr(self, f'prepare_{model._meta.model_name}')(objs)
+
+        with transaction.atomic(), preserve_timestamps(model):
+            model._default_manager.bulk_create(objs, batch_size=self.batch_size)
+        stats['created'] += len(objs)
+        if self.progress:
+            self.progress(model, stats)
+
+    def prepare_user(self, users):
+        by_email = dict(get_user_model().objects.filter(email__in=[user.email for user in users]).values_list('email', 'id'))
+        fresh = []
+        for user in users:
+            if user.email in by_email:
+                self.user_map[user.pk] = by_email[user.email]
+                self.stats[get_user_model()]['existing'] += 1
+            else:
+                fresh.append(user)
+        return fresh
+
+    def _with_authors(self, model, objs):
+        for obj in objs:
+            obj.author_id = self.user_map.get(obj.author_id, obj.author_id)
+        authors = set(get_user_model().objects.filter(id__in={obj.author_id for obj in objs}).values_list('id', flat=True))
+        kept = [obj for obj in objs if obj.author_id in authors]
+        self.stats[model]['orphaned'] += len(objs) - len(kept)
+        return kept, [obj for obj in objs if obj.author_id not in authors]
+
+    def prepare_post(self, posts):
+        kept, dropped = self._with_authors(Post, posts)
+        self.skipped_posts.update(post.pk for post in dropped)
+        return kept
+
+    def prepare_comment(self, comments):
+        kept, _ = self._with_authors(Comment, comments)
+        post_ids = {comment.post_id for comment in kept if comment.post_id not in self.skipped_posts}
+        posts = set(Post.objects.filter(id__in=post_ids).values_list('id', flat=True))
+        on_posts = [comment for comment in kept if comment.post_id in posts]
+        # Replies follow their parents in the file, possibly within this batch
+        parents = set(Comment.objects.filter(id__in={comment.parent_id for comment in on_posts if comment.parent_id})
+                      .values_list('id', flat=True))
+        valid = []
+        for comment in on_posts:
+            if comment.parent_id and comment.parent_id not in parents:
+                continue
+            if not comment.path:  # Dumps from before threaded replies
+                comment.path, comment.depth = path_segment(comment.created_at, comment.id.hex), 0
+            parents.add(comment.id)
+            valid.append(comment)
+        self.stats[Comment]['orphaned'] += len(kept) - len(valid)
+        return valid
+
+
+def refresh_derived_data(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    bulk_create bypasses the signals that maintain counters, the search index
+    and the response cache, so bring them up to date after an import.
+    """
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(total=Count('pk')).values('total')
+    Post.objects.update(comment_count=Coalesce(Subquery(comments), 0))
+    replies = Comment.objects.filter(parent=OuterRef('pk')).order_by().values('parent').annotate(total=Count('pk')).values('total')
+    Comment.objects.update(reply_count=Coalesce(Subquery(replies), 0))
+    AuthorStats.objects.rebuild_all(batch_size=batch_size)
+    if search.is_available():
+        rows = Post.objects.order_by().values_list('id', 'title', 'content').iterator(chunk_size=batch_size)
+        search.rebuild(rows, batch_size=batch_size)
+    post_cache.invalidate_list()
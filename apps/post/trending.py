@@ -0,0 +1,84 @@
+import datetime
+import heapq
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from apps.comment.models import Comment
+from .models import PostHourlyViews, TrendingPost
+
+# Trending posts: a ranking by recent activity, materialized in TrendingPost.
+#
+# rank_trending recomputes it periodically. Activity within WINDOW_HOURS is
+# read as per-hour counts grouped in SQL, comments over the created_at index
+# and views from the PostHourlyViews buckets, so the pass reads one row per
+# (post, active hour) however many comments and views there were. Each hour's
+# activity is weighted by 0.5 ** (age / HALF_LIFE_HOURS), a factor computed
+# once per hour rather than per row, and the LIMIT best posts replace the
+# table in one transaction. Readers only scan the rank index.
+
+DEFAULTS = {
+    'HALF_LIFE_HOURS': 12,  # Age at which activity counts half
+    'WINDOW_HOURS': 72,  # Older activity is ignored, and older view buckets deleted
+    'COMMENT_WEIGHT': 5.0,
+    'VIEW_WEIGHT': 1.0,
+    'LIMIT': 500,  # Posts kept in the ranking
+}
+
+
+def trending_config():
+    return {**DEFAULTS, **getattr(settings, 'TRENDING', {})}
+
+
+def hourly_activity(since):
+    """
+    (post_id, hour, comments, views) for every post and hour with activity since `since`.
+    """
+    comments = (Comment.objects.filter(created_at__gte=since)
+                .annotate(hour=TruncHour('created_at', tzinfo=datetime.timezone.utc))
+                .order_by().values('post_id', 'hour').annotate(count=Count('id'))
+                .values_list('post_id', 'hour', 'count'))
+    for post_id, hour, count in comments.iterator():
+        yield post_id, hour, count, 0
+    views = PostHourlyViews.objects.filter(hour__gte=since).values_list('post_id', 'hour', 'views')
+    for post_id, hour, count in views.iterator():
+        yield post_id, hour, 0, count
+
+
+def scores(now=None):
+    """
+    Decayed activity score of every post active within the window.
+    """
+    config = trending_config()
+    now = now or timezone.now()
+    since = (now - datetime.timedelta(hours=config['WINDOW_HOURS'])).replace(minute=0, second=0, microsecond=0)
+    decay = {}  # Hour -> weight
+    totals = {}
+    for post_id, hour, comments, views in hourly_activity(since):
+        weight = decay.get(hour)
+        if weight is None:
+            # Activity is taken to happen in the middle of its hour
+            age = max((now - hour).total_seconds() / 3600 - 0.5, 0)
+            weight = decay[hour] = 0.5 ** (age / config['HALF_LIFE_HOURS'])
+        activity = config['COMMENT_WEIGHT'] * comments + config['VIEW_WEIGHT'] * views
+        totals[post_id] = totals.get(post_id, 0) + weight * activity
+    return totals
+
+
+def recompute(now=None):
+    """
+    Replace the trending ranking and drop the view buckets that fell out of the
+    window. Returns the number of posts ranked.
+    """
+    config = trending_config()
+    now = now or timezone.now()
+    best = heapq.nlargest(config['LIMIT'], scores(now).items(), key=lambda item: (item[1], str(item[0])))
+    rows = [TrendingPost(post_id=post_id, rank=rank, score=score, computed_at=now)
+            for rank, (post_id, score) in enumerate(best, start=1)]
+    with transaction.atomic(using=router.db_for_write(TrendingPost)):
+        TrendingPost.objects.all().delete()
+        TrendingPost.objects.bulk_create(rows)
+    since = now - datetime.timedelta(hours=config['WINDOW_HOURS'] + 1)
+    PostHourlyViews.objects.filter(hour__lt=since).delete()
+    return len(rows)
@@ -1,9 +1,16 @@
 from django.urls import path
+from blog_server.async_views import async_reads
 from . import views
 
 urlpatterns = [
-    path('posts/', views.post_list, name='post_list'),  # List all posts or create a new post
-    path('posts/<str:id>/', views.post_detail, name='post_detail'),  # Retrieve, update, or delete a post by ID
-    path('posts/user/<int:user_id>/', views.posts_by_user, name='posts_by_user'),
-    path('posts/count/<int:user_id>/', views.counts_post_by_user, name='posts_by_user'),
+    path('posts/', async_reads(views.apost_list, views.post_list), name='post_list'),  # List all posts or create a new post
+    # Fixed paths must precede posts/<str:id>/
+    path('posts/search/', views.post_search, name='post_search'),
+    path('posts/trending/', views.trending_posts, name='trending_posts'),  # ?limit=, ranked by rank_trending
+    path('posts/comment-counts/', views.comment_counts, name='post_comment_counts'),
+    path('posts/count/', views.counts_post_by_users, name='counts_post_by_users'),  # Bulk variant, ?ids=<uuid>,<uuid>
+    path('posts/<str:id>/', async_reads(views.apost_detail, views.post_detail), name='post_detail'),  # Retrieve, update, or delete a post by ID
+    path('posts/user/<uuid:user_id>/', views.posts_by_user, name='posts_by_user'),
+    path('timeline/', views.home_timeline, name='home_timeline'),  # Posts of the authors the user follows
+    path('posts/count/<uuid:user_id>/', views.counts_post_by_user, name='counts_post_by_user'),
 ]
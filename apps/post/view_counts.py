@@ -0,0 +1,122 @@
+import atexit
+import logging
+import threading
+from django.conf import settings
+from django.db import close_old_connections, connections, router, transaction
+from django.utils import timezone
+from .models import Post, PostHourlyViews
+
+# Write-behind view counters for post_detail.
+#
+# A GET only adds one to an in-memory tally; a daemon thread adds the tallies
+# to Post.view_count every FLUSH_INTERVAL seconds, or as soon as MAX_PENDING
+# posts have unflushed views, in batched UPDATEs of one transaction each. The
+# request path never writes, so readers don't queue on SQLite's write lock. A
+# crashed worker loses at most one interval of its views; a clean exit flushes.
+# Responses served from the post cache show the count as of the cached render.
+# Each flush also adds its views to the post's bucket for the current hour
+# (PostHourlyViews), which the trending ranking decays by age.
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'FLUSH_INTERVAL': 5,  # Seconds between flushes, the most views a crash can lose
+    'MAX_PENDING': 1000,  # Posts with unflushed views that trigger an early flush
+    'BATCH_SIZE': 500,  # Posts updated per transaction
+}
+
+
+def view_counts_config():
+    return {**DEFAULTS, **getattr(settings, 'POST_VIEW_COUNTS', {})}
+
+
+class ViewCounter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}  # Post id -> views not yet in the database
+        self.wakeup = threading.Event()
+        self.flusher = None
+
+    def record(self, post_id, views=1):
+        with self.lock:
+            self.pending[post_id] = self.pending.get(post_id, 0) + views
+            pending = len(self.pending)
+        if self.flusher is None:
+            self.start_flusher()
+        if pending >= view_counts_config()['MAX_PENDING']:
+            self.wakeup.set()
+
+    def take(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        return pending
+
+    def flush(self):
+        """
+        Add every pending view to the database. Returns the number of posts updated.
+        """
+        pending = self.take()
+        if not pending:
+            return 0
+        items = list(pending.items())
+        batch_size = view_counts_config()['BATCH_SIZE']
+        written = 0
+        try:
+            for start in range(0, len(items), batch_size):
+                self.write(items[start:start + batch_size])
+                written = start + batch_size
+        except Exception:
+            # Put back what was not written, so a busy database only delays the counts
+            for post_id, views in items[written:]:
+                self.record(post_id, views)
+            raise
+        return len(items)
+
+    @staticmethod
+    def write(items):
+        db = router.db_for_write(Post)
+        connection = connections[db]
+        quote = connection.ops.quote_name
+        column = quote(Post._meta.get_field('view_count').column)
+        pk = Post._meta.pk
+        sql = f"UPDATE {quote(Post._meta.db_table)} SET {column} = {column} + %s WHERE {quote(pk.column)} = %s"
+        params = [(views, pk.get_db_prep_value(post_id, connection)) for post_id, views in items]
+
+        opts = PostHourlyViews._meta
+        table, post, hour, count = (quote(opts.db_table), quote(opts.get_field('post').column),
+                                    quote(opts.get_field('hour').column), quote(opts.get_field('views').column))
+        # Selected from the post table so that views of a post deleted since are dropped
+        hourly_sql = (
+            f"INSERT INTO {table} ({post}, {hour}, {count}) "
+            f"SELECT {quote(pk.column)}, %s, %s FROM {quote(Post._meta.db_table)} WHERE {quote(pk.column)} = %s "
+            f"ON CONFLICT ({post}, {hour}) DO UPDATE SET {count} = {table}.{count} + excluded.{count}"
+        )
+        now = opts.get_field('hour').get_db_prep_value(
+            timezone.now().replace(minute=0, second=0, microsecond=0), connection)
+        with transaction.atomic(using=db), connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+            cursor.executemany(hourly_sql, [(now, views, post_id) for views, post_id in params])
+
+    def start_flusher(self):
+        with self.lock:
+            if self.flusher is not None:
+                return
+            self.flusher = threading.Thread(target=self.flush_forever, name='post-view-flusher', daemon=True)
+        self.flusher.start()
+        atexit.register(self.flush_logged)
+
+    def flush_logged(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Flushing post view counts failed")
+
+    def flush_forever(self):
+        while True:
+            self.wakeup.wait(view_counts_config()['FLUSH_INTERVAL'])
+            self.wakeup.clear()
+            close_old_connections()
+            self.flush_logged()
+
+
+counter = ViewCounter()
@@ -1,17 +1,72 @@
+import uuid
+from django.db import router
+from django.db.models import Q
+from django.http import HttpResponse
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.decorators import api_view
-from .models import Post
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from .models import Post, TrendingPost
 from django.contrib.auth import get_user_model
+from apps.user.models import AuthorStats
+from apps.user.serializers import AuthorStatsSerializer
 from .serializers import PostSerializer, UserPostSerializer
+from blog_server.conditional import check_not_modified, make_etag, set_validators
+from blog_server.permission import LoginRequiredPermission
+from blog_server.async_views import aguard, error_response, json_response
+from .pagination import PostCursorPagination
+from . import cache as post_cache
+from . import search
+from . import timeline
+from .view_counts import counter as view_counter
+
+MAX_COUNT_BATCH = 100  # Upper bound on ids accepted by the batch count endpoints
+MAX_SEARCH_RESULTS = 50
+MAX_TRENDING_RESULTS = 100
+
+
+def parse_id_batch(request):
+    """
+    Parse ?ids=<uuid>,<uuid> into a set of UUIDs. Returns (ids, error_response).
+    """
+    raw_ids = [value for value in request.query_params.get('ids', '').split(',') if value]
+    if not raw_ids:
+        return None, Response({'error': 'ids query parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(raw_ids) > MAX_COUNT_BATCH:
+        return None, Response({'error': f'At most {MAX_COUNT_BATCH} ids per request'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        return {uuid.UUID(value) for value in raw_ids}, None
+    except ValueError:
+        return None, Response({'error': 'ids must be valid UUIDs'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def cached_response(request, entry):
+    """
+    Answer a GET from a post cache entry, with a 304 when the client's copy is current.
+    """
+    etag = entry['etag']
+    return check_not_modified(request, etag) or set_validators(Response(entry['data']), etag)
+
+
+def cached_json_response(request, entry):
+    # cached_response for the async views, which return plain JsonResponses
+    etag = entry['etag']
+    return check_not_modified(request, etag) or set_validators(json_response(entry['data']), etag)
 
 # GET all posts and POST a new post
 @api_view(['GET', 'POST'])
 def post_list(request):
     if request.method == 'GET':
-        posts = Post.objects.all()
-        serializer = UserPostSerializer(posts, many=True)
-        return Response(serializer.data)
+        def render_page():
+            posts = Post.objects.select_related('author')
+            paginator = PostCursorPagination()
+            page = paginator.paginate_queryset(posts, request)
+            serializer = UserPostSerializer(page, many=True, context={'request': request})
+            data = paginator.get_paginated_response(serializer.data).data
+            return post_cache.make_entry(data)
+
+        return cached_response(request, post_cache.get_or_compute(post_cache.list_key(request), render_page))
     
     elif request.method == 'POST':
         serializer = PostSerializer(data=request.data)
@@ -20,23 +75,122 @@ def post_list(request):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+async def apost_list(request):
+    # Async GET for post_list, served from the same cache entries
+    denied = await aguard(request)
+    if denied:
+        return denied
+
+    async def render_page():
+        paginator = PostCursorPagination()
+        page = await paginator.apaginate_queryset(Post.objects.select_related('author'), Request(request))
+        serializer = UserPostSerializer(page, many=True, context={'request': request})
+        data = paginator.get_paginated_response(serializer.data).data
+        return post_cache.make_entry(data)
+
+    try:
+        entry = await post_cache.aget_or_compute(await post_cache.alist_key(request), render_page)
+    except NotFound as exc:
+        return error_response(exc)
+    return cached_json_response(request, entry)
+
+@api_view(['GET'])
+def post_search(request):
+    # Ranked full-text search, e.g. ?q=django orm&limit=20&offset=0
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'error': 'q query parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), MAX_SEARCH_RESULTS)
+        offset = max(int(request.query_params.get('offset', 0)), 0)
+    except ValueError:
+        return Response({'error': 'limit and offset must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not search.is_available():
+        # No FTS5 index on this database: unranked LIKE search
+        posts = (Post.objects.select_related('author')
+                 .filter(Q(title__icontains=query) | Q(content__icontains=query))[offset:offset + limit])
+        serializer = UserPostSerializer(posts, many=True, context={'request': request})
+        return Response({'results': serializer.data})
+
+    # Index and rows come from the same database, so a replica never returns ids it lacks
+    using = router.db_for_read(Post)
+    hits = search.search(query, limit=limit, offset=offset, using=using)
+    posts = Post.objects.using(using).select_related('author').in_bulk([hit[0] for hit in hits])
+    results = []
+    for post_id, title, snippet, rank in hits:
+        post = posts.get(post_id)
+        if post is None:
+            continue
+        data = UserPostSerializer(post, context={'request': request}).data
+        data['highlight'] = {'title': title, 'content': snippet}
+        data['rank'] = rank
+        results.append(data)
+    return Response({'results': results})
+
+@api_view(['GET'])
+def trending_posts(request):
+    # Top of the ranking materialized by `manage.py rank_trending`, e.g. ?limit=10
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), MAX_TRENDING_RESULTS)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    ranked = list(TrendingPost.objects.select_related('post__author')[:limit])
+    computed_at = ranked[0].computed_at if ranked else None
+    # The body embeds the posts and author cards, which change between rankings,
+    # and their counters and renditions are written without moving updated_at.
+    # No Last-Modified, as computed_at alone doesn't cover them
+    etag = make_etag('trending', computed_at, limit, *(
+        (row.post_id, row.post.updated_at, row.post.comment_count, row.post.view_count, row.post.photo_rendered,
+         row.post.author.updated_at, row.post.author.photo_rendered)
+        for row in ranked
+    ))
+    not_modified = check_not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
+    results = []
+    for row in ranked:
+        data = UserPostSerializer(row.post, context={'request': request}).data
+        data['trending'] = {'rank': row.rank, 'score': row.score}
+        results.append(data)
+    return set_validators(Response({'results': results, 'computed_at': computed_at}), etag)
+
 # GET, PUT, DELETE a specific post by ID
 @api_view(['GET', 'PUT', 'DELETE'])
 def post_detail(request, id):
+    try:
+        id = uuid.UUID(id)
+    except ValueError:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'GET':
+        # Served from the versioned cache; only a miss touches the database
+        def render_post():
+            post = Post.objects.get(id=id)
+            return post_cache.make_entry(PostSerializer(post).data)
+
+        try:
+            entry = post_cache.get_or_compute(post_cache.detail_key(id), render_post)
+        except Post.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        view_counter.record(id)  # In memory; flushed to view_count in batches
+        return cached_response(request, entry)
+
     try:
         post = Post.objects.get(id=id)
     except Post.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
-    
-    if request.method == 'GET':
-        serializer = PostSerializer(post)
-        return Response(serializer.data)
-    
-    elif request.method == 'PUT':
+
+    if request.method == 'PUT':
         serializer = PostSerializer(post, data=request.data)
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data)
+            # Write through: the save signal bumped the version, store the fresh copy under it
+            entry = post_cache.make_entry(serializer.data)
+            post_cache.store(post_cache.detail_key(post.id), entry)
+            return set_validators(Response(serializer.data), entry['etag'])
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     elif request.method == 'DELETE':
@@ -44,6 +198,28 @@ def post_detail(request, id):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+async def apost_detail(request, id):
+    # Async GET for post_detail
+    denied = await aguard(request)
+    if denied:
+        return denied
+    try:
+        id = uuid.UUID(id)
+    except ValueError:
+        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+
+    async def render_post():
+        post = await Post.objects.aget(id=id)
+        return post_cache.make_entry(PostSerializer(post).data)
+
+    try:
+        entry = await post_cache.aget_or_compute(await post_cache.adetail_key(id), render_post)
+    except Post.DoesNotExist:
+        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+    view_counter.record(id)
+    return cached_json_response(request, entry)
+
+
 @api_view(['GET']) # Ensure the user is authenticated
 def posts_by_user(request, user_id):
     try:
@@ -58,15 +234,54 @@ def posts_by_user(request, user_id):
     return Response(serializer.data)
 
 
+@api_view(['GET'])
+@permission_classes([LoginRequiredPermission])
+def home_timeline(request):
+    # Posts of the authors the user follows, newest first, cursor paginated like post_list
+    paginator = PostCursorPagination()
+    page = timeline.home_page(request.user, request, paginator)
+    serializer = UserPostSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+
 @api_view(['GET'])
 def counts_post_by_user(request, user_id):
-    try:
-        # Get the user by their ID
-        user = get_user_model().objects.get(id=user_id)
-    except get_user_model().DoesNotExist:
-        return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+    # Served from the incrementally maintained AuthorStats row
+    stats = AuthorStats.objects.filter(user_id=user_id).first()
+    if stats is None:
+        if not get_user_model().objects.filter(id=user_id).exists():
+            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+        stats = AuthorStats.objects.rebuild(user_id)
+
+    return Response(AuthorStatsSerializer(stats).data, status=status.HTTP_200_OK)
 
-    # Get the count of posts by the user
-    post_count = Post.objects.filter(author=user).count()
 
-    return Response({'post_count': post_count}, status=status.HTTP_200_OK)
\ No newline at end of file
+@api_view(['GET'])
+def counts_post_by_users(request):
+    # Author stats for a batch of users, e.g. ?ids=<uuid>,<uuid>
+    user_ids, error = parse_id_batch(request)
+    if error:
+        return error
+
+    stats = AuthorStats.objects.filter(user_id__in=user_ids)
+    data = {str(row.user_id): AuthorStatsSerializer(row).data for row in stats}
+
+    # Users without a stats row have not posted or commented yet
+    missing = user_ids - {uuid.UUID(user_id) for user_id in data}
+    if missing:
+        empty = AuthorStatsSerializer(AuthorStats()).data
+        for user_id in get_user_model().objects.filter(id__in=missing).values_list('id', flat=True):
+            data[str(user_id)] = empty
+    return Response({'stats': data}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def comment_counts(request):
+    # Comment counts for a batch of posts, e.g. ?ids=<uuid>,<uuid>
+    post_ids, error = parse_id_batch(request)
+    if error:
+        return error
+
+    # Served from the maintained Post.comment_count column, one indexed lookup for the batch
+    rows = Post.objects.filter(id__in=post_ids).values_list('id', 'comment_count')
+    return Response({'counts': {str(post_id): count for post_id, count in rows}}, status=status.HTTP_200_OK)
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
-from .models import User
+from .models import User, OutboundEmail
 
 class UserAdmin(BaseUserAdmin):
     # The fields to be used in displaying the User model.
@@ -24,3 +24,10 @@ class UserAdmin(BaseUserAdmin):
     ordering = ('email',)
 
 admin.site.register(User, UserAdmin)
+
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    readonly_fields = ('claim_token', 'claimed_at')
+
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
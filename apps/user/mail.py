@@ -0,0 +1,185 @@
+import logging
+import threading
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from .models import OutboundEmail
+
+logger = logging.getLogger("apps.user")
+
+DEFAULTS = {
+    'IN_PROCESS_WORKERS': 2,  # Sender threads started in each web process; 0 leaves sending to send_queued_email
+    'BATCH_SIZE': 50,  # Rows claimed and sent over one SMTP session at a time
+    'POLL_INTERVAL': 30,  # Seconds an idle worker waits before checking for retries
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BACKOFF': 30,  # Seconds before the first retry, doubled on each attempt
+    'CLAIM_TIMEOUT': 600,  # Seconds after which a claim by a crashed worker is released
+}
+
+
+def outbox_config():
+    return {**DEFAULTS, **getattr(settings, 'EMAIL_OUTBOX', {})}
+
+
+def queue_email(subject, body, recipients, from_email=None):
+    """
+    Store an email in the outbox and wake the sender workers once the current
+    transaction commits. Returns the OutboundEmail row.
+    """
+    email = OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=','.join(recipients),
+    )
+    transaction.on_commit(dispatcher.notify)
+    return email
+
+
+def claim_batch(batch_size):
+    """
+    Atomically claim up to batch_size due rows for this worker, across threads
+    and processes: only rows still pending at UPDATE time get our token.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=outbox_config()['CLAIM_TIMEOUT'])
+    OutboundEmail.objects.filter(status=OutboundEmail.SENDING, claimed_at__lt=stale).update(
+        status=OutboundEmail.PENDING, claim_token=None, claimed_at=None,
+    )
+
+    due = (OutboundEmail.objects.filter(status=OutboundEmail.PENDING, next_attempt_at__lte=now)
+           .order_by('next_attempt_at').values_list('id', flat=True)[:batch_size])
+    token = uuid.uuid4()
+    claimed = OutboundEmail.objects.filter(id__in=list(due), status=OutboundEmail.PENDING).update(
+        status=OutboundEmail.SENDING, claim_token=token, claimed_at=now,
+    )
+    if not claimed:
+        return []
+    return list(OutboundEmail.objects.filter(claim_token=token))
+
+
+def send_pending(batch_size=None, connection=None):
+    """
+    Claim and send one batch over a single mail connection. Returns the number
+    of rows processed. Pass an open connection to reuse it across batches.
+    """
+    config = outbox_config()
+    rows = claim_batch(batch_size or config['BATCH_SIZE'])
+    if not rows:
+        return 0
+
+    own_connection = connection is None
+    if own_connection:
+        connection = get_connection()
+    sent_ids, done_ids = [], set()
+    try:
+        connection.open()
+        for row in rows:
+            message = EmailMessage(row.subject, row.body, row.from_email, row.to.split(','), connection=connection)
+            try:
+                connection.send_messages([message])
+            except Exception as exc:
+                record_failure(row, exc, config)
+                done_ids.add(row.id)
+                # The session may be unusable now; reconnect for the rest of the batch
+                connection.close()
+                connection.open()
+            else:
+                sent_ids.append(row.id)
+                done_ids.add(row.id)
+    finally:
+        # Bodies hold verification codes; nothing needs them once they are delivered
+        OutboundEmail.objects.filter(id__in=sent_ids).update(
+            status=OutboundEmail.SENT, sent_at=timezone.now(), claim_token=None, last_error='', body='',
+        )
+        # Hand back rows this batch never got to, e.g. when reconnecting failed
+        unsent = [row.id for row in rows if row.id not in done_ids]
+        if unsent:
+            OutboundEmail.objects.filter(id__in=unsent).update(
+                status=OutboundEmail.PENDING, claim_token=None, claimed_at=None,
+            )
+        if own_connection:
+            connection.close()
+    return len(rows)
+
+
+def record_failure(row, exc, config):
+    attempts = row.attempts + 1
+    body = row.body
+    if attempts >= config['MAX_ATTEMPTS']:
+        status, body = OutboundEmail.FAILED, ''  # Never sent again, so don't keep the code either
+        logger.error("Giving up on email %s to %s after %s attempts: %s", row.id, row.to, attempts, exc)
+    else:
+        status = OutboundEmail.PENDING
+        logger.warning("Email %s to %s failed (attempt %s): %s", row.id, row.to, attempts, exc)
+    OutboundEmail.objects.filter(id=row.id).update(
+        status=status,
+        body=body,
+        attempts=attempts,
+        last_error=str(exc)[:1000],
+        claim_token=None,
+        claimed_at=None,
+        next_attempt_at=timezone.now() + timedelta(seconds=config['RETRY_BACKOFF'] * 2 ** (attempts - 1)),
+    )
+
+
+def drain(connection=None):
+    """
+    Send batches until nothing is due. Returns the number of rows processed.
+    """
+    total = 0
+    while True:
+        processed = send_pending(connection=connection)
+        if not processed:
+            return total
+        total += processed
+
+
+class EmailDispatcher:
+    """
+    Pool of daemon threads that send outbox rows. Each thread keeps its mail
+    connection open while there is work and closes it once the outbox is idle.
+    """
+
+    def __init__(self):
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def notify(self):
+        if not self.threads:
+            self.start()
+        self.wakeup.set()
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for number in range(outbox_config()['IN_PROCESS_WORKERS']):
+                thread = threading.Thread(target=self.run, name=f'email-sender-{number}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def run(self):
+        connection = None
+        poll_interval = outbox_config()['POLL_INTERVAL']
+        while True:
+            woken = self.wakeup.wait(poll_interval)
+            self.wakeup.clear()
+            close_old_connections()
+            try:
+                if connection is None:
+                    connection = get_connection()
+                drain(connection=connection)
+            except Exception:
+                logger.exception("Email sender failed")
+            if not woken and connection is not None:
+                # Idle: release the SMTP session rather than letting the server time it out
+                connection.close()
+                connection = None
+
+
+dispatcher = EmailDispatcher()
@@ -0,0 +1,28 @@
+import time
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from apps.user.mail import drain, outbox_config
+
+
+class Command(BaseCommand):
+    help = "Send due emails from the outbox. Use --loop to run as a dedicated sender process."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep polling the outbox instead of exiting when it is empty.")
+
+    def handle(self, *args, **options):
+        connection = get_connection()
+        try:
+            while True:
+                started = time.monotonic()
+                total = drain(connection=connection)
+                if total:
+                    self.stdout.write(f"Processed {total} emails in {time.monotonic() - started:.1f}s")
+                if not options['loop']:
+                    break
+                connection.close()  # Don't hold an idle SMTP session between polls
+                time.sleep(outbox_config()['POLL_INTERVAL'])
+                close_old_connections()
+        finally:
+            connection.close()
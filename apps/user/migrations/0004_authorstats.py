@@ -0,0 +1,53 @@
+# Generated by Django 5.1 on 2026-10-18 18:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_author_stats(apps, schema_editor):
+    User = apps.get_model('user', 'User')
+    Post = apps.get_model('post', 'Post')
+    Comment = apps.get_model('comment', 'Comment')
+    AuthorStats = apps.get_model('user', 'AuthorStats')
+
+    posts = Post.objects.filter(author=OuterRef('pk')).order_by().values('author')
+    comments = Comment.objects.filter(author=OuterRef('pk')).order_by().values('author')
+    users = User.objects.annotate(
+        post_total=Coalesce(Subquery(posts.annotate(total=Count('pk')).values('total')), 0),
+        comment_total=Coalesce(Subquery(comments.annotate(total=Count('pk')).values('total')), 0),
+        latest=Subquery(posts.annotate(latest=Max('published_at')).values('latest')),
+    ).values_list('pk', 'post_total', 'comment_total', 'latest')
+
+    batch = []
+    for user_id, post_total, comment_total, latest in users.iterator(chunk_size=2000):
+        batch.append(AuthorStats(user_id=user_id, post_count=post_total, comment_count=comment_total, last_published_at=latest))
+        if len(batch) >= 2000:
+            AuthorStats.objects.bulk_create(batch)
+            batch = []
+    AuthorStats.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0003_user_is_verified_logincode'),
+        ('post', '0004_post_author_published_idx'),
+        ('comment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('post_count', models.PositiveIntegerField(default=0)),
+                ('comment_count', models.PositiveIntegerField(default=0)),
+                ('last_published_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_author_stats, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
-from django.db import models
+from django.apps import apps
+from django.db import models, router, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
 import uuid
@@ -30,6 +33,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     username = models.CharField(max_length=30, blank=True)
     date_of_birth = models.DateField(blank=True, null=True, default=None)
     photo = models.ImageField(upload_to='user_photos/', default='user_photos/default.jpg', blank=True)
+    photo_rendered = models.CharField(max_length=100, blank=True, editable=False)  # Photo whose renditions exist, see blog_server.renditions
     bio = models.CharField(max_length=100, blank=True)
     district = models.CharField(max_length=50, blank=True)
     city = models.CharField(max_length=50, blank=True)
@@ -39,6 +43,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     date_joined = models.DateTimeField(default=timezone.now)
     auth_provider = models.CharField(max_length=50, default='email', blank=True)
     is_verified = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)  # Drives ETag / Last-Modified on user endpoints
     objects = UserManager()
 
     USERNAME_FIELD = 'email'
@@ -70,4 +75,140 @@ class LoginCode(models.Model):
         return f"{self.user.email} - {self.code}"
     
     def is_expired(self):
-        return timezone.now() > self.expires_at
\ No newline at end of file
+        return timezone.now() > self.expires_at
+
+
+class AuthorStatsManager(models.Manager):
+    def apply_delta(self, user_id, create_missing=True, **deltas):
+        """
+        Atomically add deltas to a user's counters, e.g. apply_delta(uid, post_count=1).
+        A missing row is rebuilt from the source tables when create_missing is set.
+        """
+        updates = {field: Greatest(F(field) + delta, 0) for field, delta in deltas.items()}
+        updates['updated_at'] = timezone.now()
+        if self.filter(user_id=user_id).update(**updates) or not create_missing:
+            return
+        self.rebuild(user_id)
+
+    def refresh_last_published(self, user_id):
+        # Served by the (author, -published_at) index on Post
+        Post = apps.get_model('post', 'Post')
+        latest = Post.objects.filter(author_id=user_id).order_by('-published_at').values('published_at')[:1]
+        self.filter(user_id=user_id).update(last_published_at=models.Subquery(latest), updated_at=timezone.now())
+
+    def rebuild(self, user_id):
+        """
+        Recompute a user's stats row from scratch.
+        """
+        Post = apps.get_model('post', 'Post')
+        Comment = apps.get_model('comment', 'Comment')
+        # Count on the database being written, never on a possibly lagging replica
+        db = router.db_for_write(self.model)
+        posts = Post.objects.using(db).filter(author_id=user_id)
+        values = {
+            'post_count': posts.count(),
+            'comment_count': Comment.objects.using(db).filter(author_id=user_id).count(),
+            'follower_count': Follow.objects.using(db).filter(followee_id=user_id).count(),
+            'last_published_at': posts.order_by('-published_at').values_list('published_at', flat=True).first(),
+        }
+        stats, _ = self.db_manager(db).update_or_create(user_id=user_id, defaults=values)
+        return stats
+
+    def rebuild_all(self, batch_size=2000):
+        """
+        Recompute every user's stats row, e.g. after a bulk import bypassed the signals.
+        """
+        User = apps.get_model('user', 'User')
+        Post = apps.get_model('post', 'Post')
+        Comment = apps.get_model('comment', 'Comment')
+        posts = Post.objects.filter(author=models.OuterRef('pk')).order_by().values('author')
+        comments = Comment.objects.filter(author=models.OuterRef('pk')).order_by().values('author')
+        followers = Follow.objects.filter(followee=models.OuterRef('pk')).order_by().values('followee')
+        users = User.objects.annotate(
+            post_total=Coalesce(models.Subquery(posts.annotate(total=models.Count('pk')).values('total')), 0),
+            comment_total=Coalesce(models.Subquery(comments.annotate(total=models.Count('pk')).values('total')), 0),
+            follower_total=Coalesce(models.Subquery(followers.annotate(total=models.Count('pk')).values('total')), 0),
+            latest=models.Subquery(posts.annotate(latest=models.Max('published_at')).values('latest')),
+        ).values_list('pk', 'post_total', 'comment_total', 'follower_total', 'latest')
+        with transaction.atomic():
+            self.all().delete()
+            batch = []
+            for user_id, post_total, comment_total, follower_total, latest in users.iterator(chunk_size=batch_size):
+                batch.append(self.model(user_id=user_id, post_count=post_total, comment_count=comment_total,
+                                        follower_count=follower_total, last_published_at=latest))
+                if len(batch) >= batch_size:
+                    self.bulk_create(batch)
+                    batch = []
+            self.bulk_create(batch)
+
+
+class AuthorStats(models.Model):
+    """
+    Per-author counters kept up to date incrementally by post, comment and follow signals.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    post_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)  # Comments written by the user
+    follower_count = models.PositiveIntegerField(default=0)  # Decides how apps.post.timeline delivers their posts
+    last_published_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    objects = AuthorStatsManager()
+
+    def __str__(self):
+        return f"Stats for {self.user_id}"
+
+
+class Follow(models.Model):
+    """
+    follower sees followee's posts in their home timeline (apps.post.timeline).
+    """
+    # The unique pair leads with follower, so it also serves "who do I follow"
+    follower = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='following', db_index=False)
+    followee = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='followers', db_index=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'followee'], name='follow_unique_pair'),
+            models.CheckConstraint(condition=~models.Q(follower=models.F('followee')), name='follow_not_self'),
+        ]
+        indexes = [
+            # Fan-out reads every follower of an author from this index alone
+            models.Index(fields=['followee', 'follower'], name='follow_followee_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.follower_id} follows {self.followee_id}"
+
+
+class OutboundEmail(models.Model):
+    """
+    Durable outbox row for a transactional email, sent by apps.user.mail workers.
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENDING, 'Sending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()  # Cleared once the email is sent or given up on
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.TextField()  # Comma separated recipients
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claim_token = models.UUIDField(null=True, blank=True)  # Set by the worker that is sending the row
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim due rows in order
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to} ({self.status})"
@@ -2,6 +2,8 @@ from django.contrib.auth import get_user_model
 from rest_framework import serializers
 import random
 import string
+from .models import AuthorStats
+from blog_server.renditions import RenditionsField
 # from .github import Github
 # from .helper import register_social_user
 
@@ -45,6 +47,28 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = '__all__'
 
+class AuthorCardSerializer(serializers.ModelSerializer):
+    """
+    Compact, read-only author representation for embedding in post lists.
+    """
+    display_name = serializers.SerializerMethodField()
+    photo = serializers.ImageField(read_only=True)
+    photo_renditions = RenditionsField(source='photo')
+
+    class Meta:
+        model = User
+        fields = ['id', 'display_name', 'photo', 'photo_renditions']
+        read_only_fields = fields
+
+    def get_display_name(self, obj):
+        full_name = f"{obj.first_name} {obj.last_name}".strip()
+        return full_name or obj.username or obj.email.split('@')[0]
+
+class AuthorStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AuthorStats
+        fields = ['post_count', 'comment_count', 'follower_count', 'last_published_at']
+
 class UserPhotoUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from blog_server.permission import token_user_cache
+from .models import AuthorStats, Follow, User
+
+
+# Cached token -> user snapshots must not outlive a change to the user row,
+# e.g. a profile edit or deactivation.
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_tokens(sender, instance, **kwargs):
+    token_user_cache.invalidate_user(instance.pk)
+
+
+# AuthorStats.follower_count decides whether an author's posts are pushed to timelines.
+@receiver(post_save, sender=Follow)
+def increment_follower_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.apply_delta(instance.followee_id, follower_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_follower_count(sender, instance, **kwargs):
+    # Never recreate rows here: the user may be part of the same cascade delete
+    AuthorStats.objects.apply_delta(instance.followee_id, create_missing=False, follower_count=-1)
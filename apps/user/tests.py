@@ -1,3 +1,161 @@
-from django.test import TestCase
+import datetime
+from django.core import mail as django_mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from apps.comment.models import Comment
+from apps.post.models import Post
+from blog_server import throttling
+from . import mail
+from .models import AuthorStats, OutboundEmail, User
 
-# Create your tests here.
+
+class AuthorStatsTests(TestCase):
+    def setUp(self):
+        self.enterContext(throttling.disabled())
+        cache.clear()
+        self.author = User.objects.create_user('author@example.com', 'password')
+        self.other = User.objects.create_user('other@example.com', 'password')
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def post(self, author=None, days_ago=0):
+        return Post.objects.create(author=author or self.author, title='Title', content='Content',
+                                   published_at=timezone.now() - datetime.timedelta(days=days_ago))
+
+    def test_posts_are_counted_with_the_latest_publish_time(self):
+        self.post(days_ago=3)
+        latest = self.post(days_ago=1)
+        stats = self.stats(self.author)
+        self.assertEqual(stats.post_count, 2)
+        self.assertEqual(stats.last_published_at, latest.published_at)
+
+    def test_deleting_the_latest_post_moves_last_published_back(self):
+        older = self.post(days_ago=3)
+        self.post(days_ago=1).delete()
+        stats = self.stats(self.author)
+        self.assertEqual(stats.post_count, 1)
+        self.assertEqual(stats.last_published_at, older.published_at)
+
+    def test_moving_a_post_to_another_author(self):
+        self.post(days_ago=2)
+        moved = self.post(days_ago=1)
+        moved.author = self.other
+        moved.save()
+        self.assertEqual(self.stats(self.author).post_count, 1)
+        self.assertEqual(self.stats(self.other).post_count, 1)
+        self.assertEqual(self.stats(self.other).last_published_at, moved.published_at)
+
+    def test_comments_are_counted_for_their_writer(self):
+        post = self.post()
+        comment = Comment.objects.create(post=post, author=self.other, content='Comment')
+        self.assertEqual(self.stats(self.other).comment_count, 1)
+        comment.delete()
+        self.assertEqual(self.stats(self.other).comment_count, 0)
+
+    def test_deleting_an_author_cascades_without_recreating_rows(self):
+        post = self.post()
+        Comment.objects.create(post=post, author=self.other, content='Comment')
+        self.author.delete()
+        self.assertFalse(AuthorStats.objects.filter(user_id=self.author.id).exists())
+        # The comment on the deleted post went with it
+        self.assertEqual(self.stats(self.other).comment_count, 0)
+
+    def test_missing_row_is_rebuilt(self):
+        self.post()
+        AuthorStats.objects.filter(user=self.author).delete()
+        self.post()
+        self.assertEqual(self.stats(self.author).post_count, 2)
+
+    def test_count_endpoints_read_the_stats(self):
+        self.post()
+        response = self.client.get(f'/post/posts/count/{self.author.id}/')
+        self.assertEqual(response.json()['post_count'], 1)
+        response = self.client.get(f'/post/posts/count/?ids={self.author.id},{self.other.id}')
+        stats = response.json()['stats']
+        self.assertEqual(stats[str(self.author.id)]['post_count'], 1)
+        self.assertEqual(stats[str(self.other.id)]['post_count'], 0)
+
+
+class FailingConnection:
+    def __init__(self, error='Connection refused'):
+        self.error = error
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise OSError(self.error)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.enterContext(override_settings(EMAIL_OUTBOX={'MAX_ATTEMPTS': 3, 'RETRY_BACKOFF': 30}))
+
+    def queue(self, body='Your verification code is: 123456'):
+        return mail.queue_email('Code', body, ['reader@example.com'], 'from@example.com')
+
+    def test_sent_email_drops_its_body(self):
+        email = self.queue()
+        self.assertEqual(mail.drain(), 1)
+        self.assertEqual(len(django_mail.outbox), 1)
+        self.assertIn('123456', django_mail.outbox[0].body)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.SENT)
+        self.assertEqual(email.body, '')
+        self.assertEqual(mail.drain(), 0)
+
+    def test_claimed_rows_are_not_claimed_again(self):
+        for _ in range(3):
+            self.queue()
+        first = mail.claim_batch(2)
+        second = mail.claim_batch(2)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({row.id for row in first} & {row.id for row in second})
+        self.assertEqual(mail.claim_batch(2), [])
+
+    def test_stale_claims_are_released(self):
+        self.queue()
+        mail.claim_batch(10)
+        OutboundEmail.objects.update(claimed_at=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(len(mail.claim_batch(10)), 1)
+
+    def test_rows_not_yet_due_are_left_alone(self):
+        email = self.queue()
+        OutboundEmail.objects.update(next_attempt_at=timezone.now() + datetime.timedelta(minutes=5))
+        self.assertEqual(mail.claim_batch(10), [])
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.PENDING)
+
+    def test_failures_back_off_then_give_up(self):
+        email = self.queue()
+        for attempt in range(1, 4):
+            OutboundEmail.objects.update(next_attempt_at=timezone.now())
+            before = timezone.now()
+            self.assertEqual(mail.send_pending(connection=FailingConnection()), 1)
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, attempt)
+            self.assertEqual(email.last_error, 'Connection refused')
+            self.assertIsNone(email.claim_token)
+            if attempt < 3:
+                self.assertEqual(email.status, OutboundEmail.PENDING)
+                self.assertIn('123456', email.body)
+                self.assertGreaterEqual(email.next_attempt_at, before + datetime.timedelta(seconds=30 * 2 ** (attempt - 1)))
+        self.assertEqual(email.status, OutboundEmail.FAILED)
+        self.assertEqual(email.body, '')
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(mail.drain(), 0)
+
+    def test_retry_succeeds_after_a_failure(self):
+        email = self.queue()
+        mail.send_pending(connection=FailingConnection())
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(mail.drain(), 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.SENT)
+        self.assertEqual(email.last_error, '')
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import UserPhotoUpdateView , UserUpdateView, LoginView, CreateUserView, UserAllDetailView, UserMeView, VerifyEmailView
+from .views import UserPhotoUpdateView , UserUpdateView, LoginView, CreateUserView, UserAllDetailView, UserMeView, VerifyEmailView, FollowView
 urlpatterns = [
     path('create/', CreateUserView.as_view(), name='user-create'),
     path('photo/', UserPhotoUpdateView.as_view(), name='user-photo-update'),
@@ -8,6 +8,7 @@ urlpatterns = [
     path('details/', UserAllDetailView.as_view(), name='user-detail'),
     path('me/', UserMeView.as_view(), name='user-me'),
     path('verify/', VerifyEmailView.as_view(), name='user-verify'),
+    path('follow/<uuid:user_id>/', FollowView.as_view(), name='user-follow'),
 
 
     # path('github/', GithubOauthSignInView.as_view(), name='github')
@@ -5,13 +5,17 @@ from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 import random
-from django.core.mail import send_mail
 from django.utils import timezone
 from django.contrib.auth import get_user_model, authenticate
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max
 from datetime import timedelta
-from apps.user.models import LoginCode
+from apps.user.models import Follow, LoginCode
+from apps.user.mail import queue_email
 from blog_server import settings
 from blog_server.permission import LoginRequiredPermission
+from blog_server.conditional import make_etag, check_not_modified, set_validators
+from blog_server.streaming import stream_json_list
 from .serializers import UserPhotoUpdateSerializer , UserUpdateSerializer , UserSerializer, UserCreateSerializer
 
 User = get_user_model()
@@ -21,6 +25,7 @@ class LoginView(TokenObtainPairView):
     """
     Custom login view that supports authentication via email or username.
     """
+    throttle_scope = 'login'  # Password guessing gets a much smaller budget than reads
 
     def post(self, request, *args, **kwargs):
         email = request.data.get("email")
@@ -58,12 +63,12 @@ class LoginView(TokenObtainPairView):
                     code=code,
                     expires_at=timezone.now() + timedelta(minutes=10)  # valid for 10 min
                     )
-                    send_mail(
+                    # Sent by the outbox workers, so login latency doesn't depend on the mail server
+                    queue_email(
                     "Your Login Verification Code",
                     f"Hello {user.first_name},\n\nYour verification code is: {code}\n\nIf you did not try to login, please ignore this email.",
-                    settings.DEFAULT_FROM_EMAIL,
                     [user.email],
-                    fail_silently=False,
+                    settings.DEFAULT_FROM_EMAIL,
                     )
                     return Response({"message": "Verification code sent to your email."}, status=status.HTTP_200_OK)
 
@@ -116,15 +121,27 @@ class UserAllDetailView(APIView):
     permission_classes = [LoginRequiredPermission]
     def get(self, request, *args, **kwargs):
         users = User.objects.all()
-        serializer = UserSerializer(users, many=True)
-        return Response(serializer.data)
+        summary = users.aggregate(total=Count('id'), latest=Max('updated_at'))
+        latest = summary['latest']
+        etag = make_etag('users', summary['total'], latest and latest.isoformat())
+        # No Last-Modified: a deleted user lowers the count without moving any timestamp
+        not_modified = check_not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        # Streamed row by row, so memory stays flat however many users there are
+        users = users.prefetch_related('groups', 'user_permissions')
+        return set_validators(stream_json_list(users, UserSerializer), etag)
 
 class UserMeView(APIView):
     permission_classes = [LoginRequiredPermission]
     def get(self, request, *args, **kwargs):
         user = request.user
+        etag = make_etag('user', user.id, user.updated_at.isoformat())
+        not_modified = check_not_modified(request, etag, user.updated_at)
+        if not_modified:
+            return not_modified
         serializer = UserSerializer(user)
-        return Response(serializer.data)
+        return set_validators(Response(serializer.data), etag, user.updated_at)
 
 class UserUpdateView(generics.UpdateAPIView):
     queryset = User.objects.all()  
@@ -167,3 +184,31 @@ class UserPhotoUpdateView(generics.UpdateAPIView):
 #             return Response({"message": "User authenticated successfully", "user_data": data}, status=status.HTTP_200_OK)
         
 #         return Response(serializer.errors, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class FollowView(APIView):
+    """
+    POST to follow a user, DELETE to unfollow them.
+    """
+    permission_classes = [LoginRequiredPermission]
+
+    def post(self, request, user_id, *args, **kwargs):
+        if user_id == request.user.id:
+            return Response({"message": "You can't follow yourself."}, status=status.HTTP_400_BAD_REQUEST)
+        if not User.objects.filter(id=user_id).exists():
+            return Response({"message": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            with transaction.atomic():
+                Follow.objects.create(follower=request.user, followee_id=user_id)
+        except IntegrityError:
+            # Already followed, possibly by a concurrent request that won follow_unique_pair
+            return Response({"following": True}, status=status.HTTP_200_OK)
+        return Response({"following": True}, status=status.HTTP_201_CREATED)
+
+    def delete(self, request, user_id, *args, **kwargs):
+        # Deleted one by one so the signals keep follower counts and timelines in step
+        follows = Follow.objects.filter(follower=request.user, followee_id=user_id)
+        if not follows.exists():
+            return Response({"message": "You don't follow this user."}, status=status.HTTP_404_NOT_FOUND)
+        for follow in follows:
+            follow.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,56 +1,126 @@
 import json
 import logging
-from colorama import Fore, Style, init
+import random
+import time
+from urllib.parse import parse_qsl
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from .logging_utils import enqueue_handlers
 
-init(autoreset=True)  # Automatically reset color after each print
+logger = logging.getLogger("blog_server.api")
+
+DEFAULTS = {
+    'DEFAULT_SAMPLE_RATE': 1.0,  # Share of successful requests that are logged
+    'SAMPLE_RATES': {},  # Path prefix -> sample rate, longest prefix wins
+    'MAX_BODY_BYTES': 2048,  # Larger bodies are summarized, never read
+    'BODY_CONTENT_TYPES': ('application/json', 'application/x-www-form-urlencoded'),  # Logged with REDACT_FIELDS masked
+    'REDACT_FIELDS': ('password', 'confirm_password', 'current_password', 'new_password', 'new_password_confirm', 'code'),
+}
 
-logger = logging.getLogger("django")
 
 class APILoggingMiddleware:
     """
-    Logs incoming requests and outgoing responses in a clean, colored terminal output.
+    Emits one structured log record per request. Records go through a queue so
+    the handlers' I/O runs on a background thread, never on the request thread.
+    Successful requests are sampled per route; 4xx/5xx responses are always logged.
     """
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        config = {**DEFAULTS, **getattr(settings, 'API_LOGGING', {})}
+        self.default_rate = config['DEFAULT_SAMPLE_RATE']
+        self.sample_rates = sorted(config['SAMPLE_RATES'].items(), key=lambda item: len(item[0]), reverse=True)
+        self.max_body_bytes = config['MAX_BODY_BYTES']
+        self.body_content_types = tuple(config['BODY_CONTENT_TYPES'])
+        self.redact_fields = frozenset(config['REDACT_FIELDS'])
+        enqueue_handlers(logger)
 
     def __call__(self, request):
-        # Log request info
-        try:
-            body = request.body.decode("utf-8")
-            try:
-                body_json = json.loads(body) if body else {}
-            except Exception:
-                body_json = body
-        except Exception:
-            body_json = {}
-        if isinstance(body_json, dict):
-            pretty_body = json.dumps(body_json, indent=4)
-        else:
-            pretty_body = str(body_json)
-            
-        if request.method in ["POST", "PUT", "PATCH"]:
-            logger.info(f"{request.method} {request.path}")
-            logger.info(Fore.CYAN + f"INFO Request Body:\n{pretty_body}")
-        else:
-            logger.info(f"{request.method} {request.path}")
-            logger.info(Fore.CYAN + f"INFO Query Params:\n{json.dumps(request.GET.dict(), indent=4)}")
-
-
-        # Get response
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        sampled = random.random() < self.sample_rate(request.path)
+        # The body has to be captured before the view consumes the stream
+        body = self.capture_body(request) if sampled else None
         response = self.get_response(request)
+        self.log(request, response, started, sampled, body)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        sampled = random.random() < self.sample_rate(request.path)
+        body = self.capture_body(request) if sampled else None
+        response = await self.get_response(request)
+        self.log(request, response, started, sampled, body)
+        return response
 
-        # Log response info
-        if response.status_code >= 500:
-            logger.error(f"{request.method} {request.path}")
-            logger.error(f"Response Status: {response.status_code}")
+    def log(self, request, response, started, sampled, body):
+        status = response.status_code
+        if not sampled and status < 400:
+            return
 
-        elif response.status_code >= 400:
-            logger.warning(f"{request.method} {request.path}")
-            logger.warning(f"Response Status: {response.status_code}")
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': status,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+        }
+        if request.GET:
+            record['query'] = self.redact(request.GET.dict())
+        if body is not None:
+            record['body'] = body
 
+        if status >= 500:
+            level = logging.ERROR
+        elif status >= 400:
+            level = logging.WARNING
         else:
-            logger.info(f"{request.method} {request.path}")
-            logger.info(f"Response Status: {response.status_code}")
+            level = logging.INFO
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps(record, separators=(',', ':'), default=str))
 
-        return response
+    def sample_rate(self, path):
+        for prefix, rate in self.sample_rates:
+            if path.startswith(prefix):
+                return rate
+        return self.default_rate
+
+    def capture_body(self, request):
+        if request.method not in ("POST", "PUT", "PATCH"):
+            return None
+        content_type = request.content_type or ''
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if not length:
+            return None
+        if not content_type.startswith(self.body_content_types):
+            # Only bodies that can be parsed can have their secrets masked
+            return f"<{content_type or 'unknown'} body, {length} bytes>"
+        if length > self.max_body_bytes:
+            return f"<{content_type} body, {length} bytes, over {self.max_body_bytes} byte cap>"
+
+        try:
+            text = request.body.decode('utf-8', errors='replace')
+        except Exception:
+            return None
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            return self.redact(dict(parse_qsl(text, keep_blank_values=True)))
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            return f"<{content_type} body, {length} bytes, unparsable>"
+        return self.redact(payload)
+
+    def redact(self, payload):
+        # Masks REDACT_FIELDS at any depth of nested objects and arrays
+        if isinstance(payload, dict):
+            return {key: '***' if key in self.redact_fields else self.redact(value) for key, value in payload.items()}
+        if isinstance(payload, list):
+            return [self.redact(item) for item in payload]
+        return payload
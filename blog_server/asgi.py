@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blog_server.settings')
+os.environ.setdefault('ASYNC_READ_VIEWS', 'True')  # Read endpoints run on the event loop
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')  # Persistent connections leak on ASGI's per-request threads
 
 application = get_asgi_application()
@@ -0,0 +1,112 @@
+import math
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import NotAuthenticated, NotFound, Throttled
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# Helpers for the async read views. Under ASGI these run on the event loop, so
+# a slow client holds a coroutine rather than a worker thread; only the ORM
+# and cache calls themselves run in Django's sync executor. Everything a view
+# serializes must be loaded up front (select_related / values), since lazy
+# relation access raises SynchronousOnlyOperation in async code.
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def async_reads(async_view, sync_view):
+    """
+    Route GET/HEAD to async_view and every other method to the sync DRF view.
+    Returns sync_view unchanged when ASYNC_READ_VIEWS is off, e.g. under WSGI
+    where every async view would need its own event loop.
+    """
+    if not getattr(settings, 'ASYNC_READ_VIEWS', False):
+        return sync_view
+    run_sync = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            return await async_view(request, *args, **kwargs)
+        return await run_sync(request, *args, **kwargs)
+
+    view.csrf_exempt = getattr(sync_view, 'csrf_exempt', False)
+    view.__name__ = async_view.__name__
+    return view
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return JsonResponse(data, encoder=JSONEncoder, safe=False, status=status_code,
+                        json_dumps_params={'ensure_ascii': not api_settings.UNICODE_JSON, 'separators': (',', ':')})
+
+
+def error_response(exc, status_code=None):
+    # Same body as blog_server.exceptions.custom_exception_handler
+    status_code = status_code or exc.status_code
+    response = json_response({'message': exc.detail, 'status_code': status_code}, status_code)
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = str(int(exc.wait))
+    return response
+
+
+async def aauthenticate(request):
+    """
+    Resolve the session user without blocking and pin it on the request.
+    """
+    request.user = user = await request.auser()
+    return user
+
+
+def _check_throttles(request):
+    # No view, so scoped throttles don't apply; the async views are all reads
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            return Throttled(throttle.wait())
+    return None
+
+
+async def aguard(request, login_required=False):
+    """
+    The authentication, permission and throttle checks DRF would run for the
+    sync view. Returns an error response, or None when the request may proceed.
+    """
+    user = await aauthenticate(request)
+    if login_required and not user.is_authenticated:
+        # SessionAuthentication sends no WWW-Authenticate challenge, so DRF answers 403
+        return error_response(NotAuthenticated(), status.HTTP_403_FORBIDDEN)
+    # Leasing tokens from the shared throttle file blocks
+    throttled = await sync_to_async(_check_throttles)(request)
+    if throttled is not None:
+        return error_response(throttled)
+    return None
+
+
+async def apaginate(queryset, request, total):
+    """
+    PageNumberPagination for async views, returning the same body. The caller
+    passes the row count it already has, so no COUNT query is issued here.
+    """
+    page_size = api_settings.PAGE_SIZE
+    last_page = max(math.ceil(total / page_size), 1)
+    raw_page = request.GET.get('page', 1)
+    try:
+        number = last_page if raw_page == 'last' else int(raw_page)
+    except (TypeError, ValueError):
+        raise NotFound('Invalid page.')
+    if number < 1 or number > last_page:
+        raise NotFound('Invalid page.')
+
+    offset = (number - 1) * page_size
+    rows = [row async for row in queryset[offset:offset + page_size]]
+    url = request.build_absolute_uri()
+    next_link = replace_query_param(url, 'page', number + 1) if number < last_page else None
+    if number == 1:
+        previous_link = None
+    elif number == 2:
+        previous_link = remove_query_param(url, 'page')
+    else:
+        previous_link = replace_query_param(url, 'page', number - 1)
+    return rows, {'count': total, 'next': next_link, 'previous': previous_link}
@@ -0,0 +1,221 @@
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+# Primary/replica routing with read-your-writes stickiness.
+#
+# Reads from the post, comment and user apps go to a replica, writes always go
+# to `default`. A request that writes, and every request from the same client
+# for STICKY_SECONDS afterwards (tracked by a cookie), reads from the primary
+# instead. Replica lag is measured from a heartbeat row that replica_heartbeat
+# writes on the primary; a replica further behind than MAX_LAG, or one that
+# cannot be queried, is skipped until it catches up.
+#
+# Reads only go to replicas inside a request handled by ReplicaPinningMiddleware.
+# Management commands and background threads always use the primary, since
+# they tend to read rows they have just written.
+
+PRIMARY = 'default'
+HEARTBEAT_TABLE = 'replication_heartbeat'
+
+DEFAULTS = {
+    'REPLICAS': None,  # Aliases to read from; None means every alias in DATABASES except default
+    'APPS': ('post', 'comment', 'user'),  # App labels whose reads may use a replica
+    'STICKY_SECONDS': 5,  # How long a client reads from the primary after writing
+    'MAX_LAG': 2,  # Seconds a replica may trail the primary and still serve reads
+    'CHECK_INTERVAL': 1,  # Seconds between lag checks of one replica in this process
+    'COOKIE_NAME': 'db_primary_until',
+}
+
+
+def routing_config():
+    config = {**DEFAULTS, **getattr(settings, 'DATABASE_ROUTING', {})}
+    if config['REPLICAS'] is None:
+        config['REPLICAS'] = [alias for alias in settings.DATABASES if alias != PRIMARY]
+    return config
+
+
+class RoutingState:
+    __slots__ = ('pinned', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned  # Reads use the primary for the rest of the request
+        self.wrote = False
+
+
+# Routing state of the request being handled; None outside requests
+request_state = ContextVar('db_routing_state', default=None)
+_force_primary = ContextVar('db_force_primary', default=False)
+
+
+@contextmanager
+def use_primary():
+    """
+    Read from the primary inside this block, e.g. when the result is cached
+    and a stale replica read would outlive the replica's lag.
+    """
+    token = _force_primary.set(True)
+    try:
+        yield
+    finally:
+        _force_primary.reset(token)
+
+
+def heartbeat_sql(vendor):
+    column = 'REAL' if vendor == 'sqlite' else 'DOUBLE PRECISION'
+    return [
+        f"CREATE TABLE IF NOT EXISTS {HEARTBEAT_TABLE} (id INTEGER PRIMARY KEY, beat_at {column} NOT NULL)",
+        f"INSERT INTO {HEARTBEAT_TABLE} (id, beat_at) VALUES (1, %s) "
+        f"ON CONFLICT (id) DO UPDATE SET beat_at = excluded.beat_at",
+    ]
+
+
+def beat():
+    """
+    Record the current time on the primary; replicas report it back once replicated.
+    """
+    connection = connections[PRIMARY]
+    create, upsert = heartbeat_sql(connection.vendor)
+    with connection.cursor() as cursor:
+        cursor.execute(create)
+        cursor.execute(upsert, [time.time()])
+
+
+def replica_lag(alias):
+    """
+    Seconds the replica trails the primary, or None when it cannot tell.
+    """
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(f"SELECT beat_at FROM {HEARTBEAT_TABLE} WHERE id = 1")
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None:
+        return None
+    return max(time.time() - row[0], 0.0)
+
+
+class ReplicaHealth:
+    """
+    Per-process view of which replicas are fresh enough to read from.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked = {}  # alias -> (healthy, checked_at)
+
+    def is_healthy(self, alias, config):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.checked.get(alias)
+            if entry is not None and now - entry[1] < config['CHECK_INTERVAL']:
+                return entry[0]
+            # Claim the check so concurrent requests keep using the last verdict
+            self.checked[alias] = (entry[0] if entry else False, now)
+        lag = replica_lag(alias)
+        healthy = lag is not None and lag <= config['MAX_LAG']
+        with self.lock:
+            self.checked[alias] = (healthy, time.monotonic())
+        return healthy
+
+    def reset(self):
+        with self.lock:
+            self.checked.clear()
+
+
+health = ReplicaHealth()
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = request_state.get()
+        if state is None or state.pinned or _force_primary.get():
+            return PRIMARY
+        config = routing_config()
+        if model._meta.app_label not in config['APPS'] or not config['REPLICAS']:
+            return PRIMARY
+        if connections[PRIMARY].in_atomic_block:
+            return PRIMARY  # Reads inside a transaction must see its writes
+        replicas = [alias for alias in config['REPLICAS'] if health.is_healthy(alias, config)]
+        return random.choice(replicas) if replicas else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        state = request_state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # Every alias holds the same data
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY  # Replicas get their schema through replication
+
+
+class ReplicaPinningMiddleware:
+    """
+    Sets up routing state per request and keeps a client on the primary for
+    STICKY_SECONDS after it writes, so it always reads its own writes.
+    """
+    sync_capable = True
+    async_capable = True
+    unsafe_methods = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, config = self.start(request)
+        token = request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_state.reset(token)
+        return self.finish(request, response, state, config)
+
+    async def __acall__(self, request):
+        state, config = self.start(request)
+        token = request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_state.reset(token)
+        return self.finish(request, response, state, config)
+
+    def start(self, request):
+        config = routing_config()
+        now = time.time()
+        try:
+            pinned_until = float(request.COOKIES.get(config['COOKIE_NAME'], 0))
+        except ValueError:
+            pinned_until = 0
+        # A second of slack for the rounding in finish() and clock skew between workers
+        if not math.isfinite(pinned_until) or pinned_until > now + config['STICKY_SECONDS'] + 1:
+            # Not a value finish() wrote; honouring it would let a client pin itself for good
+            pinned_until = 0
+        pinned = request.method in self.unsafe_methods or pinned_until > now
+        return RoutingState(pinned=pinned), config
+
+    def finish(self, request, response, state, config):
+        if state.wrote or request.method in self.unsafe_methods:
+            sticky = config['STICKY_SECONDS']
+            response.set_cookie(
+                key=config['COOKIE_NAME'],
+                value=f'{time.time() + sticky:.3f}',
+                max_age=sticky,
+                httponly=True,
+                secure=True,
+                samesite="None",  # Sent with the same cross-site requests as access_token
+            )
+        return response
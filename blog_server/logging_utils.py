@@ -1,4 +1,7 @@
+import atexit
 import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import Queue, Full
 
 class SimpleColoredFormatter(logging.Formatter):
     # ANSI color codes
@@ -15,3 +18,38 @@ class SimpleColoredFormatter(logging.Formatter):
         color = self.COLORS.get(record.levelname, self.RESET)
         levelname = f"{color}{record.levelname}{self.RESET}"
         return f"{levelname} {record.getMessage()}"
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that drops records instead of blocking or raising when the
+    queue is full, so a slow log sink can never stall a request.
+    """
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+
+def enqueue_handlers(logger, maxsize=10000):
+    """
+    Move the handlers configured for `logger` behind a bounded queue. A
+    QueueListener thread then does the formatting and I/O off the caller's thread.
+    Safe to call more than once.
+    """
+    if any(isinstance(handler, QueueHandler) for handler in logger.handlers):
+        return
+    targets = list(logger.handlers)
+    if not targets:
+        return
+    log_queue = Queue(maxsize=maxsize)
+    listener = QueueListener(log_queue, *targets, respect_handler_level=True)
+    logger.handlers = [DroppingQueueHandler(log_queue)]
+    listener.start()
+    atexit.register(listener.stop)
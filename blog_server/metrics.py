@@ -0,0 +1,326 @@
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Request metrics per (view, method, status class): latency, DB queries, DB time
+# and response size. Each worker records into an in-process registry, which a
+# daemon thread snapshots to its own file in METRICS['DIR'] every few seconds.
+# The /metrics endpoint merges every worker's file into one Prometheus exposition.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Seconds
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)  # Queries per request
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)  # Bytes
+
+DEFAULTS = {
+    'DIR': os.path.join(settings.BASE_DIR, 'logs', 'metrics'),
+    'FLUSH_INTERVAL': 5,  # Seconds between snapshots of this worker's counters
+    'MAX_AGE': 7 * 24 * 3600,  # Snapshot files of workers gone longer than this are pruned
+}
+
+
+def metrics_config():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+def _empty_series():
+    return {
+        'count': 0,
+        'latency_buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+        'latency_sum': 0.0,
+        'query_buckets': [0] * (len(QUERY_BUCKETS) + 1),
+        'query_sum': 0,
+        'db_time_sum': 0.0,
+        'size_buckets': [0] * (len(SIZE_BUCKETS) + 1),
+        'size_sum': 0,
+    }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+        self.dirty = False
+        self.started_at = int(time.time())
+        self.flusher = None
+
+    def record(self, view, method, status, duration, queries, db_time, size):
+        key = (view, method, f'{status // 100}xx')
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = _empty_series()
+            series['count'] += 1
+            series['latency_buckets'][bisect_left(LATENCY_BUCKETS, duration)] += 1
+            series['latency_sum'] += duration
+            series['query_buckets'][bisect_left(QUERY_BUCKETS, queries)] += 1
+            series['query_sum'] += queries
+            series['db_time_sum'] += db_time
+            if size is not None:
+                series['size_buckets'][bisect_left(SIZE_BUCKETS, size)] += 1
+                series['size_sum'] += size
+            self.dirty = True
+        if self.flusher is None:
+            self.start_flusher()
+
+    def snapshot(self, mark_clean=False):
+        with self.lock:
+            if mark_clean:
+                self.dirty = False
+            return [[list(key), {name: list(value) if isinstance(value, list) else value for name, value in series.items()}]
+                    for key, series in self.series.items()]
+
+    @property
+    def path(self):
+        # Start time keeps a recycled pid from overwriting a dead worker's counters
+        return os.path.join(metrics_config()['DIR'], f'worker-{os.getpid()}-{self.started_at}.json')
+
+    def flush(self):
+        if not self.dirty:
+            return
+        directory = metrics_config()['DIR']
+        os.makedirs(directory, exist_ok=True)
+        path = self.path
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as handle:
+            json.dump(self.snapshot(mark_clean=True), handle)
+        os.replace(tmp_path, path)  # Readers never see a half-written file
+
+    def start_flusher(self):
+        with self.lock:
+            if self.flusher is not None:
+                return
+            self.flusher = threading.Thread(target=self.flush_forever, name='metrics-flusher', daemon=True)
+        self.flusher.start()
+        atexit.register(self.flush)
+
+    def flush_forever(self):
+        while True:
+            time.sleep(metrics_config()['FLUSH_INTERVAL'])
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+
+registry = MetricsRegistry()
+
+
+def collect():
+    """
+    Merge every worker's snapshot, using live numbers for the current process.
+    """
+    config = metrics_config()
+    own_path = registry.path
+    snapshots = [registry.snapshot()]
+    now = time.time()
+    try:
+        names = os.listdir(config['DIR'])
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        path = os.path.join(config['DIR'], name)
+        if not name.endswith('.json') or path == own_path:
+            continue
+        try:
+            if now - os.path.getmtime(path) > config['MAX_AGE']:
+                os.remove(path)
+                continue
+            with open(path) as handle:
+                snapshots.append(json.load(handle))
+        except (OSError, ValueError):
+            continue
+
+    merged = {}
+    for snapshot in snapshots:
+        for key, series in snapshot:
+            key = tuple(key)
+            total = merged.get(key)
+            if total is None:
+                merged[key] = {name: list(value) if isinstance(value, list) else value for name, value in series.items()}
+                continue
+            for name, value in series.items():
+                if isinstance(value, list):
+                    total[name] = [a + b for a, b in zip(total[name], value)]
+                else:
+                    total[name] += value
+    return merged
+
+
+def _labels(key, extra=''):
+    view, method, status = key
+    view = view.replace('\\', '\\\\').replace('"', '\\"')
+    return f'view="{view}",method="{method}",status="{status}"{extra}'
+
+
+def _histogram(lines, name, key, bounds, counts, total, count):
+    cumulative = 0
+    for bound, bucket in zip(bounds, counts):
+        cumulative += bucket
+        le = ',le="%s"' % bound
+        lines.append(f'{name}_bucket{{{_labels(key, le)}}} {cumulative}')
+    le = ',le="+Inf"'
+    lines.append(f'{name}_bucket{{{_labels(key, le)}}} {count}')
+    lines.append(f'{name}_sum{{{_labels(key)}}} {total}')
+    lines.append(f'{name}_count{{{_labels(key)}}} {count}')
+
+
+def render_prometheus(merged):
+    """
+    Render merged series in the Prometheus text exposition format.
+    """
+    lines = [
+        '# HELP http_request_duration_seconds Request latency by view.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for key, series in sorted(merged.items()):
+        _histogram(lines, 'http_request_duration_seconds', key, LATENCY_BUCKETS,
+                   series['latency_buckets'], series['latency_sum'], series['count'])
+
+    lines += [
+        '# HELP http_request_db_queries SQL queries issued per request.',
+        '# TYPE http_request_db_queries histogram',
+    ]
+    for key, series in sorted(merged.items()):
+        _histogram(lines, 'http_request_db_queries', key, QUERY_BUCKETS,
+                   series['query_buckets'], series['query_sum'], series['count'])
+
+    lines += [
+        '# HELP http_request_db_duration_seconds_total Time spent in SQL queries.',
+        '# TYPE http_request_db_duration_seconds_total counter',
+    ]
+    for key, series in sorted(merged.items()):
+        lines.append(f'http_request_db_duration_seconds_total{{{_labels(key)}}} {series["db_time_sum"]}')
+
+    lines += [
+        '# HELP http_response_size_bytes Response body size.',
+        '# TYPE http_response_size_bytes histogram',
+    ]
+    for key, series in sorted(merged.items()):
+        sized = sum(series['size_buckets'])
+        _histogram(lines, 'http_response_size_bytes', key, SIZE_BUCKETS,
+                   series['size_buckets'], series['size_sum'], sized)
+    return '\n'.join(lines) + '\n'
+
+
+class QueryCounter:
+    """
+    Counts queries and their time for the request it is bound to.
+    """
+    __slots__ = ('queries', 'time')
+
+    def __init__(self):
+        self.queries = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - started
+            self.queries += 1
+
+
+# The counter of the request being handled. A context variable rather than a
+# per-request execute_wrapper, because under ASGI the ORM runs in executor
+# threads with their own connections; asgiref copies the context into them.
+current_counter = ContextVar('metrics_query_counter', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    counter = current_counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    return counter(execute, sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+connection_created.connect(install_query_counter)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL queries and response size for every request.
+    Works in both sync and async stacks, so it never forces a thread hop under ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        # Connections opened before this module was imported
+        for connection in connections.all(initialized_only=True):
+            install_query_counter(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        counter = QueryCounter()
+        token = current_counter.set(counter)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_counter.reset(token)
+        return self.finish(request, response, counter, started)
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        token = current_counter.set(counter)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_counter.reset(token)
+        return self.finish(request, response, counter, started)
+
+    def finish(self, request, response, counter, started):
+        if response.streaming and not response.is_async:
+            # A streamed body runs its queries as it is sent, after the view has
+            # returned, so the request is recorded once the stream is closed
+            content = response.streaming_content
+            response.streaming_content = self.count_stream(content, request, response, counter, started)
+        else:
+            self.record(request, response, counter, time.perf_counter() - started)
+        return response
+
+    def count_stream(self, content, request, response, counter, started):
+        chunks = iter(content)
+        size = 0
+        try:
+            while True:
+                token = current_counter.set(counter)
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                finally:
+                    current_counter.reset(token)
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.record(request, response, counter, time.perf_counter() - started, size)
+
+    def record(self, request, response, counter, duration, size=None):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            view = 'unresolved'
+        else:
+            view = match.view_name or match.route
+        if not response.streaming:
+            size = len(response.content)
+        registry.record(view, request.method, response.status_code, duration, counter.queries, counter.time, size)
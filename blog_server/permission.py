@@ -1,6 +1,85 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.db.models import prefetch_related_objects
 from rest_framework.permissions import BasePermission
 from rest_framework.exceptions import NotAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from .db_router import use_primary
+
+
+class TokenUserCache:
+    """
+    Bounded LRU of access token -> authenticated user. An entry lives for at
+    most `ttl` seconds and never past the token's own `exp`. Entries for a user
+    are dropped as soon as that user row is saved or deleted in this process;
+    other workers pick the change up within `ttl`.
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # token -> (user, expires_at)
+        self.tokens_by_user = {}  # user id -> set of cached tokens
+
+    def get(self, token):
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if time.time() >= expires_at:
+                self._discard(token, user.pk)
+                return None
+            self.entries.move_to_end(token)
+        # Each request gets its own copy, so views can modify request.user freely
+        return copy.copy(user)
+
+    def set(self, token, user, token_exp):
+        expires_at = min(time.time() + self.ttl, token_exp)
+        # UserSerializer exposes these relations; load them once into the snapshot
+        prefetch_related_objects([user], 'groups', 'user_permissions')
+        with self.lock:
+            if token in self.entries:
+                self._discard(token, self.entries[token][0].pk)
+            self.entries[token] = (copy.copy(user), expires_at)
+            self.tokens_by_user.setdefault(user.pk, set()).add(token)
+            while len(self.entries) > self.max_size:
+                oldest, (oldest_user, _) = self.entries.popitem(last=False)
+                self._forget(oldest, oldest_user.pk)
+
+    def invalidate_user(self, user_id):
+        with self.lock:
+            for token in self.tokens_by_user.pop(user_id, ()):
+                self.entries.pop(token, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tokens_by_user.clear()
+
+    def _discard(self, token, user_id):
+        self.entries.pop(token, None)
+        self._forget(token, user_id)
+
+    def _forget(self, token, user_id):
+        tokens = self.tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self.tokens_by_user[user_id]
+
+
+_cache_settings = getattr(settings, 'AUTH_TOKEN_CACHE', {})
+token_user_cache = TokenUserCache(
+    max_size=_cache_settings.get('MAX_SIZE', 10000),
+    ttl=_cache_settings.get('TTL', 60),
+)
+jwt_authentication = JWTAuthentication()
+
 
 class LoginRequiredPermission(BasePermission):
     """
@@ -12,12 +91,20 @@ class LoginRequiredPermission(BasePermission):
         if not token:
             raise NotAuthenticated(detail="{ Login required }")
 
+        # Hot path: a token validated recently skips signature checks and the user query
+        user = token_user_cache.get(token)
+        if user is not None:
+            request.user = user
+            return True
+
         # Manually authenticate the user
-        auth = JWTAuthentication()
         try:
-            validated_token = auth.get_validated_token(token)
-            request.user = auth.get_user(validated_token)  # Set the authenticated user
+            validated_token = jwt_authentication.get_validated_token(token)
+            # The user is cached for a while, so don't take it from a lagging replica
+            with use_primary():
+                request.user = jwt_authentication.get_user(validated_token)  # Set the authenticated user
         except Exception:
             raise NotAuthenticated(detail="{ Invalid token }")
 
+        token_user_cache.set(token, request.user, validated_token['exp'])
         return True
@@ -0,0 +1,176 @@
+import logging
+import os
+import queue
+import threading
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework import serializers
+
+logger = logging.getLogger("django")  # Uses same logging config
+
+# Resized, re-encoded copies of uploaded photos. Rendition names are derived
+# from the original's storage name, which Django never reuses. Once they are
+# written, the name is also copied to the model's `<field>_rendered` column,
+# so serializers tell whether they exist without touching storage; a changed
+# photo no longer matches it until its own renditions are recorded.
+
+DEFAULTS = {
+    'SIZES': {  # Name -> bounding box; renditions are written in this order
+        'thumbnail': (200, 200),
+        'medium': (800, 800),
+        'large': (1600, 1600),
+    },
+    'CROP': ('thumbnail',),  # Sizes cropped to fill the box instead of fitting inside it
+    'FORMAT': 'WEBP',
+    'QUALITY': 80,
+    'DIR': 'renditions',  # Storage prefix, mirroring the original's upload_to
+    'IN_PROCESS_WORKERS': 1,  # Threads started in each web process; 0 leaves it to generate_renditions
+}
+
+
+def renditions_config():
+    return {**DEFAULTS, **getattr(settings, 'IMAGE_RENDITIONS', {})}
+
+
+def rendition_name(name, size, config=None):
+    config = config or renditions_config()
+    stem = os.path.splitext(name)[0]
+    return f"{config['DIR']}/{stem}-{size}.{config['FORMAT'].lower()}"
+
+
+def has_renditions(fieldfile, config=None):
+    config = config or renditions_config()
+    # The last size is written last, so its presence means the set is complete
+    last_size = list(config['SIZES'])[-1]
+    return fieldfile.storage.exists(rendition_name(fieldfile.name, last_size, config))
+
+
+def rendered_field_name(fieldfile):
+    return f'{fieldfile.field.name}_rendered'
+
+
+def is_rendered(fieldfile):
+    """
+    Whether the renditions of the file were recorded on its model instance. No storage I/O.
+    """
+    return bool(fieldfile.name) and getattr(fieldfile.instance, rendered_field_name(fieldfile), None) == fieldfile.name
+
+
+def record_rendered(model, field_name, name):
+    """
+    Record that `name` has renditions on every row of model that uses it.
+    Returns the number of rows updated.
+    """
+    column = f'{field_name}_rendered'
+    return model._default_manager.filter(**{field_name: name}).exclude(**{column: name}).update(**{column: name})
+
+
+def render(image, box, crop, config):
+    if crop:
+        image = ImageOps.fit(image, box, Image.LANCZOS)
+    else:
+        image = image.copy()
+        image.thumbnail(box, Image.LANCZOS)  # Never upscales
+    buffer = BytesIO()
+    image.save(buffer, config['FORMAT'], quality=config['QUALITY'], method=4)
+    return buffer.getvalue()
+
+
+def generate(fieldfile, force=False):
+    """
+    Write every rendition of an uploaded image. Returns False when there was
+    nothing to do or the file is missing or not an image.
+    """
+    config = renditions_config()
+    if not fieldfile.name or (not force and has_renditions(fieldfile, config)):
+        return False
+    storage = fieldfile.storage
+    try:
+        with storage.open(fieldfile.name, 'rb') as handle:
+            image = Image.open(handle)
+            image = ImageOps.exif_transpose(image)  # Phone photos carry their rotation in EXIF
+            image.load()
+    except (FileNotFoundError, UnidentifiedImageError, OSError) as exc:
+        logger.warning("Cannot create renditions of %s: %s", fieldfile.name, exc)
+        return False
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    for size, box in config['SIZES'].items():
+        data = render(image, box, size in config['CROP'], config)
+        name = rendition_name(fieldfile.name, size, config)
+        if storage.exists(name):
+            storage.delete(name)  # Otherwise storage.save picks a different name
+        storage.save(name, ContentFile(data))
+    return True
+
+
+class RenditionWorker:
+    """
+    Daemon threads that create renditions after an upload, so the request that
+    stored the original never pays for decoding and re-encoding it.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def schedule(self, fieldfile, on_done=None):
+        workers = renditions_config()['IN_PROCESS_WORKERS']
+        if not fieldfile.name or not workers:
+            return
+        if not self.threads:
+            self.start(workers)
+        self.queue.put((fieldfile, on_done))
+
+    def start(self, workers):
+        with self.lock:
+            if self.threads:
+                return
+            for number in range(workers):
+                thread = threading.Thread(target=self.run, name=f'image-renditions-{number}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def run(self):
+        while True:
+            fieldfile, on_done = self.queue.get()
+            try:
+                if not (generate(fieldfile) or has_renditions(fieldfile)):
+                    continue
+                setattr(fieldfile.instance, rendered_field_name(fieldfile), fieldfile.name)
+                if record_rendered(type(fieldfile.instance), fieldfile.field.name, fieldfile.name) and on_done is not None:
+                    on_done()
+            except Exception:
+                logger.exception("Creating renditions of %s failed", fieldfile.name)
+            finally:
+                self.queue.task_done()
+
+
+worker = RenditionWorker()
+
+
+class RenditionsField(serializers.Field):
+    """
+    Read-only map of rendition name -> absolute URL for an image field, or null
+    until the renditions have been generated; clients then fall back to the original.
+    The model needs a `<field>_rendered` column, see record_rendered.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, fieldfile):
+        if not fieldfile or not is_rendered(fieldfile):
+            return None
+        config = renditions_config()
+        request = self.context.get('request')
+        urls = {}
+        for size in config['SIZES']:
+            url = fieldfile.storage.url(rendition_name(fieldfile.name, size, config))
+            urls[size] = request.build_absolute_uri(url) if request is not None else url
+        return urls
@@ -13,7 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
-from decouple import config
+from decouple import config, Csv
 import rest_framework
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -48,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'blog_server.metrics.MetricsMiddleware',  # First, so it times the whole stack
+    'blog_server.db_router.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,11 +88,69 @@ WSGI_APPLICATION = 'blog_server.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'blog_server.sqlite',  # sqlite3 with WAL and tuned pragmas, see blog_server/sqlite/base.py
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open across requests (seconds, 0 closes after each request).
+        # asgi.py sets 0: async requests run on short-lived threads that would leak them.
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=600, cast=int),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas, e.g. DATABASE_REPLICAS=replica1.sqlite3,replica2.sqlite3. Locally,
+# `manage.py replica_heartbeat --loop --copy-sqlite` keeps the files in sync.
+for _number, _name in enumerate(config('DATABASE_REPLICAS', default='', cast=Csv()), 1):
+    DATABASES[f'replica{_number}'] = {
+        'ENGINE': 'blog_server.sqlite',
+        'NAME': BASE_DIR / _name,
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['blog_server.db_router.PrimaryReplicaRouter']
+
+# Primary/replica routing (blog_server.db_router)
+DATABASE_ROUTING = {
+    'STICKY_SECONDS': config('DB_STICKY_SECONDS', default=5, cast=float),  # Reads stay on the primary after a write
+    'MAX_LAG': config('DB_REPLICA_MAX_LAG', default=2, cast=float),  # Seconds behind before a replica is skipped
+}
+
+
+# Cache
+# LocMemCache is per process; with several workers point CACHE_BACKEND at
+# django.core.cache.backends.filebased.FileBasedCache and CACHE_LOCATION at a
+# shared directory so post cache invalidations reach every worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='blog-server'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+POST_CACHE_TIMEOUT = config('POST_CACHE_TIMEOUT', default=300, cast=int)  # Seconds before a cached post response is refreshed
+POST_CACHE_COLD_WAIT = config('POST_CACHE_COLD_WAIT', default=0.5, cast=float)  # Seconds a request waits for another filling the same uncached response
+COMMENT_MAX_DEPTH = config('COMMENT_MAX_DEPTH', default=8, cast=int)  # Deepest reply level accepted, top-level comments being 0
+
+# Home timelines (apps.post.timeline): posts are pushed to followers unless the author has FANOUT_LIMIT followers or more
+TIMELINE = {
+    "FANOUT_LIMIT": config('TIMELINE_FANOUT_LIMIT', default=5000, cast=int),
+}
+
+# Post views are tallied in memory and added to Post.view_count in batches (apps.post.view_counts)
+POST_VIEW_COUNTS = {
+    "FLUSH_INTERVAL": config('POST_VIEW_FLUSH_INTERVAL', default=5, cast=int),  # Also the most views a crash can lose
+}
+
+# Trending ranking, recomputed by `manage.py rank_trending` (apps.post.trending)
+TRENDING = {
+    "HALF_LIFE_HOURS": config('TRENDING_HALF_LIFE_HOURS', default=12, cast=float),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -133,6 +193,12 @@ STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# WebP renditions of uploaded photos (blog_server.renditions), stored under MEDIA_ROOT/renditions/
+IMAGE_RENDITIONS = {
+    "QUALITY": 80,
+    "IN_PROCESS_WORKERS": config('RENDITION_WORKERS', default=1, cast=int),  # 0 leaves it to generate_renditions
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -154,15 +220,30 @@ REST_FRAMEWORK={
     "EXCEPTION_HANDLER": "blog_server.exceptions.custom_exception_handler",
      'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
       'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.AnonRateThrottle',
+        # Token buckets shared by every worker through THROTTLE['PATH'] (blog_server.throttling)
+        'blog_server.throttling.UserTokenBucketThrottle',
+        'blog_server.throttling.AnonTokenBucketThrottle',
+        'blog_server.throttling.ScopedTokenBucketThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'user': '1000/day',
         'anon': '100/day',
+        'login': '5/min',  # Views with throttle_scope = 'login', on top of the above
     }
 }
 
+# Serve GET on post_list, post_detail and the comment list from async views
+# (blog_server.async_views). asgi.py turns this on; under WSGI every async view
+# would need its own event loop, so the sync views are used there.
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
+
+# In-process cache of validated access tokens used by LoginRequiredPermission.
+# TTL bounds how long another worker may keep serving a changed or deactivated user.
+AUTH_TOKEN_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+}
+
 DOMAIN='localhost:3000'
 SITE_NAME = 'Henry Ultimate Authentication Course'
 
@@ -201,7 +282,7 @@ GITHUB_SECRET = config('GITHUB_SECRET')
 GITHUB_CLIENT_ID = config('GITHUB_CLIENT_ID')
 
 # Email backend configuration for sending emails via SMTP.
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')  # locmem/filebased backends work for local testing
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -209,6 +290,14 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Outbox for transactional email (apps.user.mail). Set IN_PROCESS_WORKERS to 0
+# when a separate `manage.py send_queued_email --loop` process does the sending.
+EMAIL_OUTBOX = {
+    'IN_PROCESS_WORKERS': config('EMAIL_OUTBOX_WORKERS', default=2, cast=int),
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': 5,
+}
+
 
 # CORS settings to allow all origins, enabling cross-origin requests.
 CSRF_COOKIE_SECURE = True
@@ -260,6 +349,34 @@ LOGGING = {
             "level": "INFO",
             "propagate": False,
         },
+        # Request log written by APILoggingMiddleware; its handlers run behind a queue
+        "blog_server.api": {
+            "handlers": ["console", "error_file"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
+
+# Request metrics (blog_server.metrics), scraped from /metrics
+METRICS = {
+    "DIR": os.path.join(LOG_DIR, "metrics"),  # One snapshot file per worker process
+    "FLUSH_INTERVAL": 5,
+    "TOKEN": config('METRICS_TOKEN', default=''),  # Bearer token required by /metrics; unset, it is only served with DEBUG
+}
+
+# Throttle buckets live in a SQLite file; workers lease tokens from it in small batches (blog_server.throttling)
+THROTTLE = {
+    "PATH": config('THROTTLE_PATH', default=os.path.join(LOG_DIR, "throttle.sqlite3")),  # Must be shared by every worker
+}
+
+# Request logging (blog_server.api_logging.APILoggingMiddleware)
+API_LOGGING = {
+    "DEFAULT_SAMPLE_RATE": config('API_LOG_SAMPLE_RATE', default=1.0, cast=float),
+    "SAMPLE_RATES": {
+        # Path prefix -> share of successful requests logged; errors are always logged
+        "/post/posts/": config('API_LOG_POST_READ_SAMPLE_RATE', default=1.0, cast=float),
     },
+    "MAX_BODY_BYTES": 2048,
 }
 
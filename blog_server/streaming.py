@@ -0,0 +1,39 @@
+from django.http import StreamingHttpResponse
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+DEFAULT_CHUNK_SIZE = 500  # Rows fetched per database round trip and written per chunk
+
+
+def iter_json_array(queryset, serializer_class, context=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield a JSON array of serialized rows, one chunk of rows at a time.
+    """
+    # One bound serializer renders every row, as ListSerializer does with its child
+    serializer = serializer_class(context=context or {})
+    encoder = JSONEncoder(ensure_ascii=not api_settings.UNICODE_JSON, separators=(',', ':'))
+    yield '['
+    parts = []
+    first = True
+    for instance in queryset.iterator(chunk_size=chunk_size):
+        if not first:
+            parts.append(',')
+        first = False
+        parts.append(encoder.encode(serializer.to_representation(instance)))
+        if len(parts) >= chunk_size:
+            yield ''.join(parts)
+            parts = []
+    parts.append(']')
+    yield ''.join(parts)
+
+
+def stream_json_list(queryset, serializer_class, context=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Stream a serialized queryset as a JSON array. Rows are read with iterator(),
+    so neither the model instances nor the rendered body are ever held in memory
+    all at once and peak memory does not grow with the number of rows.
+    """
+    return StreamingHttpResponse(
+        iter_json_array(queryset, serializer_class, context, chunk_size),
+        content_type='application/json',
+    )
@@ -0,0 +1,382 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+from apps.post.models import Post
+from apps.user.models import User
+from . import db_router, metrics, throttling
+from .api_logging import APILoggingMiddleware
+from .permission import TokenUserCache, token_user_cache
+
+
+class APILoggingTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def middleware(self, status=200, **config):
+        with override_settings(API_LOGGING=config):
+            return APILoggingMiddleware(lambda request: HttpResponse(status=status))
+
+    def log(self, request, status=200, **config):
+        middleware = self.middleware(status, **config)
+        with self.assertLogs('blog_server.api', 'INFO') as logs:
+            middleware(request)
+        self.assertEqual(len(logs.records), 1)
+        return json.loads(logs.records[0].getMessage())
+
+    def post(self, body, content_type='application/json', path='/user/login/'):
+        return self.factory.post(path, body, content_type=content_type)
+
+    def test_secrets_are_masked_at_any_depth(self):
+        body = {'email': 'reader@example.com', 'user': {'password': 'hunter2'}, 'codes': [{'code': '123456'}]}
+        record = self.log(self.post(json.dumps(body)))
+        self.assertEqual(record['body'], {'email': 'reader@example.com', 'user': {'password': '***'},
+                                          'codes': [{'code': '***'}]})
+
+    def test_arrays_are_masked(self):
+        record = self.log(self.post(json.dumps([{'password': 'hunter2'}, 1])))
+        self.assertEqual(record['body'], [{'password': '***'}, 1])
+
+    def test_form_bodies_are_masked(self):
+        record = self.log(self.post('email=reader%40example.com&password=hunter2',
+                                    'application/x-www-form-urlencoded'))
+        self.assertEqual(record['body'], {'email': 'reader@example.com', 'password': '***'})
+
+    def test_unparsable_json_is_summarized(self):
+        body = '{"password":"hunter2",}'
+        record = self.log(self.post(body), status=400)
+        self.assertEqual(record['body'], f'<application/json body, {len(body)} bytes, unparsable>')
+
+    def test_text_bodies_are_summarized(self):
+        record = self.log(self.post('password=hunter2', 'text/plain'))
+        self.assertEqual(record['body'], '<text/plain body, 16 bytes>')
+
+    def test_multipart_bodies_are_summarized(self):
+        request = self.factory.post('/user/photo/', {'password': 'hunter2'})
+        record = self.log(request)
+        self.assertRegex(record['body'], r'^<multipart/form-data body, \d+ bytes>$')
+
+    def test_bodies_over_the_cap_are_not_read(self):
+        body = json.dumps({'content': 'x' * 100})
+        record = self.log(self.post(body), MAX_BODY_BYTES=50)
+        self.assertEqual(record['body'], f'<application/json body, {len(body)} bytes, over 50 byte cap>')
+
+    def test_query_string_is_masked(self):
+        record = self.log(self.factory.get('/user/verify/', {'code': '123456', 'page': '2'}), status=400)
+        self.assertEqual(record['query'], {'code': '***', 'page': '2'})
+
+    def test_unsampled_successes_are_not_logged(self):
+        middleware = self.middleware(DEFAULT_SAMPLE_RATE=0.0)
+        with self.assertNoLogs('blog_server.api', 'INFO'):
+            middleware(self.factory.get('/post/posts/'))
+
+    def test_errors_are_logged_without_a_body_when_unsampled(self):
+        record = self.log(self.post(json.dumps({'email': 'reader@example.com'})), status=401, DEFAULT_SAMPLE_RATE=0.0)
+        self.assertEqual(record['status'], 401)
+        self.assertNotIn('body', record)
+
+    def test_longest_prefix_sets_the_rate(self):
+        config = {'DEFAULT_SAMPLE_RATE': 0.0, 'SAMPLE_RATES': {'/post/': 0.0, '/post/posts/': 1.0}}
+        self.assertEqual(self.log(self.factory.get('/post/posts/'), **config)['path'], '/post/posts/')
+        middleware = self.middleware(**config)
+        with self.assertNoLogs('blog_server.api', 'INFO'):
+            middleware(self.factory.get('/post/timeline/'))
+
+
+class MetricsViewTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.enterContext(override_settings(METRICS={'DIR': directory, 'TOKEN': 'secret'}, DEBUG=False))
+        self.enterContext(mock.patch.object(metrics, 'registry', metrics.MetricsRegistry()))
+        metrics.registry.flusher = False  # Nothing is written to disk
+        # Another worker's snapshot
+        other = metrics.MetricsRegistry()
+        other.record('post_list', 'GET', 200, 0.02, 3, 0.001, 512)
+        with open(os.path.join(directory, 'worker-1-1.json'), 'w') as handle:
+            json.dump(other.snapshot(), handle)
+
+    def scrape(self, token='secret', method='get'):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        return getattr(self.client, method)('/metrics', headers=headers)
+
+    def test_every_worker_is_merged_into_the_text_output(self):
+        metrics.registry.record('post_list', 'GET', 200, 0.04, 1, 0.001, 256)
+        response = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lines = response.content.decode().splitlines()
+        self.assertIn('http_request_db_queries_count{view="post_list",method="GET",status="2xx"} 2', lines)
+        self.assertIn('http_request_db_queries_sum{view="post_list",method="GET",status="2xx"} 4', lines)
+
+    def test_wrong_or_missing_token_is_refused(self):
+        self.assertEqual(self.scrape(token='wrong').status_code, 401)
+        self.assertEqual(self.scrape(token='sécret').status_code, 401)
+        self.assertEqual(self.scrape(token=None).status_code, 401)
+
+    def test_no_token_is_only_served_with_debug(self):
+        with self.settings(METRICS={'DIR': metrics.metrics_config()['DIR'], 'TOKEN': ''}):
+            self.assertEqual(self.scrape(token=None).status_code, 403)
+            with self.settings(DEBUG=True):
+                self.assertEqual(self.scrape(token=None).status_code, 200)
+
+    def test_only_get_is_allowed(self):
+        self.assertEqual(self.scrape(method='post').status_code, 405)
+
+
+class ThrottleTestCase(TestCase):
+    """
+    Gives every test its own throttle file and an empty registry.
+    """
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.enterContext(override_settings(THROTTLE={'PATH': os.path.join(directory, 'throttle.sqlite3')}))
+        self.addCleanup(setattr, throttling, 'registry', throttling.registry)
+        throttling.registry = self.registry()
+
+    def registry(self):
+        registry = throttling.BucketRegistry(throttling.BucketStore())
+        # Hand every lease back while the test's file is still configured
+        self.addCleanup(registry.sync, idle_timeout=0)
+        return registry
+
+
+class TokenBucketTests(ThrottleTestCase):
+    def workers(self, count=2):
+        # Registries sharing one file, as separate worker processes do
+        return [self.registry() for _ in range(count)]
+
+    def spend(self, workers, key, rate, requests):
+        allowed = 0
+        for index in range(requests):
+            allowed += workers[index % len(workers)].take(key, *throttling.parse_rate(rate))[0]
+        return allowed
+
+    def test_anon_budget_holds_across_workers(self):
+        workers = self.workers()
+        self.assertEqual(self.spend(workers, 'anon:1.2.3.4', '100/day', 300), 100)
+
+    def test_login_budget_holds_across_workers(self):
+        workers = self.workers()
+        self.assertEqual(self.spend(workers, 'login:1.2.3.4', '5/min', 20), 5)
+
+    def test_refused_client_waits_for_the_next_token(self):
+        worker, = self.workers(1)
+        self.spend([worker], 'login:1.2.3.4', '5/min', 5)
+        allowed, wait = worker.take('login:1.2.3.4', *throttling.parse_rate('5/min'))
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 12, delta=1)
+
+    def test_idle_leases_are_handed_back(self):
+        first, second = self.workers()
+        first.take('anon:1.2.3.4', *throttling.parse_rate('100/day'))  # Leases 5, spends 1
+        self.assertEqual(first.sync(idle_timeout=0), 1)
+        self.assertEqual(self.spend([second], 'anon:1.2.3.4', '100/day', 200), 99)
+
+    def test_login_view_is_limited_per_client(self):
+        for _ in range(5):
+            response = self.client.post('/user/login/', {'email': 'nobody@example.com', 'password': 'wrong'})
+            self.assertEqual(response.status_code, 401)
+        response = self.client.post('/user/login/', {'email': 'nobody@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # Reads draw on the anon budget, not login's
+        self.assertEqual(self.client.get('/post/posts/').status_code, 200)
+
+    def test_disabled_lets_everything_through(self):
+        with throttling.disabled():
+            for _ in range(7):
+                response = self.client.post('/user/login/', {'email': 'nobody@example.com', 'password': 'wrong'})
+                self.assertEqual(response.status_code, 401)
+
+
+class TokenUserCacheTests(TestCase):
+    def setUp(self):
+        self.enterContext(throttling.disabled())
+        token_user_cache.clear()
+        self.addCleanup(token_user_cache.clear)
+        self.user = User.objects.create_user('reader@example.com', 'password', first_name='Reader')
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.user).access_token)
+
+    def me(self):
+        return self.client.get('/user/me/')
+
+    def test_validated_token_skips_the_user_query(self):
+        self.assertEqual(self.me().status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.me().status_code, 200)
+
+    def test_profile_edit_invalidates_the_cached_user(self):
+        self.me()
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.assertEqual(self.me().json()['first_name'], 'Renamed')
+
+    def test_deactivated_user_is_refused(self):
+        self.me()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.me().status_code, 403)
+
+    def test_deleted_user_is_refused(self):
+        self.me()
+        self.user.delete()
+        self.assertEqual(self.me().status_code, 403)
+
+    def test_entries_expire_after_the_ttl(self):
+        tokens = TokenUserCache(ttl=0)
+        tokens.set('token', self.user, time.time() + 300)
+        self.assertIsNone(tokens.get('token'))
+
+    def test_entries_never_outlive_the_token(self):
+        tokens = TokenUserCache(ttl=300)
+        tokens.set('token', self.user, time.time() - 1)
+        self.assertIsNone(tokens.get('token'))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        tokens = TokenUserCache(max_size=2)
+        other = User.objects.create_user('other@example.com', 'password')
+        tokens.set('first', self.user, time.time() + 300)
+        tokens.set('second', other, time.time() + 300)
+        tokens.get('first')
+        tokens.set('third', other, time.time() + 300)
+        self.assertIsNone(tokens.get('second'))
+        self.assertIsNotNone(tokens.get('first'))
+        tokens.invalidate_user(other.pk)
+        self.assertIsNone(tokens.get('third'))
+
+    def test_each_request_gets_its_own_copy(self):
+        tokens = TokenUserCache()
+        tokens.set('token', self.user, time.time() + 300)
+        tokens.get('token').first_name = 'Changed'
+        self.assertEqual(tokens.get('token').first_name, 'Reader')
+
+
+class StreamedMetricsTests(TestCase):
+    def setUp(self):
+        self.enterContext(throttling.disabled())
+        cache.clear()
+        self.enterContext(mock.patch.object(metrics, 'registry', metrics.MetricsRegistry()))
+        metrics.registry.flusher = False  # Nothing is written to disk
+        user = User.objects.create_user('reader@example.com', 'password')
+        User.objects.create_user('other@example.com', 'password')
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(user).access_token)
+
+    def test_queries_run_while_streaming_are_counted(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/user/details/')
+            self.assertNotIn(('user-detail', 'GET', '2xx'), metrics.registry.series)
+            body = b''.join(response.streaming_content)
+        self.assertEqual(len(json.loads(body)), 2)
+        series = metrics.registry.series[('user-detail', 'GET', '2xx')]
+        self.assertEqual(series['count'], 1)
+        self.assertEqual(series['query_sum'], len(queries))
+        self.assertEqual(series['size_sum'], len(body))
+
+
+@override_settings(DATABASE_ROUTING={'REPLICAS': ['replica1'], 'STICKY_SECONDS': 5, 'MAX_LAG': 2})
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = db_router.PrimaryReplicaRouter()
+        self.healthy = True
+        self.enterContext(mock.patch.object(db_router.health, 'is_healthy', lambda alias, config: self.healthy))
+
+    def in_request(self, state=None):
+        token = db_router.request_state.set(state or db_router.RoutingState())
+        self.addCleanup(db_router.request_state.reset, token)
+
+    def request(self, method='GET', cookie=None, write=False):
+        """
+        Run a request through the middleware; returns (response, alias the view read from).
+        """
+        read_from = []
+
+        def view(request):
+            if write:
+                self.router.db_for_write(Post)
+            read_from.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        request = RequestFactory().generic(method, '/')
+        if cookie is not None:
+            request.COOKIES['db_primary_until'] = cookie
+        response = db_router.ReplicaPinningMiddleware(view)(request)
+        return response, read_from[0]
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_reads_in_requests_use_a_healthy_replica(self):
+        self.in_request()
+        self.assertEqual(self.router.db_for_read(Post), 'replica1')
+        self.healthy = False
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_other_apps_read_from_the_primary(self):
+        self.in_request()
+        self.assertEqual(self.router.db_for_read(Group), 'default')
+
+    def test_a_write_pins_the_rest_of_the_request(self):
+        self.in_request()
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_use_primary_block(self):
+        self.in_request()
+        with db_router.use_primary():
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'replica1')
+
+    def test_writes_keep_the_client_on_the_primary(self):
+        response, read_from = self.request('POST')
+        self.assertEqual(read_from, 'default')
+        cookie = response.cookies['db_primary_until']
+        self.assertEqual(cookie['max-age'], 5)
+        self.assertGreater(float(cookie.value), time.time())
+        self.assertEqual(self.request(cookie=cookie.value)[1], 'default')
+
+    def test_expired_or_bad_cookie_reads_from_a_replica(self):
+        response, read_from = self.request(cookie=str(time.time() - 1))
+        self.assertEqual(read_from, 'replica1')
+        self.assertNotIn('db_primary_until', response.cookies)
+        self.assertEqual(self.request(cookie='not-a-time')[1], 'replica1')
+
+    def test_forged_cookie_does_not_pin_the_client(self):
+        for value in ['1e18', 'inf', 'nan', str(time.time() + 60)]:
+            self.assertEqual(self.request(cookie=value)[1], 'replica1', value)
+        self.assertEqual(self.request(cookie=str(time.time() + 5.5))[1], 'default')
+
+    def test_a_get_that_writes_sets_the_cookie(self):
+        response, read_from = self.request(write=True)
+        self.assertEqual(read_from, 'default')
+        self.assertIn('db_primary_until', response.cookies)
+
+
+@override_settings(DATABASE_ROUTING={'MAX_LAG': 2, 'CHECK_INTERVAL': 60})
+class ReplicaHealthTests(SimpleTestCase):
+    def setUp(self):
+        self.health = db_router.ReplicaHealth()
+        self.config = db_router.routing_config()
+
+    def test_lagging_or_unreachable_replicas_are_skipped(self):
+        for lag, healthy in [(0.5, True), (3, False), (None, False)]:
+            self.health.reset()
+            with mock.patch.object(db_router, 'replica_lag', return_value=lag):
+                self.assertEqual(self.health.is_healthy('replica1', self.config), healthy)
+
+    def test_verdict_is_reused_until_the_next_check(self):
+        with mock.patch.object(db_router, 'replica_lag', return_value=0.5) as replica_lag:
+            self.assertTrue(self.health.is_healthy('replica1', self.config))
+            self.assertTrue(self.health.is_healthy('replica1', self.config))
+        self.assertEqual(replica_lag.call_count, 1)
@@ -0,0 +1,303 @@
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# Token-bucket throttles shared by every worker on the host.
+#
+# A bucket holds up to `capacity` tokens and refills at `capacity / period`
+# per second; a request spends one token. The buckets live in a SQLite file
+# that every worker opens. A worker doesn't go to the file for every request:
+# it leases a few tokens at once, at most LEASE_FRACTION of the bucket, and
+# spends them from memory. A token is only ever spent once, so the limits hold
+# across workers. Small buckets, such as login's, lease one token at a time.
+#
+# When the file has no token left, the worker refuses the client from memory
+# until the next token is due. A daemon thread hands the unused tokens of idle
+# leases back every SYNC_INTERVAL seconds. A worker that dies takes its unused
+# lease with it, which only lowers that client's budget until it refills. If
+# the file can't be used, requests are let through, and the file is retried
+# once per lease.
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'PATH': os.path.join(settings.BASE_DIR, 'logs', 'throttle.sqlite3'),  # Shared by every worker on the host
+    'LEASE_FRACTION': 0.05,  # Share of a bucket a worker takes from the file at once
+    'SYNC_INTERVAL': 10,  # Seconds between hand-backs of idle leases
+    'IDLE_TIMEOUT': 30,  # Seconds after which an unused lease is handed back
+}
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def throttle_config():
+    return {**DEFAULTS, **getattr(settings, 'THROTTLE', {})}
+
+
+def parse_rate(rate):
+    """
+    '<requests>/<period>' as DRF writes it, e.g. '100/day', to (capacity, tokens per second).
+    """
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+def refill(tokens, updated_at, now, capacity, per_second):
+    return min(capacity, tokens + max(now - updated_at, 0) * per_second)
+
+
+class Lease:
+    __slots__ = ('capacity', 'per_second', 'tokens', 'retry_at', 'used_at')
+
+    def __init__(self, capacity, per_second, now):
+        self.capacity = capacity
+        self.per_second = per_second
+        self.tokens = 0  # Taken from the shared bucket and not spent yet
+        self.retry_at = 0.0  # Until then the shared bucket is known to be empty
+        self.used_at = now
+
+    def take(self, now):
+        self.used_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class BucketStore:
+    """
+    The shared buckets, in a SQLite file. Each thread opens its own connection.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def connect(self):
+        path = throttle_config()['PATH']
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None and self.local.path == path:
+            return connection
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=OFF')  # Losing buckets in a crash only resets some limits
+        connection.execute('CREATE TABLE IF NOT EXISTS bucket '
+                           '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)')
+        self.local.connection, self.local.path = connection, path
+        return connection
+
+    def lease(self, key, capacity, per_second, size, now):
+        """
+        Take up to `size` whole tokens from a shared bucket. Returns (tokens
+        taken, seconds until the bucket has one again).
+        """
+        connection = self.connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated_at FROM bucket WHERE key = ?', (key,)).fetchone()
+            tokens = capacity if row is None else refill(row[0], row[1], now, capacity, per_second)
+            taken = min(size, int(tokens)) if tokens >= 1 else 0
+            if taken:
+                left = tokens - taken
+                connection.execute('INSERT OR REPLACE INTO bucket (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)',
+                                   (key, left, now, now + (capacity - left) / per_second))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return taken, (0 if taken else (1 - tokens) / per_second)
+
+    def give_back(self, leases, now):
+        """
+        Return unused tokens, as (key, capacity, per_second, tokens), to the shared buckets.
+        """
+        connection = self.connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            rows = []
+            for key, capacity, per_second, unused in leases:
+                row = connection.execute('SELECT tokens, updated_at FROM bucket WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    continue  # Already full
+                tokens = min(refill(row[0], row[1], now, capacity, per_second) + unused, capacity)
+                rows.append((key, tokens, now, now + (capacity - tokens) / per_second))
+            connection.executemany('INSERT OR REPLACE INTO bucket (key, tokens, updated_at, full_at) '
+                                   'VALUES (?, ?, ?, ?)', rows)
+            # A bucket that has refilled is the same as no bucket
+            connection.execute('DELETE FROM bucket WHERE full_at <= ?', (now,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+
+class BucketRegistry:
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+        self.leases = {}  # Key -> Lease
+        self.syncer = None
+
+    def take(self, key, capacity, per_second):
+        """
+        Spend a token from a bucket. Returns (allowed, seconds until the next token).
+        """
+        now = time.time()
+        with self.lock:
+            lease = self.leases.get(key)
+            if lease is None:
+                lease = self.leases[key] = Lease(capacity, per_second, now)
+            if lease.take(now):
+                return True, 0
+            if now < lease.retry_at:
+                return False, lease.retry_at - now
+
+        size = max(1, int(capacity * throttle_config()['LEASE_FRACTION']))
+        try:
+            taken, wait = self.store.lease(key, capacity, per_second, size, now)
+        except (sqlite3.Error, OSError):
+            logger.exception("Shared throttle store failed, letting requests through")
+            taken, wait = size, 0
+        with self.lock:
+            lease.tokens += taken
+            allowed = lease.take(now)
+            if not allowed:
+                lease.retry_at = now + wait
+        if self.syncer is None:
+            self.start_syncer()
+        return allowed, (0 if allowed else wait)
+
+    def sync(self, idle_timeout=None):
+        """
+        Hand the unused tokens of leases idle for `idle_timeout` seconds back to
+        the shared buckets. Returns the number of leases dropped.
+        """
+        now = time.time()
+        if idle_timeout is None:
+            idle_timeout = throttle_config()['IDLE_TIMEOUT']
+        with self.lock:
+            idle = [key for key, lease in self.leases.items() if lease.used_at <= now - idle_timeout]
+            dropped = [(key, self.leases.pop(key)) for key in idle]
+        unused = [(key, lease.capacity, lease.per_second, lease.tokens) for key, lease in dropped if lease.tokens]
+        if unused:
+            self.store.give_back(unused, now)
+        return len(dropped)
+
+    def start_syncer(self):
+        with self.lock:
+            if self.syncer is not None:
+                return
+            self.syncer = threading.Thread(target=self.sync_forever, name='throttle-syncer', daemon=True)
+        self.syncer.start()
+        atexit.register(self.release_logged)
+
+    def release_logged(self):
+        # Every lease goes back on exit
+        try:
+            self.sync(idle_timeout=0)
+        except Exception:
+            logger.exception("Handing back throttle leases failed")
+
+    def sync_logged(self):
+        try:
+            self.sync()
+        except Exception:
+            logger.exception("Handing back throttle leases failed")
+
+    def sync_forever(self):
+        while True:
+            time.sleep(throttle_config()['SYNC_INTERVAL'])
+            self.sync_logged()
+
+
+registry = BucketRegistry(BucketStore())
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle on a token bucket per cache key, with DRF's rate format and the
+    rate of `scope` in DEFAULT_THROTTLE_RATES. A rate of None lets every request through.
+    """
+    scope = None
+    THROTTLE_RATES = api_settings.DEFAULT_THROTTLE_RATES
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_rate(self, view):
+        return self.THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError('.get_cache_key() must be overridden')
+
+    def allow_request(self, request, view):
+        rate = self.get_rate(view)
+        if rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        allowed, self.wait_seconds = registry.take(key, *parse_rate(rate))
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AnonTokenBucketThrottle(TokenBucketThrottle):
+    # Anonymous clients, by IP address
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return f'{self.scope}:{self.get_ident(request)}'
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    # Signed-in users, by user id
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        return f'{self.scope}:{request.user.pk}'
+
+
+class ScopedTokenBucketThrottle(TokenBucketThrottle):
+    """
+    An extra bucket per client for views that set `throttle_scope`, e.g. login,
+    on top of the user and anon buckets. Views without one are not limited here.
+    """
+
+    def get_rate(self, view):
+        self.scope = getattr(view, 'throttle_scope', None)
+        return super().get_rate(view) if self.scope else None
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return f'{self.scope}:{ident}'
+
+
+@contextmanager
+def disabled():
+    """
+    Let every request through, e.g. while benchmarking or testing views.
+    """
+    saved = TokenBucketThrottle.THROTTLE_RATES
+    TokenBucketThrottle.THROTTLE_RATES = {scope: None for scope in saved}
+    try:
+        yield
+    finally:
+        TokenBucketThrottle.THROTTLE_RATES = saved
@@ -2,10 +2,11 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from blog_server.views import CheckView
+from blog_server.views import CheckView, metrics_view
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', CheckView.as_view()),
+    path('metrics', metrics_view, name='metrics'),
     path('user/',include('apps.user.urls')),
     path('post/',include('apps.post.urls')),
     path('comment/',include('apps.comment.urls')),
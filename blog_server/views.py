@@ -1,8 +1,30 @@
-from django.http import JsonResponse
+import hmac
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
 from rest_framework.permissions import AllowAny
 from rest_framework.views import APIView
+from blog_server.metrics import collect, metrics_config, render_prometheus
 
 class CheckView(APIView):
     permission_classes = [AllowAny]
     def get(self, request):
         return JsonResponse({"message": "Welcome to my server!"})
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, protected by the bearer token in METRICS['TOKEN'].
+    Without a token it is only served when DEBUG is on.
+    """
+    token = metrics_config().get('TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        # Compared as bytes: compare_digest rejects non-ASCII strings
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return HttpResponse(status=401)
+    elif not settings.DEBUG:
+        # Per-view latency, queries and error rates are not for everyone
+        return HttpResponse(status=403)
+    return HttpResponse(render_prometheus(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')